@@ -0,0 +1,105 @@
+# apps/api/admin_routes.py
+# Admin-only routes: background ingest jobs, request latency stats, profiles
+"""Admin routes (ingest jobs, metrics, profiles)"""
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import PlainTextResponse
+from apps.api.models import IngestJobRequest
+from apps.core.deps import get_current_admin, get_current_tenant
+from apps.core.metrics import STAGES, get_latency_stats
+from apps.core.profiler import list_profiles, read_profile, get_profiler_stats
+from apps.core.mongo import get_ingest_jobs
+from apps.rag.jobs import ingest_jobs
+import logging
+
+logger = logging.getLogger(__name__)
+router = APIRouter(dependencies=[Depends(get_current_admin)])
+
+@router.post("/ingest/jobs", status_code=status.HTTP_202_ACCEPTED)
+async def submit_ingest_job(
+    request: IngestJobRequest,
+    current_user: dict = Depends(get_current_admin),
+    tenant_id: str = Depends(get_current_tenant)
+):
+    """Queue a full or incremental ingest; it runs in a throttled worker process"""
+    try:
+        return await ingest_jobs.submit(
+            tenant_id=request.tenant_id or tenant_id,
+            mode=request.mode,
+            rebuild=request.rebuild,
+            sources=request.sources,
+            build_faq=request.build_faq,
+            dedup=request.dedup,
+            submitted_by=current_user["username"],
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+@router.get("/ingest/jobs")
+async def list_ingest_jobs():
+    """Jobs known to this API process, newest first"""
+    return {"jobs": ingest_jobs.list(), **ingest_jobs.get_stats()}
+
+@router.get("/ingest/jobs/{job_id}")
+async def get_ingest_job(job_id: str):
+    """Status and progress of one job"""
+    job = ingest_jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+    return job
+
+@router.delete("/ingest/jobs/{job_id}")
+async def cancel_ingest_job(job_id: str):
+    """Cancel a queued job, or stop a running one (not a rebuild) at the next batch boundary"""
+    try:
+        job = ingest_jobs.cancel(job_id)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    if not job:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+    return job
+
+@router.get("/ingest/history")
+async def ingest_history(limit: int = 50, tenant_id: Optional[str] = None):
+    """Finished jobs from Mongo: duration, chunk counts and throughput"""
+    try:
+        return {"jobs": await get_ingest_jobs(min(limit, 500), tenant_id)}
+    except Exception as e:
+        logger.error(f"Ingest history error: {e}")
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="History unavailable")
+
+@router.get("/metrics/latency")
+async def latency_stats(
+    windows: str = Query("5,60,1440", description="Window sizes in minutes, comma-separated"),
+    stage: str = "total",
+    endpoint: Optional[str] = None,
+    route: Optional[str] = None,
+    tenant_id: Optional[str] = None
+):
+    """p50/p95/p99 and counters per time window, read from the per-minute rollups"""
+    try:
+        minutes = sorted({int(w) for w in windows.split(",") if w.strip()})
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="windows must be integers (minutes)")
+    if not minutes or minutes[0] <= 0 or minutes[-1] > 60 * 24 * 90:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="windows must be 1..129600 minutes")
+    if stage not in STAGES:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"stage must be one of {list(STAGES)}")
+    try:
+        return await get_latency_stats(minutes, stage=stage, endpoint=endpoint, route=route, tenant_id=tenant_id)
+    except Exception as e:
+        logger.error(f"Latency stats error: {e}")
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Metrics unavailable")
+
+@router.get("/profiles")
+async def profiles(limit: int = 50):
+    """Saved request profiles (slow or X-Profile requests), newest first, with their hottest frames"""
+    return {"profiles": list_profiles(min(max(limit, 1), 500)), **get_profiler_stats()}
+
+@router.get("/profiles/{profile_id}", response_class=PlainTextResponse)
+async def profile_stacks(profile_id: str):
+    """Collapsed stacks of one profile (load into speedscope, or flamegraph.pl for an SVG)"""
+    folded = read_profile(profile_id)
+    if folded is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Profile not found")
+    return folded
@@ -1,40 +1,169 @@
 # apps/api/chat_routes.py
 # Chat routes for handling user queries with RAG (Retrieval-Augmented Generation)
 """Chat routes for handling user queries with RAG"""
-from fastapi import APIRouter, Depends, HTTPException, status
-from apps.api.models import ChatRequest, ChatResponse
+import json
+import time
+from typing import Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, status
+from fastapi.responses import StreamingResponse
+from apps.api.chat_ws import get_ws_stats
+from apps.api.models import BatchChatRequest, ChatRequest, ChatResponse, ChatHistoryResponse
 from apps.core.auth import get_current_user
-from apps.rag.query import run_rag_query
-from apps.core.mongo import save_chat_log
+from apps.core.cancellation import ClientDisconnected, run_until_disconnected, get_cancel_stats
+from apps.core.deps import get_current_tenant
+from apps.core.metrics import record_request_metric, get_metrics_stats
+from apps.core.profiler import get_profiler_stats
+from apps.core.tracing import span
+from apps.core.rate_limit import check_rate_limit, enforce_rate_limit, rate_limiter
+from apps.rag.cache import get_cache_stats
+from apps.rag.cascade import get_cascade_stats
+from apps.rag.config import REQUEST_TIMEOUT, BATCH_CONCURRENCY, CONVERSATION_ENABLED
+from apps.rag.conversation import conversations, get_conversation_stats
+from apps.rag.llm import ollama_pool, llm_breaker, llm_queue
+from apps.rag.query import run_rag_query, iter_batch_queries
+from apps.rag.resilience import Deadline
+from apps.rag.routing import get_route_stats
+from apps.rag.warmup import get_warmup_state
+from apps.rag.watch import get_watch_state
+from apps.core.mongo import save_chat_log, get_chat_history
 import logging
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
-@router.post("/rag", response_model=ChatResponse)
-#print("Chat routes loaded successfully-chat.py")
-async def chat(request: ChatRequest,current_user: dict = Depends(get_current_user)):
+def request_deadline(x_request_timeout: Optional[float] = Header(None)) -> Deadline:
+    """Per-request deadline; clients may ask for a shorter one via X-Request-Timeout (seconds)"""
+    timeout = REQUEST_TIMEOUT
+    if x_request_timeout and x_request_timeout > 0:
+        timeout = min(timeout, x_request_timeout)
+    return Deadline(timeout)
+
+@router.post("/rag", response_model=ChatResponse, dependencies=[Depends(enforce_rate_limit)])
+async def chat(
+    request: ChatRequest,
+    http_request: Request,
+    current_user: dict = Depends(get_current_user),
+    tenant_id: str = Depends(get_current_tenant),
+    deadline: Deadline = Depends(request_deadline)
+):
     """Process chat message with RAG and return response"""
-    print("Chat routes loaded successfully-chat.py - chat()"),
+    start = time.perf_counter()
+    response, status_code = None, 200
     try:
-        response = await run_rag_query(request.message)
+        conversation = None
+        if request.session_id and CONVERSATION_ENABLED:
+            conversation = await conversations.begin(
+                current_user["username"], tenant_id, request.session_id, request.message
+            )
+        # Cancelled (Ollama call aborted) if the client hangs up mid-request
+        response = await run_until_disconnected(
+            http_request,
+            run_rag_query(
+                conversation.standalone if conversation else request.message, tenant_id, deadline,
+                follow_up=conversation.query_context() if conversation else None
+            )
+        )
+        if conversation:
+            await conversations.finish(conversation, response)
         message = response["message"]
         sources = response["sources"]
-        print("Chat routes loaded successfully-chat_routes.py - rag_qry()"),
         # Save to chat history
-        await save_chat_log(
-            username=current_user["username"],
-            user_message=request.message,
-            bot_response=response
-        )
+        with span("persist.chat_log"):
+            await save_chat_log(
+                username=current_user["username"],
+                user_message=request.message,
+                bot_response=response,
+                tenant_id=tenant_id
+            )
         return {
             "message": message,
-            "sources": sources
+            "sources": sources,
+            "degraded": response.get("degraded", False)
         }
         #return ChatResponse(message=response)
+    except ClientDisconnected:
+        logger.info(f"Client disconnected, cancelled RAG query for {current_user['username']}")
+        # Nobody is listening; 499 = client closed request (nginx convention)
+        status_code = 499
+        raise HTTPException(status_code=499, detail="Client closed request")
     except Exception as e:
         logger.error(f"Error in chat endpoint: {e}")
+        status_code = status.HTTP_500_INTERNAL_SERVER_ERROR
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Internal server error"
-        )
\ No newline at end of file
+        )
+    finally:
+        record_request_metric(
+            "rag", tenant_id, response, status_code=status_code,
+            elapsed=time.perf_counter() - start, session_id=request.session_id,
+            route="cancelled" if status_code == 499 else None
+        )
+
+@router.post("/rag/batch")
+async def chat_batch(
+    request: BatchChatRequest,
+    current_user: dict = Depends(get_current_user),
+    tenant_id: str = Depends(get_current_tenant)
+):
+    """
+    Answer many questions in one call (offline jobs, evaluation sweeps).
+    Results stream back as NDJSON, one line per unique question as soon as it
+    is answered; `indices` maps each line back to the request order.
+    Costs one rate-limit token per unique question.
+    """
+    await check_rate_limit(current_user["username"], cost=len(set(request.questions)))
+    logger.info(f"Batch of {len(request.questions)} questions from {current_user['username']}")
+
+    async def ndjson():
+        answered = 0
+        async for result in iter_batch_queries(request.questions, tenant_id, BATCH_CONCURRENCY):
+            answered += 1
+            record_request_metric("batch", tenant_id, result)
+            yield json.dumps(result, default=str) + "\n"
+        yield json.dumps({"done": True, "questions": len(request.questions), "unique": answered}) + "\n"
+
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+@router.get("/history", response_model=ChatHistoryResponse)
+async def history(limit: int = 20, current_user: dict = Depends(get_current_user)):
+    """Most recent chat exchanges of the current user"""
+    try:
+        records = await get_chat_history(current_user["username"], min(max(limit, 1), 100))
+    except Exception as e:
+        logger.error(f"Error reading chat history: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Chat history unavailable"
+        )
+    return {
+        "history": [
+            {
+                "user_message": r["user_message"],
+                # /rag stores the whole response dict
+                "bot_response": r["bot_response"]["message"] if isinstance(r["bot_response"], dict) else r["bot_response"],
+                "timestamp": r["timestamp"],
+            }
+            for r in records
+        ]
+    }
+
+@router.get("/stats")
+async def stats(current_user: dict = Depends(get_current_user)):
+    """Runtime counters for the chat pipeline"""
+    return {
+        "rate_limit": rate_limiter.get_stats(),
+        "cache": get_cache_stats(),
+        "routes": get_route_stats(),
+        "llm": ollama_pool.get_stats(),
+        "llm_breaker": llm_breaker.get_stats(),
+        "llm_queue": llm_queue.get_stats(),
+        "cascade": get_cascade_stats(),
+        "cancellations": get_cancel_stats(),
+        "conversations": get_conversation_stats(),
+        "websocket": get_ws_stats(),
+        "warmup": get_warmup_state(),
+        "docs_watch": get_watch_state(),
+        "metrics": get_metrics_stats(),
+        "profiler": get_profiler_stats(),
+    }
@@ -0,0 +1,329 @@
+# apps/api/chat_ws.py
+# WebSocket chat: one authenticated connection carries many questions.
+#
+#   ws://host/chat/ws?token=<jwt>[&tenant=<id>]   (or send {"type": "auth", "token": ...} first)
+#
+# Client -> server
+#   {"type": "ask", "id": "q1", "message": "...", "timeout": 10, "session_id": "s1"}
+#                                    timeout (seconds) and session_id (follow-ups) optional
+#   {"type": "cancel", "id": "q1"}
+#   {"type": "ping", "ts": ...}                                    answered with "pong"
+# Server -> client (every frame about a question carries its "id")
+#   ready, queued {position}, sources {sources}, token {text}, done {message,
+#   sources, degraded, cached, response_time, request_id}, cancelled, error
+#   {detail}, ping (heartbeat every WS_PING_INTERVAL seconds)
+# "done" carries the final text: render it in place of the streamed tokens
+# (cache/FAQ answers stream nothing, and a generation that fails midway ends
+# with a degraded answer).
+#
+# The JWT is verified once when the connection opens; the connection is closed
+# (4001) when the token expires, and (4009) when more than WS_MAX_BACKLOG frames
+# are waiting to be sent. Rate limits still apply per question.
+"""WebSocket chat channel with multiplexed, streamed answers"""
+import asyncio
+import json
+import logging
+import math
+import time
+from typing import Dict, Optional
+
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+
+from apps.core.auth import claims_from_token
+from apps.core.cancellation import cancel_stats
+from apps.core.metrics import record_request_metric
+from apps.core.mongo import save_chat_log
+from apps.core.rate_limit import rate_limiter
+from apps.core.settings import settings
+from apps.core.tracing import current_request_id, span
+from apps.rag.config import REQUEST_TIMEOUT, CONVERSATION_ENABLED
+from apps.rag.conversation import conversations
+from apps.rag.query import run_rag_query
+from apps.rag.resilience import Deadline
+
+logger = logging.getLogger(__name__)
+router = APIRouter()
+
+MAX_MESSAGE_LENGTH = 1000  # same bound as ChatRequest
+MAX_ID_LENGTH = 64
+
+# Close codes (4000-4999 are free for applications)
+CLOSE_POLICY_VIOLATION = 1008
+CLOSE_UNAUTHORIZED = 4001
+CLOSE_IDLE = 4008
+CLOSE_BACKLOG = 4009
+
+ws_stats = {
+    "connections": 0,
+    "open": 0,
+    "auth_failures": 0,
+    "questions": 0,
+    "cancelled": 0,
+    "rejected": 0,  # in-flight cap, rate limit or invalid frames
+    "backlog_closed": 0,
+}
+
+
+class CloseConnection(Exception):
+    def __init__(self, code: int, reason: str):
+        super().__init__(reason)
+        self.code = code
+        self.reason = reason
+
+
+def coalesce(frames: list) -> list:
+    """Merge runs of token frames for the same question into one frame."""
+    merged = []
+    for frame in frames:
+        prev = merged[-1] if merged else None
+        if frame["type"] == "token" and prev and prev["type"] == "token" and prev["id"] == frame["id"]:
+            merged[-1] = {**prev, "text": prev["text"] + frame["text"]}
+        else:
+            merged.append(frame)
+    return merged
+
+
+class ChatSocket:
+    """
+    One connection: a reader dispatching client frames, a task per question and
+    a single writer draining the outbox, so frames from concurrent answers never
+    interleave mid-send. A client that sends faster than it reads (pings,
+    invalid frames) grows the outbox without bound, so past WS_MAX_BACKLOG
+    pending frames the connection is closed.
+    """
+
+    def __init__(self, websocket: WebSocket, username: str, tenant_id: str, expires_at: Optional[float]):
+        self.ws = websocket
+        self.username = username
+        self.tenant_id = tenant_id
+        self.expires_at = expires_at
+        self.questions: Dict[str, asyncio.Task] = {}
+        self.outbox: asyncio.Queue = asyncio.Queue()
+        self.overflow = asyncio.Event()
+        self.last_seen = time.monotonic()
+
+    def push(self, frame: dict):
+        if self.outbox.qsize() >= settings.WS_MAX_BACKLOG:
+            self.overflow.set()  # the frame is dropped; the connection closes next
+            return
+        self.outbox.put_nowait(frame)
+
+    def reject(self, msg_id: Optional[str], detail: str, **extra):
+        ws_stats["rejected"] += 1
+        self.push({"type": "error", "id": msg_id, "detail": detail, **extra})
+
+    async def run(self):
+        self.push({
+            "type": "ready",
+            "username": self.username,
+            "tenant_id": self.tenant_id,
+            "max_in_flight": settings.WS_MAX_IN_FLIGHT,
+        })
+        loops = [
+            asyncio.ensure_future(c)
+            for c in (self._reader(), self._writer(), self._heartbeat(), self._backlog_guard())
+        ]
+        close = None
+        try:
+            done, _ = await asyncio.wait(loops, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if isinstance(task.exception(), CloseConnection):
+                    close = task.exception()
+        finally:
+            pending = loops + list(self.questions.values())
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+        if close is not None:
+            try:
+                await self.ws.close(code=close.code, reason=close.reason)
+            except RuntimeError:
+                pass  # already closed by the client
+
+    # ---------------------------
+    # Loops
+    # ---------------------------
+    async def _reader(self):
+        while True:
+            try:
+                frame = await self.ws.receive_json()
+            except WebSocketDisconnect:
+                return
+            except ValueError:
+                self.reject(None, "invalid_json")
+                continue
+            self.last_seen = time.monotonic()
+            if not isinstance(frame, dict):
+                self.reject(None, "invalid_frame")
+                continue
+            await self._dispatch(frame)
+
+    async def _writer(self):
+        while True:
+            frames = [await self.outbox.get()]
+            while not self.outbox.empty():
+                frames.append(self.outbox.get_nowait())
+            for frame in coalesce(frames):
+                await self.ws.send_text(json.dumps(frame, default=str))
+
+    async def _heartbeat(self):
+        while True:
+            await asyncio.sleep(settings.WS_PING_INTERVAL)
+            if self.expires_at is not None and time.time() >= self.expires_at:
+                raise CloseConnection(CLOSE_UNAUTHORIZED, "token expired")
+            if not self.questions and time.monotonic() - self.last_seen > settings.WS_IDLE_TIMEOUT:
+                raise CloseConnection(CLOSE_IDLE, "idle")
+            self.push({"type": "ping", "ts": time.time()})
+
+    async def _backlog_guard(self):
+        await self.overflow.wait()
+        ws_stats["backlog_closed"] += 1
+        raise CloseConnection(CLOSE_BACKLOG, "too many unsent frames")
+
+    # ---------------------------
+    # Client frames
+    # ---------------------------
+    async def _dispatch(self, frame: dict):
+        kind = frame.get("type")
+        msg_id = frame.get("id")
+        if kind == "ping":
+            self.push({"type": "pong", "ts": frame.get("ts")})
+        elif kind == "pong":
+            pass
+        elif kind == "cancel":
+            task = self.questions.get(msg_id)
+            if task is None:
+                self.reject(msg_id, "unknown_id")
+            else:
+                task.cancel()
+        elif kind == "ask":
+            await self._ask(msg_id, frame)
+        else:
+            self.reject(msg_id, "unknown_type")
+
+    async def _ask(self, msg_id, frame: dict):
+        message = frame.get("message")
+        if not isinstance(msg_id, str) or not 0 < len(msg_id) <= MAX_ID_LENGTH:
+            return self.reject(None, "invalid_id")
+        if not isinstance(message, str) or not 0 < len(message.strip()) <= MAX_MESSAGE_LENGTH:
+            return self.reject(msg_id, "invalid_message")
+        session_id = frame.get("session_id")
+        if session_id is not None and (not isinstance(session_id, str) or not 0 < len(session_id) <= MAX_ID_LENGTH):
+            return self.reject(msg_id, "invalid_session_id")
+        if msg_id in self.questions:
+            return self.reject(msg_id, "duplicate_id")
+        if len(self.questions) >= settings.WS_MAX_IN_FLIGHT:
+            return self.reject(msg_id, "too_many_in_flight")
+        if settings.RATE_LIMIT_ENABLED:
+            allowed, retry_after = await rate_limiter.check(self.username)
+            if not allowed:
+                return self.reject(msg_id, "rate_limited", retry_after=max(1, math.ceil(retry_after)))
+
+        timeout = REQUEST_TIMEOUT
+        if isinstance(frame.get("timeout"), (int, float)) and frame["timeout"] > 0:
+            timeout = min(timeout, frame["timeout"])
+        ws_stats["questions"] += 1
+        self.questions[msg_id] = asyncio.ensure_future(self._answer(msg_id, message, Deadline(timeout), session_id))
+
+    async def _answer(self, msg_id: str, message: str, deadline: Deadline, session_id: Optional[str]):
+        start = time.perf_counter()
+        response, status_code = None, 200
+
+        def on_event(event: dict):
+            self.push({**event, "id": msg_id})
+
+        try:
+            with span("ws.ask", root=True, path="/chat/ws", message_id=msg_id) as s:
+                conversation = None
+                if session_id and CONVERSATION_ENABLED:
+                    conversation = await conversations.begin(self.username, self.tenant_id, session_id, message)
+                response = await run_rag_query(
+                    conversation.standalone if conversation else message, self.tenant_id, deadline,
+                    on_event=on_event, follow_up=conversation.query_context() if conversation else None
+                )
+                if conversation:
+                    await conversations.finish(conversation, response)
+                self.push({
+                    "type": "done",
+                    "id": msg_id,
+                    "message": response["message"],
+                    "sources": response["sources"],
+                    "degraded": response.get("degraded", False),
+                    "cached": response.get("cached", False),
+                    "response_time": response.get("response_time"),
+                    "request_id": current_request_id(),
+                })
+                # Saved after the answer went out; a failure here only costs the history entry
+                try:
+                    with span("persist.chat_log"):
+                        await save_chat_log(
+                            username=self.username,
+                            user_message=message,
+                            bot_response=response,
+                            tenant_id=self.tenant_id
+                        )
+                except Exception as e:
+                    s.set(persist_error=repr(e)[:200])
+                    logger.error(f"Error saving chat log: {e}")
+        except asyncio.CancelledError:
+            status_code = 499
+            ws_stats["cancelled"] += 1
+            cancel_stats["cancelled"] += 1
+            cancel_stats["cancelled_seconds"] += time.perf_counter() - start
+            self.push({"type": "cancelled", "id": msg_id})
+            raise
+        except Exception as e:
+            logger.error(f"Error in WebSocket chat: {e}")
+            status_code = 500
+            self.push({"type": "error", "id": msg_id, "detail": "internal_error"})
+        finally:
+            self.questions.pop(msg_id, None)
+            record_request_metric(
+                "ws", self.tenant_id, response, status_code=status_code,
+                elapsed=time.perf_counter() - start, session_id=session_id,
+                route="cancelled" if status_code == 499 else None
+            )
+
+
+async def _auth_frame(websocket: WebSocket) -> Optional[dict]:
+    """Claims from a first {"type": "auth", "token": ...} frame on the accepted socket."""
+    try:
+        frame = await asyncio.wait_for(websocket.receive_json(), settings.WS_AUTH_TIMEOUT)
+    except (asyncio.TimeoutError, ValueError, WebSocketDisconnect):
+        return None
+    if not isinstance(frame, dict) or frame.get("type") != "auth" or not isinstance(frame.get("token"), str):
+        return None
+    return claims_from_token(frame["token"])
+
+
+@router.websocket("/ws")
+async def chat_ws(websocket: WebSocket, token: Optional[str] = None, tenant: Optional[str] = None):
+    """Chat over one WebSocket: several questions in flight, answers streamed by id"""
+    ws_stats["connections"] += 1
+    if token is not None:
+        claims = claims_from_token(token)
+        if claims is None:
+            # Rejected during the handshake (HTTP 403), nothing accepted yet
+            ws_stats["auth_failures"] += 1
+            await websocket.close(code=CLOSE_POLICY_VIOLATION)
+            return
+        await websocket.accept()
+    else:
+        await websocket.accept()
+        claims = await _auth_frame(websocket)
+        if claims is None:
+            ws_stats["auth_failures"] += 1
+            await websocket.close(code=CLOSE_UNAUTHORIZED, reason="could not validate credentials")
+            return
+
+    tenant_id = websocket.headers.get("x-tenant-id") or tenant or "default"
+    session = ChatSocket(websocket, claims["sub"], tenant_id, claims.get("exp"))
+    ws_stats["open"] += 1
+    try:
+        await session.run()
+    finally:
+        ws_stats["open"] -= 1
+
+
+def get_ws_stats() -> dict:
+    return dict(ws_stats)
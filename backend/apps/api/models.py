@@ -1,15 +1,34 @@
 # /apps/apps/api/models.py
 """Pydantic models for API requests and responses"""
-from typing import Optional, List
+from typing import Annotated, Literal, Optional, List
 from datetime import datetime
 from pydantic import BaseModel, Field
+from apps.rag.config import BATCH_MAX_QUESTIONS
 
 class ChatRequest(BaseModel):
     message: str = Field(..., min_length=1, max_length=1000)
+    # Conversation session: follow-ups are answered with the earlier turns
+    session_id: Optional[str] = Field(None, min_length=1, max_length=64)
 
 class ChatResponse(BaseModel):
     message: str
     sources: List[str] = [] 
+    degraded: bool = False  # retrieval-only answer, the LLM was unavailable
+
+class BatchChatRequest(BaseModel):
+    questions: List[Annotated[str, Field(min_length=1, max_length=1000)]] = Field(
+        ..., min_length=1, max_length=BATCH_MAX_QUESTIONS
+    )
+
+class IngestJobRequest(BaseModel):
+    mode: Literal["full", "incremental"] = "full"
+    tenant_id: Optional[str] = None        # defaults to the X-Tenant-ID tenant
+    rebuild: bool = False                  # full: drop the tenant's points first
+    # incremental: files relative to the docs dir (deleted files included);
+    # omitted = files modified since the last successful job
+    sources: Optional[List[str]] = None
+    build_faq: bool = False                # full only; needs Ollama (one generation per FAQ entry)
+    dedup: bool = True
 
 class QueryRequest(BaseModel):
     q: str = Field(..., min_length=1, max_length=1000)
@@ -8,6 +8,7 @@ from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 
 from apps.core.settings import settings
+from apps.core.tracing import span
 from apps.core.userstore import get_user_by_username
 from apps.core.security import verify_password, get_password_hash  # Password helpers
 
@@ -31,8 +32,26 @@ def create_access_token(
     )
     return encoded_jwt
 
+def claims_from_token(token: str) -> Optional[dict]:
+    """Claims of a valid token for an existing user, or None (for checks outside the dependency system)"""
+    try:
+        payload = jwt.decode(token, settings.JWT_SECRET, algorithms=[settings.JWT_ALGORITHM])
+    except JWTError:
+        return None
+    username = payload.get("sub")
+    return payload if username and get_user_by_username(username) else None
+
+def username_from_token(token: str) -> Optional[str]:
+    """Username of a valid token, or None"""
+    claims = claims_from_token(token)
+    return claims["sub"] if claims else None
+
 async def get_current_user(token: str = Depends(oauth2_scheme)) -> dict:
     """Validate JWT token and return current user"""
+    with span("auth"):
+        return _validate_token(token)
+
+def _validate_token(token: str) -> dict:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -0,0 +1,53 @@
+# backend/apps/core/cancellation.py
+# Cancel in-flight request work when the HTTP client goes away
+"""Cancel in-flight request work when the HTTP client goes away"""
+import asyncio
+import time
+from typing import Any, Awaitable
+
+from fastapi import Request
+
+# How often the route checks whether the client is still connected
+DISCONNECT_POLL_INTERVAL = 0.25
+
+cancel_stats = {
+    "cancelled": 0,
+    "cancelled_seconds": 0.0,  # wall time already spent on work nobody will read
+}
+
+
+class ClientDisconnected(Exception):
+    """The client closed the connection before the response was ready."""
+
+
+async def run_until_disconnected(request: Request, aw: Awaitable) -> Any:
+    """
+    Run `aw` as a task and cancel it as soon as the client disconnects.
+    Cancellation propagates down the stack: the Ollama HTTP call is aborted
+    (Ollama stops generating when its client hangs up) and executor jobs that
+    have not started yet are dropped.
+    """
+    task = asyncio.ensure_future(aw)
+    start = time.monotonic()
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=DISCONNECT_POLL_INTERVAL)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+                cancel_stats["cancelled"] += 1
+                cancel_stats["cancelled_seconds"] += time.monotonic() - start
+                raise ClientDisconnected()
+    except asyncio.CancelledError:
+        # Server-side cancellation (e.g. shutdown): don't leave the task orphaned
+        task.cancel()
+        raise
+
+
+def get_cancel_stats() -> dict:
+    return {**cancel_stats, "cancelled_seconds": round(cancel_stats["cancelled_seconds"], 3)}
@@ -4,8 +4,9 @@
 
 """Shared dependencies for routes (Auth, Tenant, DB, etc.)"""
 
-from fastapi import Depends, Request
+from fastapi import Depends, HTTPException, Request, status
 from apps.core.auth import get_current_user
+from apps.core.settings import settings
 
 # ------------------------------
 # Auth Dependency
@@ -14,6 +15,19 @@ from apps.core.auth import get_current_user
 CurrentUser = Depends(get_current_user)
 
 
+# ------------------------------
+# Admin Dependency
+# ------------------------------
+async def get_current_admin(current_user: dict = Depends(get_current_user)) -> dict:
+    """Current user, if listed in settings.ADMIN_USERS"""
+    if current_user["username"] not in settings.ADMIN_USERS:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin privileges required",
+        )
+    return current_user
+
+
 # ------------------------------
 # Multi-Tenant Dependency
 # ------------------------------
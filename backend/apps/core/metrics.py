@@ -0,0 +1,338 @@
+# backend/apps/core/metrics.py
+# Request metrics pipeline: per-request rows are buffered in memory and
+# written to Postgres in bulk by one background task, together with additive
+# per-minute rollups (counters + latency histograms). Stats endpoints read the
+# rollups only, never the raw rows.
+"""Buffered request metrics with per-minute rollups in Postgres"""
+import asyncio
+import logging
+import math
+import time
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from apps.core.settings import settings
+
+log = logging.getLogger(__name__)
+
+# Latency histogram: bin i covers (2^((i-1)/4), 2^(i/4)] ms, about 19% wide,
+# so a percentile read from it is at most ~19% high. Bin 0 is everything <= 1 ms.
+BINS_PER_OCTAVE = 4
+MAX_BIN = 80            # 2^20 ms ~ 17 minutes
+STAGES = ("total", "retrieval", "llm")
+
+
+def latency_bin(seconds: float) -> int:
+    ms = seconds * 1000
+    if ms <= 1:
+        return 0
+    return min(MAX_BIN, math.ceil(BINS_PER_OCTAVE * math.log2(ms)))
+
+
+def bin_upper_ms(index: int) -> float:
+    return 2 ** (index / BINS_PER_OCTAVE)
+
+
+def percentiles_from_histogram(counts: Dict[int, int], ps=(50, 95, 99)) -> Dict[str, Optional[float]]:
+    total = sum(counts.values())
+    result = {}
+    for p in ps:
+        if not total:
+            result[f"p{p}_ms"] = None
+            continue
+        rank, seen = p / 100 * total, 0
+        for index in sorted(counts):
+            seen += counts[index]
+            if seen >= rank:
+                result[f"p{p}_ms"] = round(bin_upper_ms(index), 1)
+                break
+    return result
+
+
+def metric_from_response(
+    endpoint: str,
+    tenant_id: str,
+    response: Optional[dict],
+    status_code: int = 200,
+    elapsed: Optional[float] = None,
+    session_id: Optional[str] = None,
+    route: Optional[str] = None,
+) -> dict:
+    """Flatten a run_rag_query response (or None after a failure) into one metrics row."""
+    response = response or {}
+    metrics = response.get("metrics") or {}
+    if route is None:
+        route = metrics.get("route") or ("error" if response.get("error") or status_code >= 400 else "unknown")
+    return {
+        "created_at": datetime.utcnow(),
+        "endpoint": endpoint,
+        "route": route,
+        "tenant_id": tenant_id,
+        "session_id": session_id,
+        "status_code": status_code,
+        "cached": bool(response.get("cached")),
+        "degraded": bool(response.get("degraded")),
+        "total_time": elapsed if elapsed is not None else response.get("response_time"),
+        "retrieval_time": metrics.get("retrieval_time"),
+        "llm_time": metrics.get("llm_time"),
+        "prompt_tokens": metrics.get("llm_prompt_tokens"),
+        "eval_tokens": metrics.get("llm_eval_tokens"),
+        "llm_model": metrics.get("llm_model"),
+    }
+
+
+class MetricsPipeline:
+    def __init__(self):
+        self._buffer: deque = deque()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._tables_ready = False
+        self._last_prune = 0.0
+        self.stats = {"recorded": 0, "written": 0, "dropped": 0, "flushes": 0, "failed_flushes": 0, "last_flush_ms": None}
+
+    # ---------------------------
+    # Write path
+    # ---------------------------
+    def record(self, row: dict) -> None:
+        """Queue one row; never blocks the request and never raises."""
+        if not settings.METRICS_ENABLED:
+            return
+        if len(self._buffer) >= settings.METRICS_BUFFER_LIMIT:
+            self.stats["dropped"] += 1
+            return
+        self._buffer.append(row)
+        self.stats["recorded"] += 1
+        if self._wakeup is not None and len(self._buffer) >= settings.METRICS_BATCH_SIZE:
+            self._wakeup.set()
+
+    def start(self) -> Optional[asyncio.Task]:
+        if not settings.METRICS_ENABLED or self._task is not None:
+            return self._task
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        return self._task
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=settings.METRICS_FLUSH_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            while self._buffer:
+                if not await self.flush():
+                    break  # Postgres unavailable: retry on the next tick
+            await self._prune_raw()
+
+    async def flush(self) -> bool:
+        """Write up to one batch: raw rows plus their rollup increments, in one transaction."""
+        batch = [self._buffer.popleft() for _ in range(min(len(self._buffer), settings.METRICS_BATCH_SIZE))]
+        if not batch:
+            return True
+        start = time.perf_counter()
+        try:
+            await self._write(batch)
+        except Exception as e:
+            self.stats["failed_flushes"] += 1
+            # Put the batch back if there is room; otherwise it is lost
+            room = max(0, settings.METRICS_BUFFER_LIMIT - len(self._buffer))
+            self._buffer.extendleft(reversed(batch[:room]))
+            self.stats["dropped"] += len(batch) - min(room, len(batch))
+            log.warning(f"⚠️ Metrics flush failed ({len(batch)} rows): {e}")
+            return False
+        self.stats["flushes"] += 1
+        self.stats["written"] += len(batch)
+        self.stats["last_flush_ms"] = round((time.perf_counter() - start) * 1000, 2)
+        return True
+
+    async def _write(self, batch: List[dict]):
+        from sqlalchemy import insert, func
+        from sqlalchemy.dialects.postgresql import insert as pg_insert
+        from apps.models.pg_models import RequestMetric, MetricRollup, LatencyHistogram
+
+        session_factory = await self._session_factory()
+        rollups, histograms = self._aggregate(batch)
+        async with session_factory() as session:
+            async with session.begin():
+                await session.execute(insert(RequestMetric), batch)
+
+                stmt = pg_insert(MetricRollup).values(list(rollups.values()))
+                table = MetricRollup.__table__.c
+                additive = ("requests", "errors", "degraded", "cache_hits", "total_time_sum",
+                            "retrieval_time_sum", "llm_time_sum", "prompt_tokens", "eval_tokens")
+                await session.execute(stmt.on_conflict_do_update(
+                    index_elements=["bucket", "endpoint", "route", "tenant_id"],
+                    set_={
+                        **{c: table[c] + stmt.excluded[c] for c in additive},
+                        "total_time_max": func.greatest(table.total_time_max, stmt.excluded.total_time_max),
+                    },
+                ))
+
+                if histograms:
+                    stmt = pg_insert(LatencyHistogram).values(
+                        [{**dict(zip(("bucket", "endpoint", "route", "tenant_id", "stage", "bin"), key)), "count": n}
+                         for key, n in histograms.items()]
+                    )
+                    await session.execute(stmt.on_conflict_do_update(
+                        index_elements=["bucket", "endpoint", "route", "tenant_id", "stage", "bin"],
+                        set_={"count": LatencyHistogram.__table__.c["count"] + stmt.excluded["count"]},
+                    ))
+
+    @staticmethod
+    def _aggregate(batch: List[dict]):
+        rollups: Dict[tuple, dict] = {}
+        histograms: Dict[tuple, int] = {}
+        for row in batch:
+            bucket = row["created_at"].replace(second=0, microsecond=0)
+            key = (bucket, row["endpoint"], row["route"], row["tenant_id"])
+            r = rollups.get(key)
+            if r is None:
+                r = rollups[key] = {
+                    "bucket": bucket, "endpoint": row["endpoint"], "route": row["route"], "tenant_id": row["tenant_id"],
+                    "requests": 0, "errors": 0, "degraded": 0, "cache_hits": 0, "total_time_sum": 0.0,
+                    "total_time_max": 0.0, "retrieval_time_sum": 0.0, "llm_time_sum": 0.0,
+                    "prompt_tokens": 0, "eval_tokens": 0,
+                }
+            r["requests"] += 1
+            r["errors"] += (row["status_code"] or 0) >= 500 or row["route"] == "error"
+            r["degraded"] += row["degraded"]
+            r["cache_hits"] += row["cached"]
+            r["total_time_sum"] += row["total_time"] or 0.0
+            r["total_time_max"] = max(r["total_time_max"], row["total_time"] or 0.0)
+            r["retrieval_time_sum"] += row["retrieval_time"] or 0.0
+            r["llm_time_sum"] += row["llm_time"] or 0.0
+            r["prompt_tokens"] += row["prompt_tokens"] or 0
+            r["eval_tokens"] += row["eval_tokens"] or 0
+            for stage in STAGES:
+                seconds = row[f"{stage}_time"]
+                if seconds is not None:
+                    hkey = key + (stage, latency_bin(seconds))
+                    histograms[hkey] = histograms.get(hkey, 0) + 1
+        return rollups, histograms
+
+    async def _session_factory(self):
+        from apps.core import postgres
+        from apps.models.pg_models import Base, RequestMetric, MetricRollup, LatencyHistogram
+
+        if postgres.AsyncSessionLocal is None:
+            postgres.init_db()
+        if not self._tables_ready:
+            tables = [RequestMetric.__table__, MetricRollup.__table__, LatencyHistogram.__table__]
+            async with postgres.engine.begin() as conn:
+                await conn.run_sync(lambda sync_conn: Base.metadata.create_all(sync_conn, tables=tables))
+            self._tables_ready = True
+        return postgres.AsyncSessionLocal
+
+    async def _prune_raw(self):
+        """Drop raw rows past retention (hourly); the rollups keep the history."""
+        if time.monotonic() - self._last_prune < 3600:
+            return
+        self._last_prune = time.monotonic()
+        from sqlalchemy import delete
+        from apps.models.pg_models import RequestMetric
+        try:
+            session_factory = await self._session_factory()
+            cutoff = datetime.utcnow() - timedelta(days=settings.METRICS_RAW_RETENTION_DAYS)
+            async with session_factory() as session:
+                async with session.begin():
+                    await session.execute(delete(RequestMetric).where(RequestMetric.created_at < cutoff))
+        except Exception as e:
+            log.warning(f"⚠️ Metrics retention cleanup failed: {e}")
+
+    async def shutdown(self):
+        """Stop the flusher and write what is left in the buffer."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        while self._buffer:
+            if not await self.flush():
+                break
+
+    # ---------------------------
+    # Read path (rollups only)
+    # ---------------------------
+    async def latency_stats(
+        self,
+        windows: List[int],
+        stage: str = "total",
+        endpoint: Optional[str] = None,
+        route: Optional[str] = None,
+        tenant_id: Optional[str] = None,
+    ) -> dict:
+        """Percentiles and counters for each window (minutes back from now)."""
+        from sqlalchemy import select, func
+        from apps.models.pg_models import MetricRollup, LatencyHistogram
+
+        session_factory = await self._session_factory()
+        now = datetime.utcnow()
+        results = []
+        async with session_factory() as session:
+            for minutes in windows:
+                since = now - timedelta(minutes=minutes)
+
+                def scoped(query, model):
+                    query = query.where(model.bucket >= since)
+                    for column, value in (("endpoint", endpoint), ("route", route), ("tenant_id", tenant_id)):
+                        if value is not None:
+                            query = query.where(getattr(model, column) == value)
+                    return query
+
+                hist = await session.execute(scoped(
+                    select(LatencyHistogram.bin, func.sum(LatencyHistogram.count))
+                    .where(LatencyHistogram.stage == stage)
+                    .group_by(LatencyHistogram.bin),
+                    LatencyHistogram,
+                ))
+                counts = {b: int(n) for b, n in hist.all()}
+                totals = (await session.execute(scoped(
+                    select(
+                        func.coalesce(func.sum(MetricRollup.requests), 0),
+                        func.coalesce(func.sum(MetricRollup.errors), 0),
+                        func.coalesce(func.sum(MetricRollup.degraded), 0),
+                        func.coalesce(func.sum(MetricRollup.cache_hits), 0),
+                        func.coalesce(func.sum(MetricRollup.total_time_sum), 0.0),
+                        func.max(MetricRollup.total_time_max),
+                        func.coalesce(func.sum(MetricRollup.eval_tokens), 0),
+                    ),
+                    MetricRollup,
+                ))).one()
+                requests, errors, degraded, cache_hits, time_sum, time_max, eval_tokens = totals
+                results.append({
+                    "window_minutes": minutes,
+                    "requests": int(requests),
+                    "requests_per_min": round(requests / minutes, 2),
+                    "error_rate": round(errors / requests, 4) if requests else 0.0,
+                    "degraded_rate": round(degraded / requests, 4) if requests else 0.0,
+                    "cache_hit_rate": round(cache_hits / requests, 4) if requests else 0.0,
+                    "mean_ms": round(time_sum / requests * 1000, 1) if requests else None,
+                    "max_ms": round(time_max * 1000, 1) if time_max is not None else None,
+                    "eval_tokens": int(eval_tokens),
+                    "samples": sum(counts.values()),
+                    **percentiles_from_histogram(counts),
+                })
+        return {
+            "stage": stage,
+            "filters": {"endpoint": endpoint, "route": route, "tenant_id": tenant_id},
+            "windows": results,
+        }
+
+    def get_stats(self) -> dict:
+        return {**self.stats, "enabled": settings.METRICS_ENABLED, "buffered": len(self._buffer)}
+
+# Global instance
+metrics_pipeline = MetricsPipeline()
+
+# Convenience functions
+def record_request_metric(endpoint: str, tenant_id: str, response: Optional[dict] = None, **kwargs):
+    metrics_pipeline.record(metric_from_response(endpoint, tenant_id, response, **kwargs))
+
+async def get_latency_stats(windows: List[int], **filters) -> dict:
+    return await metrics_pipeline.latency_stats(windows, **filters)
+
+def get_metrics_stats() -> dict:
+    return metrics_pipeline.get_stats()
@@ -2,18 +2,20 @@
 # MongoDB utilities for handling chat logs and other data storage   
 """MongoDB utilities for handling chat logs and other data storage"""
 from pymongo import MongoClient
-from datetime import datetime
-from typing import List, Dict, Any
+from datetime import datetime, timedelta
+from typing import List, Dict, Any, Optional
 import asyncio
 from concurrent.futures import ThreadPoolExecutor
 
 from apps.core.settings import settings
+from apps.core.tracing import traced
 
 class MongoManager:
     def __init__(self):
         self.client = None
         self.db = None
         self.chat_log_collection = None
+        self.ingest_job_collection = None
         self._executor = ThreadPoolExecutor(max_workers=4)
     
     def connect(self):
@@ -25,12 +27,14 @@ class MongoManager:
             self.client = MongoClient(mongo_uri)
             self.db = self.client["samsubot"]
             self.chat_log_collection = self.db["chat_logs"]
+            self.ingest_job_collection = self.db["ingest_jobs"]
     
     async def save_chat_log(
         self, 
         username: str, 
         user_message: str, 
-        bot_response: str
+        bot_response: str,
+        tenant_id: str = "default"
     ) -> None:
         """Save chat log asynchronously"""
         self.connect()
@@ -38,13 +42,14 @@ class MongoManager:
         def _save():
             self.chat_log_collection.insert_one({
                 "username": username,
+                "tenant_id": tenant_id,
                 "user_message": user_message,
                 "bot_response": bot_response,
                 "timestamp": datetime.utcnow()
             })
         
         loop = asyncio.get_event_loop()
-        await loop.run_in_executor(self._executor, _save)
+        await loop.run_in_executor(self._executor, traced("mongo.save_chat_log", _save))
     
     async def get_chat_history(
         self, 
@@ -63,14 +68,97 @@ class MongoManager:
             )
         
         loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(self._executor, _get_history)
+        return await loop.run_in_executor(self._executor, traced("mongo.get_chat_history", _get_history))
+
+    async def get_top_questions(
+        self,
+        limit: int = 100,
+        days: int = 30,
+        tenant_id: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """Most frequent recent user questions as {question, tenant_id, count}"""
+        self.connect()
+        
+        match: Dict[str, Any] = {"timestamp": {"$gte": datetime.utcnow() - timedelta(days=days)}}
+        if tenant_id == "default":
+            # Logs written before tenancy have no tenant_id
+            match["tenant_id"] = {"$in": ["default", None]}
+        elif tenant_id:
+            match["tenant_id"] = tenant_id
+        
+        def _aggregate():
+            return list(self.chat_log_collection.aggregate([
+                {"$match": match},
+                {"$group": {
+                    "_id": {
+                        "q": {"$toLower": {"$trim": {"input": "$user_message"}}},
+                        "t": {"$ifNull": ["$tenant_id", "default"]},
+                    },
+                    "question": {"$first": "$user_message"},
+                    "count": {"$sum": 1},
+                }},
+                {"$sort": {"count": -1}},
+                {"$limit": limit},
+            ]))
+        
+        loop = asyncio.get_event_loop()
+        rows = await loop.run_in_executor(self._executor, traced("mongo.get_top_questions", _aggregate))
+        return [
+            {"question": r["question"], "tenant_id": r["_id"]["t"], "count": r["count"]}
+            for r in rows
+        ]
+
+    async def save_ingest_job(self, job: Dict[str, Any]) -> None:
+        """Insert or update an ingest job record (keyed by job_id)"""
+        self.connect()
+        
+        def _save():
+            self.ingest_job_collection.replace_one({"job_id": job["job_id"]}, dict(job), upsert=True)
+        
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(self._executor, traced("mongo.save_ingest_job", _save))
+    
+    async def get_ingest_jobs(
+        self,
+        limit: int = 50,
+        tenant_id: Optional[str] = None,
+        status: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """Ingest job history, newest first"""
+        self.connect()
+        
+        query: Dict[str, Any] = {}
+        if tenant_id:
+            query["tenant_id"] = tenant_id
+        if status:
+            query["status"] = status
+        
+        def _get_jobs():
+            return list(
+                self.ingest_job_collection
+                .find(query, {"_id": 0})
+                .sort("created_at", -1)
+                .limit(limit)
+            )
+        
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(self._executor, traced("mongo.get_ingest_jobs", _get_jobs))
 
 # Global instance
 mongo_manager = MongoManager()
 
 # Convenience functions
-async def save_chat_log(username: str, user_message: str, bot_response: str):
-    await mongo_manager.save_chat_log(username, user_message, bot_response)
+async def save_chat_log(username: str, user_message: str, bot_response: str, tenant_id: str = "default"):
+    await mongo_manager.save_chat_log(username, user_message, bot_response, tenant_id)
 
 async def get_chat_history(username: str, limit: int = 50):
-    return await mongo_manager.get_chat_history(username, limit)
\ No newline at end of file
+    return await mongo_manager.get_chat_history(username, limit)
+
+async def get_top_questions(limit: int = 100, days: int = 30, tenant_id: Optional[str] = None):
+    return await mongo_manager.get_top_questions(limit, days, tenant_id)
+
+async def save_ingest_job(job: Dict[str, Any]):
+    await mongo_manager.save_ingest_job(job)
+
+async def get_ingest_jobs(limit: int = 50, tenant_id: Optional[str] = None, status: Optional[str] = None):
+    return await mongo_manager.get_ingest_jobs(limit, tenant_id, status)
\ No newline at end of file
@@ -0,0 +1,298 @@
+# backend/apps/core/profiler.py
+# Opt-in per-request sampling profiler.
+#
+# A request is profiled when an admin sends `X-Profile: 1` or when it falls in
+# PROFILE_SAMPLE_RATE. While at least one profiled request is in flight, one
+# daemon thread wakes every PROFILE_INTERVAL seconds and records the Python
+# stack of the event-loop thread and of every busy executor thread
+# (sys._current_frames, no tracing hooks), so the overhead does not grow with
+# the code being run. Profiles of requests slower than PROFILE_SLOW_THRESHOLD
+# (or explicitly asked for) are written as collapsed stacks ("a;b;c 12"),
+# readable by speedscope, flamegraph.pl or inferno.
+"""Sampling profiler with slow-request capture"""
+import json
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from apps.core.settings import get_optional_settings
+
+settings = get_optional_settings()  # also imported by apps.rag (ingest, debug --profile)
+
+log = logging.getLogger(__name__)
+
+_SITE_PACKAGES = re.compile(r".*[/\\](?:site|dist)-packages[/\\]")
+_BACKEND = re.compile(r".*[/\\](?=apps[/\\])")
+
+
+def _frame_label(code) -> str:
+    path = code.co_filename
+    short = _SITE_PACKAGES.sub("", path)
+    if short == path:
+        short = _BACKEND.sub("", path)
+    if short == path:
+        short = os.path.basename(path)
+    return f"{code.co_name} ({short})"
+
+
+def _thread_label(name: str) -> str:
+    # "rag_3" / "ThreadPoolExecutor-0_1" -> one flame per pool, not per worker
+    return re.sub(r"_\d+$", "", name)
+
+
+class Profile:
+    """Samples collected for one request (or one ad-hoc block of code)."""
+
+    def __init__(self, name: str, loop_thread: Optional[int] = None, forced: bool = False):
+        self.id = uuid.uuid4().hex[:12]
+        self.name = name
+        self.forced = forced
+        self.loop_thread = loop_thread
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.queue_depth: Dict[str, List[int]] = {}
+        self.started_at = time.time()
+        self.start = time.perf_counter()
+        self.duration: Optional[float] = None
+
+    def folded(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def top_frames(self, limit: int = 15) -> List[dict]:
+        """Innermost frames by share of samples ("self time")."""
+        leaves: Counter = Counter()
+        for stack, count in self.stacks.items():
+            leaves[stack.rsplit(";", 1)[-1]] += count
+        total = sum(leaves.values()) or 1
+        return [{"frame": f, "samples": n, "share": round(n / total, 3)} for f, n in leaves.most_common(limit)]
+
+    def meta(self) -> dict:
+        return {
+            "id": self.id,
+            "name": self.name,
+            "forced": self.forced,
+            "started_at": self.started_at,
+            "duration_ms": round((self.duration or 0.0) * 1000, 1),
+            "samples": self.samples,
+            "interval_ms": settings.PROFILE_INTERVAL * 1000,
+            "queue_depth": {
+                q: {"max": max(d), "mean": round(sum(d) / len(d), 2)} for q, d in self.queue_depth.items() if d
+            },
+            "top_frames": self.top_frames(),
+        }
+
+
+class SamplingProfiler:
+    def __init__(self):
+        self._active: Dict[str, Profile] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._queue_probes: Dict[str, Callable[[], int]] = {}
+        self.stats = {"profiled": 0, "saved": 0, "ticks": 0, "tick_time": 0.0}
+
+    def register_queue_probe(self, name: str, probe: Callable[[], int]):
+        """Track a backlog (e.g. an executor's work queue) while profiling."""
+        self._queue_probes[name] = probe
+
+    def should_profile(self, forced: bool) -> bool:
+        return forced or (settings.PROFILE_SAMPLE_RATE > 0 and random.random() < settings.PROFILE_SAMPLE_RATE)
+
+    # ---------------------------
+    # Session lifecycle
+    # ---------------------------
+    def begin(self, name: str, forced: bool = False) -> Profile:
+        profile = Profile(name, loop_thread=threading.get_ident(), forced=forced)
+        with self._lock:
+            self._active[profile.id] = profile
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._sample_loop, name="profiler", daemon=True)
+                self._thread.start()
+        self.stats["profiled"] += 1
+        return profile
+
+    def end(self, profile: Profile) -> Optional[dict]:
+        """Stop sampling for `profile`; save it if it was slow or asked for. Returns its meta if saved."""
+        profile.duration = time.perf_counter() - profile.start
+        with self._lock:
+            self._active.pop(profile.id, None)
+        if profile.forced or profile.duration >= settings.PROFILE_SLOW_THRESHOLD:
+            try:
+                return self.save(profile)
+            except OSError as e:
+                log.warning(f"⚠️ Could not save profile {profile.id}: {e}")
+        return None
+
+    # ---------------------------
+    # Sampler thread
+    # ---------------------------
+    def _sample_loop(self):
+        me = threading.get_ident()
+        while True:
+            with self._lock:
+                if not self._active:
+                    self._thread = None
+                    return
+                active = list(self._active.values())
+            start = time.perf_counter()
+            names = {t.ident: t.name for t in threading.enumerate()}
+            names.update({p.loop_thread: "event-loop" for p in active})
+            stacks = {}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = self._stack(frame)
+                if stack is not None:
+                    stacks[ident] = f"{_thread_label(names.get(ident, str(ident)))};{stack}"
+            depths = {}
+            for q, probe in self._queue_probes.items():
+                try:
+                    depths[q] = probe()
+                except Exception:
+                    pass
+            for profile in active:
+                # The event loop is always sampled (an idle loop shows up in
+                # select(), i.e. waiting on I/O); pool threads only while busy
+                profile.stacks.update(stacks.values())
+                profile.samples += 1
+                for q, depth in depths.items():
+                    profile.queue_depth.setdefault(q, []).append(depth)
+            self.stats["ticks"] += 1
+            self.stats["tick_time"] += time.perf_counter() - start
+            time.sleep(settings.PROFILE_INTERVAL)
+
+    @staticmethod
+    def _stack(frame) -> Optional[str]:
+        """Root-first "f1;f2;f3", or None for an idle pool worker."""
+        frames = []
+        child = None
+        while frame is not None:
+            code = frame.f_code
+            # An executor worker blocked in work_queue.get() (a C call, so
+            # _worker is the innermost Python frame) has nothing to do
+            if code.co_name == "_worker" and child in (None, "get") and code.co_filename.endswith(os.path.join("futures", "thread.py")):
+                return None
+            frames.append(_frame_label(code))
+            child = code.co_name
+            frame = frame.f_back
+        if not frames:
+            return None
+        return ";".join(reversed(frames))
+
+    # ---------------------------
+    # Storage
+    # ---------------------------
+    def save(self, profile: Profile) -> dict:
+        directory = Path(settings.PROFILE_DIR)
+        directory.mkdir(parents=True, exist_ok=True)
+        stamp = time.strftime("%Y%m%dT%H%M%S", time.gmtime(profile.started_at))
+        base = f"{stamp}_{profile.id}"
+        meta = {**profile.meta(), "file": f"{base}.folded"}
+        (directory / f"{base}.folded").write_text(profile.folded())
+        (directory / f"{base}.json").write_text(json.dumps(meta, indent=2))
+        self.stats["saved"] += 1
+        self._prune(directory)
+        log.info(f"🔬 Saved profile {profile.id} for {profile.name} ({meta['duration_ms']} ms, {profile.samples} samples)")
+        return meta
+
+    @staticmethod
+    def _prune(directory: Path):
+        metas = sorted(directory.glob("*.json"))
+        for old in metas[: max(0, len(metas) - settings.PROFILE_MAX_FILES)]:
+            old.unlink(missing_ok=True)
+            old.with_suffix(".folded").unlink(missing_ok=True)
+
+    def list_profiles(self, limit: int = 50) -> List[dict]:
+        directory = Path(settings.PROFILE_DIR)
+        if not directory.exists():
+            return []
+        profiles = []
+        for path in sorted(directory.glob("*.json"), reverse=True)[:limit]:
+            try:
+                profiles.append(json.loads(path.read_text()))
+            except (OSError, ValueError):
+                continue
+        return profiles
+
+    def read_folded(self, profile_id: str) -> Optional[str]:
+        if not re.fullmatch(r"[0-9a-f]{12}", profile_id):
+            return None
+        matches = list(Path(settings.PROFILE_DIR).glob(f"*_{profile_id}.folded"))
+        return matches[0].read_text() if matches else None
+
+    def get_stats(self) -> dict:
+        ticks = self.stats["ticks"]
+        return {
+            "profiled": self.stats["profiled"],
+            "saved": self.stats["saved"],
+            "active": len(self._active),
+            "sample_rate": settings.PROFILE_SAMPLE_RATE,
+            "slow_threshold": settings.PROFILE_SLOW_THRESHOLD,
+            "mean_tick_ms": round(self.stats["tick_time"] / ticks * 1000, 3) if ticks else None,
+        }
+
+
+class ProfilingMiddleware:
+    """
+    Pure ASGI middleware (no BaseHTTPMiddleware, so streaming bodies pass
+    through untouched). Profiles requests to PROFILE_PATHS; a saved profile's
+    id is returned in the X-Profile-Id response header.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not any(scope["path"].startswith(p) for p in settings.PROFILE_PATHS):
+            return await self.app(scope, receive, send)
+        forced = self._admin_requested(scope)
+        if not sampling_profiler.should_profile(forced):
+            return await self.app(scope, receive, send)
+
+        profile = sampling_profiler.begin(f"{scope['method']} {scope['path']}", forced=forced)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and forced:
+                # Forced profiles are always saved: announce the id up front
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(b"x-profile-id", profile.id.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            sampling_profiler.end(profile)
+
+    @staticmethod
+    def _admin_requested(scope) -> bool:
+        headers = dict(scope.get("headers") or [])
+        if headers.get(b"x-profile", b"").lower() not in (b"1", b"true", b"yes"):
+            return False
+        from apps.core.auth import username_from_token
+        auth = headers.get(b"authorization", b"").decode("latin-1")
+        username = username_from_token(auth[7:]) if auth.lower().startswith("bearer ") else None
+        return username is not None and username in settings.ADMIN_USERS
+
+
+# Global instance
+sampling_profiler = SamplingProfiler()
+
+# Convenience functions
+def register_queue_probe(name: str, probe: Callable[[], int]):
+    sampling_profiler.register_queue_probe(name, probe)
+
+def list_profiles(limit: int = 50) -> List[dict]:
+    return sampling_profiler.list_profiles(limit)
+
+def read_profile(profile_id: str) -> Optional[str]:
+    return sampling_profiler.read_folded(profile_id)
+
+def get_profiler_stats() -> dict:
+    return sampling_profiler.get_stats()
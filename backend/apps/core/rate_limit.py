@@ -0,0 +1,149 @@
+# backend/apps/core/rate_limit.py
+# Distributed per-user rate limiting with Redis token buckets
+"""Distributed per-user rate limiting with Redis token buckets"""
+import logging
+import math
+import time
+from typing import Dict, Tuple
+
+from fastapi import Depends, HTTPException, status
+from redis.exceptions import RedisError
+
+from apps.core.auth import get_current_user
+from apps.core.redis_client import redis_manager
+from apps.core.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# ------------------------------
+# Redis token bucket (atomic)
+# ------------------------------
+# Refill and take happen in one script so concurrent workers/replicas can
+# never double-spend a token. Redis TIME is used so every caller shares the
+# same clock.
+TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+local retry_after = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+else
+    retry_after = (cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return {allowed, tostring(retry_after)}
+"""
+
+
+class LocalTokenBucket:
+    """In-process token buckets used while Redis is unreachable"""
+
+    MAX_KEYS = 10000
+
+    def __init__(self):
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+
+    def take(self, key: str, capacity: int, rate: float, cost: int = 1) -> Tuple[bool, float]:
+        now = time.monotonic()
+        # Re-inserted on every take, so the first key is the least recently used
+        tokens, ts = self._buckets.pop(key, (capacity, now))
+        if len(self._buckets) >= self.MAX_KEYS:
+            self._buckets.pop(next(iter(self._buckets)))
+        tokens = min(capacity, tokens + (now - ts) * rate)
+        if tokens >= cost:
+            self._buckets[key] = (tokens - cost, now)
+            return True, 0.0
+        self._buckets[key] = (tokens, now)
+        return False, (cost - tokens) / rate
+
+
+class RateLimiter:
+    def __init__(self, capacity: int, refill_rate: float):
+        self.capacity = capacity
+        self.refill_rate = refill_rate
+        self._local = LocalTokenBucket()
+        self._redis_retry_at = 0.0
+        self.stats = {
+            "allowed": 0,
+            "rejected": 0,
+            "rejected_local": 0,
+            "local_fallback": 0,
+            "redis_errors": 0,
+        }
+
+    async def check(self, username: str, cost: int = 1) -> Tuple[bool, float]:
+        """Take `cost` tokens for this user; return (allowed, retry_after_seconds)"""
+        # Keyed on the authenticated user only: the tenant comes from a
+        # client-supplied header and would otherwise hand out a fresh bucket per value
+        key = f"ratelimit:{username}"
+        allowed, retry_after, local = None, 0.0, False
+
+        if time.monotonic() >= self._redis_retry_at:
+            try:
+                result = await redis_manager.eval_script(
+                    TOKEN_BUCKET_SCRIPT,
+                    keys=[key],
+                    args=[self.capacity, self.refill_rate, cost],
+                )
+                allowed, retry_after = bool(int(result[0])), float(result[1])
+            except (RedisError, OSError) as e:
+                self.stats["redis_errors"] += 1
+                self._redis_retry_at = time.monotonic() + settings.RATE_LIMIT_REDIS_RETRY
+                logger.warning(f"Rate limiter falling back to local buckets: {e}")
+
+        if allowed is None:
+            # Per-process only: a user spread over N workers gets N x the limit
+            local = True
+            self.stats["local_fallback"] += 1
+            allowed, retry_after = self._local.take(key, self.capacity, self.refill_rate, cost)
+
+        if allowed:
+            self.stats["allowed"] += 1
+        else:
+            self.stats["rejected"] += 1
+            if local:
+                self.stats["rejected_local"] += 1
+        return allowed, retry_after
+
+    def get_stats(self) -> dict:
+        return {
+            **self.stats,
+            "capacity": self.capacity,
+            "refill_rate": self.refill_rate,
+            "using_local": time.monotonic() < self._redis_retry_at,
+        }
+
+
+# Global instance
+rate_limiter = RateLimiter(settings.RATE_LIMIT_CAPACITY, settings.RATE_LIMIT_REFILL_RATE)
+
+
+# ------------------------------
+# FastAPI dependencies
+# ------------------------------
+async def check_rate_limit(username: str, cost: int = 1) -> None:
+    """Take `cost` tokens or raise 429; a cost above the burst size drains the whole bucket"""
+    if not settings.RATE_LIMIT_ENABLED:
+        return
+    allowed, retry_after = await rate_limiter.check(username, min(cost, rate_limiter.capacity))
+    if not allowed:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Rate limit exceeded, please slow down",
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+        )
+
+
+async def enforce_rate_limit(current_user: dict = Depends(get_current_user)) -> None:
+    """Reject the request with 429 when the user's bucket is empty"""
+    await check_rate_limit(current_user["username"])
@@ -9,12 +9,18 @@ from typing import Any, Optional
 class RedisManager:
     def __init__(self):
         self.redis_client = None
+        self._scripts = {}
     
     async def connect(self):
         """Initialize Redis connection"""
         if not self.redis_client:
             redis_url = settings.REDIS_URL or "redis://samsubot_redis:6379/0"
-            self.redis_client = redis.from_url(redis_url, decode_responses=True)
+            self.redis_client = redis.from_url(
+                redis_url,
+                decode_responses=True,
+                socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+                socket_connect_timeout=settings.REDIS_SOCKET_TIMEOUT,
+            )
     
     async def set_cache(self, key: str, value: Any, expire: int = 3600):
         """Set cache value with expiration"""
@@ -34,5 +40,12 @@ class RedisManager:
         await self.connect()
         await self.redis_client.delete(key)
 
+    async def eval_script(self, script: str, keys: list, args: list) -> Any:
+        """Run a Lua script atomically (loaded once, then called by SHA)"""
+        await self.connect()
+        if script not in self._scripts:
+            self._scripts[script] = self.redis_client.register_script(script)
+        return await self._scripts[script](keys=keys, args=args)
+
 # Global instance
 redis_manager = RedisManager()
\ No newline at end of file
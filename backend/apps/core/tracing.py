@@ -0,0 +1,302 @@
+# backend/apps/core/tracing.py
+# Lightweight request tracing: a request ID per HTTP request (from the
+# middleware, or the caller's X-Request-ID), nested spans kept in a
+# contextvar, and `traced()` to carry the context into thread-pool work,
+# which run_in_executor does not do by itself. Finished spans go to a
+# swappable exporter; the default writes one JSON line per span.
+#
+#   python -m apps.core.tracing traces/spans.jsonl <request_id>   # waterfall
+"""Request IDs, nested spans and a JSON-lines span exporter"""
+import contextvars
+import importlib
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Optional
+
+from apps.core.settings import get_optional_settings
+
+settings = get_optional_settings()  # also imported by apps.rag (ingest, benchmarks)
+
+log = logging.getLogger(__name__)
+
+_current_span: contextvars.ContextVar = contextvars.ContextVar("current_span", default=None)
+
+
+# ---------------------------
+# Spans
+# ---------------------------
+class Span:
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "attrs", "start", "_t0", "duration", "status", "sampled")
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], sampled: bool, attrs: dict):
+        self.trace_id = trace_id
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.name = name
+        self.attrs = attrs
+        self.start = time.time()
+        self._t0 = time.perf_counter()
+        self.duration: Optional[float] = None
+        self.status = "ok"
+        self.sampled = sampled
+
+    def set(self, **attrs):
+        """Attach attributes (model, tokens, hit/miss...) once they are known."""
+        self.attrs.update(attrs)
+
+    def to_record(self) -> dict:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": round(self.start, 6),
+            "duration_ms": round((self.duration or 0.0) * 1000, 3),
+            "status": self.status,
+            "thread": threading.current_thread().name,
+            "attrs": self.attrs,
+        }
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def current_request_id() -> Optional[str]:
+    span = _current_span.get()
+    return span.trace_id if span else None
+
+
+class _NoopSpan:
+    def set(self, **attrs):
+        pass
+
+_NOOP_SPAN = _NoopSpan()
+
+
+@contextmanager
+def span(name: str, root: bool = False, **attrs):
+    """
+    Child of the current span. Works the same in coroutines and threads;
+    exceptions mark the span as failed. Outside a trace (CLI, benchmarks,
+    background warm-up) it does nothing unless `root` starts a new trace.
+    """
+    parent = _current_span.get()
+    if parent is None:
+        if not root:
+            yield _NOOP_SPAN
+            return
+        sampled = settings.TRACE_ENABLED and random.random() < settings.TRACE_SAMPLE_RATE
+        s = Span(name, attrs.pop("trace_id", None) or uuid.uuid4().hex, None, sampled, attrs)
+    else:
+        s = Span(name, parent.trace_id, parent.span_id, parent.sampled, attrs)
+    token = _current_span.set(s)
+    try:
+        yield s
+    except BaseException as e:
+        s.status = "cancelled" if type(e).__name__ == "CancelledError" else "error"
+        s.attrs.setdefault("error", repr(e)[:300])
+        raise
+    finally:
+        s.duration = time.perf_counter() - s._t0
+        _current_span.reset(token)
+        if s.sampled:
+            get_exporter().export(s.to_record())
+
+
+def traced(name: str, fn: Callable, **attrs) -> Callable:
+    """
+    Wrap `fn` for run_in_executor / executor.submit: it runs in a copy of the
+    caller's context, inside a span that also records how long the work sat
+    in the pool's queue before a thread picked it up.
+    """
+    ctx = contextvars.copy_context()
+    submitted = time.perf_counter()
+
+    def run_traced(*args, **kwargs):
+        def body():
+            with span(name, queued_ms=round((time.perf_counter() - submitted) * 1000, 3), **attrs):
+                return fn(*args, **kwargs)
+        return ctx.run(body)
+
+    return run_traced
+
+
+# ---------------------------
+# Exporters
+# ---------------------------
+class SpanExporter:
+    """Receives finished spans as dicts; subclass and name it in TRACE_EXPORTER to swap."""
+
+    def export(self, record: dict) -> None:
+        raise NotImplementedError
+
+    def shutdown(self) -> None:
+        pass
+
+
+class NullExporter(SpanExporter):
+    def export(self, record: dict) -> None:
+        pass
+
+
+class StdoutExporter(SpanExporter):
+    def export(self, record: dict) -> None:
+        sys.stdout.write(json.dumps(record, default=str) + "\n")
+
+
+class JsonLinesExporter(SpanExporter):
+    """Appends spans to a file from a writer thread; never blocks the caller on disk."""
+
+    def __init__(self, path: str, max_bytes: int):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def export(self, record: dict) -> None:
+        self._queue.put(record)
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._write_loop, name="span-writer", daemon=True)
+                    self._thread.start()
+
+    def _write_loop(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        while True:
+            batch = [self._queue.get()]
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = None in batch
+            lines = "".join(json.dumps(r, default=str) + "\n" for r in batch if r is not None)
+            try:
+                if self.path.exists() and self.path.stat().st_size > self.max_bytes:
+                    os.replace(self.path, self.path.with_name(self.path.name + ".1"))
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(lines)
+            except OSError as e:
+                log.warning(f"⚠️ Span export failed ({len(batch)} spans): {e}")
+            if stop:
+                return
+
+    def shutdown(self) -> None:
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join(timeout=5)
+
+
+_exporter: Optional[SpanExporter] = None
+
+
+def get_exporter() -> SpanExporter:
+    global _exporter
+    if _exporter is None:
+        _exporter = _build_exporter(settings.TRACE_EXPORTER)
+    return _exporter
+
+
+def set_exporter(exporter: SpanExporter):
+    """Swap the exporter at runtime (tests, or a collector client)."""
+    global _exporter
+    _exporter = exporter
+
+
+def _build_exporter(name: str) -> SpanExporter:
+    if name == "jsonl":
+        return JsonLinesExporter(settings.TRACE_FILE, settings.TRACE_FILE_MAX_MB * 1024 * 1024)
+    if name == "stdout":
+        return StdoutExporter()
+    if name == "none":
+        return NullExporter()
+    # "package.module:ClassName", constructed without arguments
+    module, _, cls = name.partition(":")
+    return getattr(importlib.import_module(module), cls)()
+
+
+def shutdown_tracing():
+    if _exporter is not None:
+        _exporter.shutdown()
+
+
+# ---------------------------
+# Middleware
+# ---------------------------
+class TracingMiddleware:
+    """
+    Pure ASGI middleware: opens the root span of every HTTP request, keyed by
+    the caller's X-Request-ID (or a new one), and echoes it back as a header.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        headers = dict(scope.get("headers") or [])
+        incoming = headers.get(b"x-request-id", b"").decode("latin-1")
+        request_id = incoming if 0 < len(incoming) <= 64 and incoming.isprintable() else uuid.uuid4().hex
+
+        with span("http.request", root=True, trace_id=request_id, method=scope["method"], path=scope["path"]) as root:
+            async def send_wrapper(message):
+                if message["type"] == "http.response.start":
+                    root.set(status_code=message["status"])
+                    message["headers"] = list(message.get("headers", [])) + [(b"x-request-id", request_id.encode())]
+                await send(message)
+
+            await self.app(scope, receive, send_wrapper)
+
+
+# ---------------------------
+# Waterfall (CLI)
+# ---------------------------
+def waterfall(path: str, trace_id: str) -> str:
+    spans = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if trace_id in line:
+                record = json.loads(line)
+                if record["trace_id"] == trace_id:
+                    spans.append(record)
+    if not spans:
+        return f"No spans for {trace_id}"
+    children = {}
+    for s in spans:
+        children.setdefault(s["parent_id"], []).append(s)
+    t0 = min(s["start"] for s in spans)
+    known = {s["span_id"] for s in spans}
+    roots = [s for s in spans if s["parent_id"] not in known]
+    out = []
+
+    def walk(s, depth):
+        offset = (s["start"] - t0) * 1000
+        extra = {k: v for k, v in s["attrs"].items() if k != "error"}
+        flag = "" if s["status"] == "ok" else f"  [{s['status']}: {s['attrs'].get('error', '')}]"
+        out.append(f"{offset:9.1f} ms {s['duration_ms']:9.1f} ms  {'  ' * depth}{s['name']} ({s['thread']}) {extra or ''}{flag}")
+        for child in sorted(children.get(s["span_id"], []), key=lambda c: c["start"]):
+            walk(child, depth + 1)
+
+    for root in sorted(roots, key=lambda r: r["start"]):
+        walk(root, 0)
+    return "\n".join(out)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("Usage: python -m apps.core.tracing <spans.jsonl> <request_id>")
+        sys.exit(1)
+    print(waterfall(sys.argv[1], sys.argv[2]))
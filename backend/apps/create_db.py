@@ -1,9 +1,10 @@
 from apps.models.pg_models import Base
-from apps.core.postgres import engine
+from apps.core import postgres
 import asyncio
 
 async def create_db():
-    async with engine.begin() as conn:
+    postgres.init_db()
+    async with postgres.engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
 
 asyncio.run(create_db())
\ No newline at end of file
@@ -1,5 +1,6 @@
 """Main FastAPI application"""
 from apps.api import chat_routes
+import asyncio
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
@@ -23,6 +24,20 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Opt-in sampling profiler for /chat/rag (X-Profile: 1 from an admin, or PROFILE_SAMPLE_RATE)
+try:
+    from apps.core.profiler import ProfilingMiddleware
+    app.add_middleware(ProfilingMiddleware)
+except ImportError as e:
+    print(f"Profiler disabled: {e}")
+
+# Request ID + root span of every request (added last, so it wraps the rest)
+try:
+    from apps.core.tracing import TracingMiddleware
+    app.add_middleware(TracingMiddleware)
+except ImportError as e:
+    print(f"Tracing disabled: {e}")
+
 # Health check endpoint (always available)
 @app.get("/")
 async def root():
@@ -32,6 +47,75 @@ async def root():
 async def health_check():
     return {"status": "healthy"}
 
+# Keep the LLM resident: first ping loads the model, later pings reset keep_alive
+@app.on_event("startup")
+async def start_llm_keep_warm():
+    try:
+        from apps.rag.config import OLLAMA_KEEP_WARM_INTERVAL
+        from apps.rag.llm import ollama_pool
+        ollama_pool.start_keep_warm(OLLAMA_KEEP_WARM_INTERVAL)
+    except ImportError as e:
+        print(f"LLM keep-warm disabled: {e}")
+
+# Warm the answer cache from chat history, and again whenever ingest re-indexes
+@app.on_event("startup")
+async def start_cache_warmup():
+    try:
+        from apps.rag.config import WARMUP_ON_STARTUP
+        from apps.rag.warmup import schedule_warmup, watch_index_version
+        if WARMUP_ON_STARTUP:
+            schedule_warmup("startup")
+        app.state.index_watcher = asyncio.create_task(watch_index_version())
+    except ImportError as e:
+        print(f"Cache warm-up disabled: {e}")
+
+# Hot re-indexing of DOCS_DIR (opt-in with WATCH_DOCS=1)
+@app.on_event("startup")
+async def start_docs_watch():
+    try:
+        from apps.rag.config import WATCH_DOCS
+        from apps.rag.watch import watch_docs_in_api
+        if WATCH_DOCS:
+            app.state.docs_watcher = asyncio.create_task(watch_docs_in_api())
+    except ImportError as e:
+        print(f"Docs watch disabled: {e}")
+
+# Buffered request metrics -> Postgres (bulk inserts + per-minute rollups)
+@app.on_event("startup")
+async def start_metrics_pipeline():
+    try:
+        from apps.core.metrics import metrics_pipeline
+        metrics_pipeline.start()
+    except ImportError as e:
+        print(f"Request metrics disabled: {e}")
+
+@app.on_event("shutdown")
+async def stop_llm_client():
+    for name in ("index_watcher", "docs_watcher"):
+        watcher = getattr(app.state, name, None)
+        if watcher is not None:
+            watcher.cancel()
+    try:
+        from apps.core.metrics import metrics_pipeline
+        await metrics_pipeline.shutdown()
+    except ImportError:
+        pass
+    try:
+        from apps.rag.jobs import ingest_jobs
+        await ingest_jobs.shutdown()
+    except ImportError:
+        pass
+    try:
+        from apps.rag.llm import ollama_pool
+        await ollama_pool.aclose()
+    except ImportError:
+        pass
+    try:
+        from apps.core.tracing import shutdown_tracing
+        shutdown_tracing()
+    except ImportError:
+        pass
+
 # Include routers only if they imported successfully
 try:
     from apps.api import auth_routes
@@ -47,6 +131,13 @@ try:
 except ImportError as e:
     print(f"Chat route import error: {e}")
 
+try:
+    from apps.api import chat_ws
+    app.include_router(chat_ws.router, prefix="/chat", tags=["chat"])
+    print("WebSocket chat loaded successfully")
+except ImportError as e:
+    print(f"WebSocket chat import error: {e}")
+
 try:
     from apps.api import protected
     app.include_router(protected.router, prefix="/protected", tags=["protected"])
@@ -54,6 +145,13 @@ try:
 except ImportError as e:
     print(f"Protected route import error: {e}")
 
+try:
+    from apps.api import admin_routes
+    app.include_router(admin_routes.router, prefix="/admin", tags=["admin"])
+    print("Admin routes loaded successfully")
+except ImportError as e:
+    print(f"Admin route import error: {e}")
+
 
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
@@ -1,5 +1,5 @@
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy import Column, Integer, String, Float, DateTime
+from sqlalchemy import Column, Integer, BigInteger, String, Float, DateTime, Boolean, Index
 import datetime
 
 Base = declarative_base()
@@ -11,4 +11,61 @@ class ChatMetric(Base):
     session_id = Column(String)
     intent = Column(String)
     response_time = Column(Float)
-    created_at = Column(DateTime, default=datetime.datetime.utcnow)
\ No newline at end of file
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+# ---------------------------
+# Request metrics (written in bulk by apps/core/metrics.py)
+# ---------------------------
+class RequestMetric(Base):
+    """One row per answered request; kept for METRICS_RAW_RETENTION_DAYS."""
+    __tablename__ = "request_metrics"
+
+    id = Column(BigInteger, primary_key=True)
+    created_at = Column(DateTime, nullable=False, index=True)
+    endpoint = Column(String, nullable=False)       # rag | batch | chatbot
+    route = Column(String, nullable=False)          # llm | cache | faq | extractive | smalltalk | degraded | error ...
+    tenant_id = Column(String, nullable=False)
+    session_id = Column(String)
+    status_code = Column(Integer)
+    cached = Column(Boolean, default=False)
+    degraded = Column(Boolean, default=False)
+    total_time = Column(Float)
+    retrieval_time = Column(Float)
+    llm_time = Column(Float)
+    prompt_tokens = Column(Integer)
+    eval_tokens = Column(Integer)
+    llm_model = Column(String)
+
+class MetricRollup(Base):
+    """Per-minute counters; rows are only ever incremented, so every worker can add to them."""
+    __tablename__ = "request_metric_rollups"
+
+    bucket = Column(DateTime, primary_key=True)     # start of the minute (UTC)
+    endpoint = Column(String, primary_key=True)
+    route = Column(String, primary_key=True)
+    tenant_id = Column(String, primary_key=True)
+    requests = Column(Integer, nullable=False, default=0)
+    errors = Column(Integer, nullable=False, default=0)
+    degraded = Column(Integer, nullable=False, default=0)
+    cache_hits = Column(Integer, nullable=False, default=0)
+    total_time_sum = Column(Float, nullable=False, default=0.0)
+    total_time_max = Column(Float, nullable=False, default=0.0)
+    retrieval_time_sum = Column(Float, nullable=False, default=0.0)
+    llm_time_sum = Column(Float, nullable=False, default=0.0)
+    prompt_tokens = Column(BigInteger, nullable=False, default=0)
+    eval_tokens = Column(BigInteger, nullable=False, default=0)
+
+class LatencyHistogram(Base):
+    """Per-minute latency histograms (log-spaced bins) that percentiles are read from."""
+    __tablename__ = "request_latency_histograms"
+
+    bucket = Column(DateTime, primary_key=True)
+    endpoint = Column(String, primary_key=True)
+    route = Column(String, primary_key=True)
+    tenant_id = Column(String, primary_key=True)
+    stage = Column(String, primary_key=True)        # total | retrieval | llm
+    bin = Column(Integer, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+Index("ix_request_latency_histograms_stage_bucket", LatencyHistogram.stage, LatencyHistogram.bucket)
+Index("ix_request_metric_rollups_bucket", MetricRollup.bucket)
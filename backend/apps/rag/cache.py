@@ -3,26 +3,81 @@
 # Caching utilities
 
 import time
+from contextvars import ContextVar
+from apps.rag.config import DEFAULT_TENANT, CACHE_MAX_SIZE, CACHE_TTL
+
 response_cache = {}
-CACHE_MAX_SIZE = 100
+# Keys filled by the warm-up job, to measure the hit rate it buys
+warmed_keys = set()
+cache_stats = {"hits": 0, "misses": 0, "warm_hits": 0}
+# Set inside the warm-up job: its lookups are not traffic and stay out of the stats
+warming: ContextVar = ContextVar("warming", default=False)
 
-def get_cache_key(question: str) -> str:
-    return question.lower().strip()
+def get_cache_key(question: str, tenant_id: str = DEFAULT_TENANT) -> str:
+    # Partitioned by tenant: the same question can have different answers per tenant
+    return f"{tenant_id}:{question.lower().strip()}"
 
-def cache_response(question: str, response: dict):
+def cache_response(question: str, response: dict, tenant_id: str = DEFAULT_TENANT):
     global response_cache
-    if len(response_cache) >= CACHE_MAX_SIZE:
-        response_cache.pop(next(iter(response_cache)))
-    response_cache[get_cache_key(question)] = {**response, 'cached_at': time.time()}
+    key = get_cache_key(question, tenant_id)
+    if len(response_cache) >= CACHE_MAX_SIZE and key not in response_cache:
+        evicted = next(iter(response_cache))
+        response_cache.pop(evicted)
+        warmed_keys.discard(evicted)
+    response_cache[key] = {**response, 'cached_at': time.time()}
+
+def mark_warmed(question: str, tenant_id: str = DEFAULT_TENANT):
+    warmed_keys.add(get_cache_key(question, tenant_id))
 
-def get_cached_response(question: str) -> dict | None:
-    cached = response_cache.get(get_cache_key(question))
-    if cached and time.time() - cached['cached_at'] < 300:
+def is_cached(question: str, tenant_id: str = DEFAULT_TENANT) -> bool:
+    cached = response_cache.get(get_cache_key(question, tenant_id))
+    return bool(cached) and time.time() - cached['cached_at'] < CACHE_TTL
+
+def get_cached_response(question: str, tenant_id: str = DEFAULT_TENANT) -> dict | None:
+    key = get_cache_key(question, tenant_id)
+    cached = response_cache.get(key)
+    count = not warming.get()
+    if cached and time.time() - cached['cached_at'] < CACHE_TTL:
+        if count:
+            cache_stats["hits"] += 1
+            if key in warmed_keys:
+                cache_stats["warm_hits"] += 1
         return {k: v for k, v in cached.items() if k != 'cached_at'}
+    if count:
+        cache_stats["misses"] += 1
     return None
 
-def clear_cache():
-    response_cache.clear()
+def clear_cache(tenant_id: str | None = None):
+    if tenant_id is None:
+        response_cache.clear()
+        warmed_keys.clear()
+        return
+    prefix = f"{tenant_id}:"
+    for key in [k for k in response_cache if k.startswith(prefix)]:
+        response_cache.pop(key, None)
+        warmed_keys.discard(key)
+
+def invalidate_sources(sources, tenant_id: str = DEFAULT_TENANT) -> int:
+    """Drop the tenant's cached answers built from any of `sources`; returns how many."""
+    sources = set(sources)
+    prefix = f"{tenant_id}:"
+    stale = [
+        k for k, v in response_cache.items()
+        if k.startswith(prefix) and sources.intersection([*v.get("sources", []), *v.get("alt_sources", [])])
+    ]
+    for key in stale:
+        response_cache.pop(key, None)
+        warmed_keys.discard(key)
+    return len(stale)
 
 def get_cache_stats():
-    return {"cache_size": len(response_cache), "max_size": CACHE_MAX_SIZE}
+    lookups = cache_stats["hits"] + cache_stats["misses"]
+    return {
+        "cache_size": len(response_cache),
+        "max_size": CACHE_MAX_SIZE,
+        "ttl": CACHE_TTL,
+        "warmed_entries": len(warmed_keys),
+        **cache_stats,
+        "hit_rate": round(cache_stats["hits"] / lookups, 3) if lookups else 0.0,
+        "warm_hit_rate": round(cache_stats["warm_hits"] / lookups, 3) if lookups else 0.0,
+    }
@@ -0,0 +1,103 @@
+# apps/rag/cascade.py
+# Cascaded generation: small fast model first, escalate to the large model
+# when the first answer fails cheap quality checks.
+
+import time
+from collections import Counter
+from typing import Callable, Optional
+
+from apps.rag.config import (
+    LLM_FAST_MODEL, LLM_FAST_OPTIONS, LLM_OPTIONS, CASCADE_ESCALATE_ON, CASCADE_MIN_GROUNDING,
+)
+from apps.rag.llm import generate
+from apps.rag.prompt import REFUSAL_ANSWER
+from apps.rag.resilience import Deadline
+from apps.rag.routing import content_terms
+
+REFUSAL_PHRASE = REFUSAL_ANSWER.lower().rstrip(".")
+
+cascade_stats = {
+    "fast": {"calls": 0, "time": 0.0},
+    "strong": {"calls": 0, "time": 0.0},
+    "escalations": Counter(),
+}
+
+
+def grounding_score(answer: str, context: str) -> float:
+    """Share of the answer's content terms that also appear in the context."""
+    answer_terms = content_terms(answer)
+    if not answer_terms:
+        return 0.0
+    return len(answer_terms & content_terms(context)) / len(answer_terms)
+
+
+def escalation_reason(generation: dict, context: str) -> Optional[str]:
+    """Name of the first failed check, or None if the answer is good enough."""
+    text = generation["text"].strip()
+    if not text:
+        return "empty"
+    if REFUSAL_PHRASE in text.lower().replace("’", "'"):
+        return "refusal"
+    num_predict = LLM_FAST_OPTIONS.get("num_predict", LLM_OPTIONS["num_predict"])
+    if generation.get("done_reason") == "length" or generation.get("eval_tokens", 0) >= num_predict:
+        return "truncated"
+    if grounding_score(text, context) < CASCADE_MIN_GROUNDING:
+        return "low_grounding"
+    return None
+
+
+def _record(tier: str, elapsed: float):
+    cascade_stats[tier]["calls"] += 1
+    cascade_stats[tier]["time"] += elapsed
+
+
+async def generate_cascaded(
+    prompt: str, context: str, deadline: Deadline, on_token: Optional[Callable[[str], None]] = None
+) -> dict:
+    """
+    Answer with LLM_FAST_MODEL, escalating to the default model when checks fail.
+    Only the final tier is streamed: a fast answer has to pass the checks before
+    anyone sees it, so it is passed to `on_token` in one piece.
+    """
+    start = time.perf_counter()
+    try:
+        fast = await generate(
+            prompt, model=LLM_FAST_MODEL, options=LLM_FAST_OPTIONS, timeout=deadline.remaining()
+        )
+        reason = escalation_reason(fast, context)
+    except Exception as e:
+        # The small model being broken should not take answers down with it
+        fast, reason = None, "fast_error"
+        print(f"⚠️ Fast model failed, escalating: {e}")
+    fast_time = time.perf_counter() - start
+    _record("fast", fast_time)
+
+    if fast is not None and (reason is None or reason not in CASCADE_ESCALATE_ON):
+        if on_token and fast["text"]:
+            on_token(fast["text"])
+        return {**fast, "tier": "fast", "escalation_reason": None, "fast_time": fast_time}
+
+    if fast is None and reason not in CASCADE_ESCALATE_ON:
+        raise RuntimeError("fast model failed and fast_error escalation is disabled")
+
+    cascade_stats["escalations"][reason] += 1
+    start = time.perf_counter()
+    strong = await generate(prompt, timeout=deadline.remaining(), on_token=on_token)
+    _record("strong", time.perf_counter() - start)
+    return {**strong, "tier": "strong", "escalation_reason": reason, "fast_time": fast_time}
+
+
+def get_cascade_stats() -> dict:
+    fast_calls = cascade_stats["fast"]["calls"]
+    escalated = sum(cascade_stats["escalations"].values())
+    return {
+        "tiers": {
+            tier: {
+                "calls": cascade_stats[tier]["calls"],
+                "avg_time": round(cascade_stats[tier]["time"] / max(cascade_stats[tier]["calls"], 1), 3),
+            }
+            for tier in ("fast", "strong")
+        },
+        "escalations": dict(cascade_stats["escalations"]),
+        "escalation_rate": round(escalated / fast_calls, 3) if fast_calls else 0.0,
+    }
@@ -0,0 +1,303 @@
+# apps/rag/chunk_store.py
+# Append-only, memory-mapped store of chunk texts, metadata and vectors,
+# keyed by the Qdrant point IDs from ingest.make_ids. Retrieval asks Qdrant
+# for IDs + scores only and reads everything else from here.
+#
+# Layout per collection (CHUNK_STORE_DIR/<collection>/):
+#   CURRENT              generation number in use
+#   chunks-<gen>.dat     utf-8 text + JSON metadata, back to back
+#   vectors-<gen>.f32    float32 rows, one per record
+#   index-<gen>.idx      fixed-size records; appended last, so a record is
+#                        only visible once its data is on disk
+# Bytes past the last indexed record (a writer that died mid-batch) are
+# ignored by readers and cut off by the next writer before it appends.
+# Compaction writes a new generation and swaps CURRENT atomically; readers
+# notice and remap. Single writer at a time (flock), any number of readers.
+# Records already stored with the same text and metadata are not appended
+# again (point IDs are content hashes), and ingest compacts once dead records
+# pass CHUNK_STORE_COMPACT_RATIO, so re-ingesting doesn't grow the files.
+
+import json
+import mmap
+import os
+import struct
+import threading
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from apps.rag.config import CHUNK_STORE_DIR, CHUNK_STORE_COMPACT_RATIO
+
+try:
+    import fcntl
+except ImportError:  # not on Linux; single-writer is then up to the caller
+    fcntl = None
+
+# point id, data offset, text length, metadata length, vector row
+RECORD = struct.Struct("<16sQIIQ")
+TOMBSTONE = 0xFFFFFFFF
+
+Entry = Tuple[str, dict, np.ndarray]
+
+
+class ChunkStore:
+    def __init__(self, collection: str, root: str = CHUNK_STORE_DIR):
+        self.dir = Path(root) / collection
+        self._lock = threading.Lock()
+        self._reset_view()
+
+    # ---------------------------
+    # Files
+    # ---------------------------
+    def _paths(self, gen: int) -> Tuple[Path, Path, Path]:
+        return (
+            self.dir / f"chunks-{gen}.dat",
+            self.dir / f"vectors-{gen}.f32",
+            self.dir / f"index-{gen}.idx",
+        )
+
+    def _read_current(self) -> Optional[Tuple[int, int]]:
+        """(generation, dim) of the files in use, or None if the store is empty."""
+        try:
+            gen, dim = (self.dir / "CURRENT").read_text().split()
+            return int(gen), int(dim)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _write_current(self, gen: int, dim: int):
+        tmp = self.dir / "CURRENT.tmp"
+        tmp.write_text(f"{gen} {dim}")
+        os.replace(tmp, self.dir / "CURRENT")
+
+    @contextmanager
+    def _writer(self):
+        self.dir.mkdir(parents=True, exist_ok=True)
+        with open(self.dir / ".lock", "w") as lock:
+            if fcntl:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+
+    # ---------------------------
+    # Reading
+    # ---------------------------
+    def _reset_view(self):
+        self._gen = None
+        self.dim = None
+        self._index: Dict[bytes, Tuple[int, int, int, int]] = {}
+        self._idx_size = 0
+        self._rows = 0
+        self._records = 0  # data records in the index, live or not
+        self._data = None
+        self._vectors = None
+
+    def _refresh(self):
+        """Pick up records appended (or a generation swapped in) by the writer."""
+        current = self._read_current()
+        if current is None:
+            self._reset_view()
+            return
+        gen, dim = current
+        if gen != self._gen:
+            self._reset_view()
+            self._gen, self.dim = gen, dim
+        data_path, vec_path, idx_path = self._paths(gen)
+        try:
+            size = os.path.getsize(idx_path)
+        except FileNotFoundError:
+            return
+        usable = size - size % RECORD.size  # ignore a partially written record
+        if usable == self._idx_size:
+            return
+        with open(idx_path, "rb") as f:
+            f.seek(self._idx_size)
+            buf = f.read(usable - self._idx_size)
+        for key, offset, text_len, meta_len, row in RECORD.iter_unpack(buf):
+            if text_len == TOMBSTONE:
+                self._index.pop(key, None)
+            else:
+                self._index[key] = (offset, text_len, meta_len, row)
+                self._rows = max(self._rows, row + 1)
+                self._records += 1
+        self._idx_size = usable
+        # Remap to cover the new data. Old maps are not closed explicitly:
+        # in-flight readers may still hold views into them.
+        self._data = self._map(data_path)
+        vectors = self._map(vec_path)
+        # Only the committed rows: a torn write may have left a partial row behind
+        self._vectors = (
+            np.frombuffer(vectors, dtype=np.float32, count=self._rows * dim).reshape(-1, dim)
+            if vectors and self._rows else None
+        )
+
+    @staticmethod
+    def _map(path: Path) -> Optional[mmap.mmap]:
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return None
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._refresh()
+            return len(self._index)
+
+    def get_many(self, ids: Iterable[str]) -> Dict[str, Entry]:
+        """(text, metadata, vector) per point id found; the vector is a view into the map."""
+        with self._lock:
+            self._refresh()
+            index, data, vectors = self._index, self._data, self._vectors
+        if data is None:
+            return {}
+        view = memoryview(data)
+        found = {}
+        for point_id in ids:
+            entry = index.get(uuid.UUID(str(point_id)).bytes)
+            if entry is None:
+                continue
+            offset, text_len, meta_len, row = entry
+            text = str(view[offset:offset + text_len], "utf-8")
+            meta = json.loads(bytes(view[offset + text_len:offset + text_len + meta_len])) if meta_len else {}
+            found[str(point_id)] = (text, meta, vectors[row])
+        return found
+
+    def ids(self) -> List[str]:
+        with self._lock:
+            self._refresh()
+            return [str(uuid.UUID(bytes=k)) for k in self._index]
+
+    def dead_ratio(self) -> float:
+        """Share of the stored records that were overwritten or deleted."""
+        with self._lock:
+            self._refresh()
+            return 1 - len(self._index) / self._records if self._records else 0.0
+
+    # ---------------------------
+    # Writing (ingest)
+    # ---------------------------
+    def append(self, ids: List[str], texts: List[str], metadatas: List[dict], vectors):
+        """Add or overwrite records; the latest record for an id wins. Unchanged records are skipped."""
+        if not ids:
+            return
+        vectors = np.asarray(vectors, dtype=np.float32)
+        with self._writer():
+            current = self._read_current()
+            if current is None:
+                current = (0, vectors.shape[1])
+                self._write_current(*current)
+            gen, dim = current
+            if vectors.shape[1] != dim:
+                raise ValueError(f"Vector size {vectors.shape[1]} does not match the store ({dim})")
+            entries = {pid: (t, m, v) for pid, t, m, v in zip(ids, texts, metadatas, vectors)}
+            stored = self.get_many(entries)
+            changed = [
+                pid for pid, (text, meta, _) in entries.items()
+                if pid not in stored or stored[pid][:2] != (text, meta)
+            ]
+            if changed:
+                self._write_batch(gen, dim, changed, entries)
+
+    def delete(self, ids: Iterable[str]):
+        with self._writer():
+            current = self._read_current()
+            if current is None:
+                return
+            _, _, idx_path = self._paths(current[0])
+            with open(idx_path, "ab") as fi:
+                fi.write(b"".join(
+                    RECORD.pack(uuid.UUID(str(point_id)).bytes, 0, TOMBSTONE, 0, 0) for point_id in ids
+                ))
+
+    def compact(self, keep_ids: Optional[Iterable[str]] = None) -> int:
+        """
+        Rewrite live records (optionally only `keep_ids`) into a new generation,
+        dropping overwritten, deleted and stale ones. Returns records kept.
+        """
+        reader = ChunkStore(self.dir.name, str(self.dir.parent))
+        with self._writer():
+            current = reader._read_current()
+            if current is None:
+                return 0
+            gen, dim = current
+            keep = None if keep_ids is None else {str(i) for i in keep_ids}
+            ids = [i for i in reader.ids() if keep is None or i in keep]
+            entries = reader.get_many(ids)
+
+            new_gen = gen + 1
+            data_path, vec_path, idx_path = self._paths(new_gen)
+            for path in (data_path, vec_path, idx_path):
+                path.write_bytes(b"")
+            self._write_batch(new_gen, dim, ids, entries)
+            self._write_current(new_gen, dim)
+            for path in self._paths(gen):
+                path.unlink(missing_ok=True)  # open maps keep the old inode alive
+        return len(ids)
+
+    @staticmethod
+    def _truncate_uncommitted(data_path: Path, vec_path: Path, idx_path: Path, dim: int) -> Tuple[int, int]:
+        """
+        Cut every file back to what the index commits to, dropping what a writer
+        that died mid-batch left behind. Returns (data end, next vector row).
+        """
+        data_end = rows = 0
+        with open(idx_path, "a+b") as fi:
+            fi.seek(0)
+            buf = fi.read()
+            usable = len(buf) - len(buf) % RECORD.size
+            fi.truncate(usable)
+        for _, offset, text_len, meta_len, row in RECORD.iter_unpack(buf[:usable]):
+            if text_len != TOMBSTONE:
+                data_end = max(data_end, offset + text_len + meta_len)
+                rows = max(rows, row + 1)
+        for path, size in ((data_path, data_end), (vec_path, rows * dim * 4)):
+            with open(path, "a+b") as f:
+                if os.fstat(f.fileno()).st_size > size:
+                    f.truncate(size)
+        return data_end, rows
+
+    def _write_batch(self, gen: int, dim: int, ids: List[str], entries: Dict[str, Entry]):
+        data_path, vec_path, idx_path = self._paths(gen)
+        offset, row = self._truncate_uncommitted(data_path, vec_path, idx_path, dim)
+        records = []
+        with open(data_path, "ab") as fd, open(vec_path, "ab") as fv:
+            for point_id in ids:
+                text, meta, vector = entries[point_id]
+                text_bytes = text.encode("utf-8")
+                meta_bytes = json.dumps(meta, ensure_ascii=False).encode("utf-8")
+                fd.write(text_bytes)
+                fd.write(meta_bytes)
+                fv.write(np.asarray(vector, dtype=np.float32).tobytes())
+                records.append(RECORD.pack(uuid.UUID(point_id).bytes, offset, len(text_bytes), len(meta_bytes), row))
+                offset += len(text_bytes) + len(meta_bytes)
+                row += 1
+        # Index last: it's the commit point readers look at
+        with open(idx_path, "ab") as fi:
+            fi.write(b"".join(records))
+
+    def compact_if_needed(self, ratio: float = CHUNK_STORE_COMPACT_RATIO) -> Optional[int]:
+        """Compact when dead records pass `ratio`; returns records kept, or None if not needed."""
+        if self.dead_ratio() <= ratio:
+            return None
+        return self.compact()
+
+    def reset(self):
+        """Drop every record (full rebuild of a dedicated collection)."""
+        self.compact(keep_ids=[])
+
+    def disk_usage(self) -> int:
+        return sum(p.stat().st_size for p in self.dir.glob("*-*.*")) if self.dir.exists() else 0
+
+
+_stores: Dict[str, ChunkStore] = {}
+
+
+def get_chunk_store(collection: str) -> ChunkStore:
+    if collection not in _stores:
+        _stores[collection] = ChunkStore(collection)
+    return _stores[collection]
@@ -0,0 +1,187 @@
+# apps/rag/client.py
+# In-process RAG client for scripts, batch jobs and benchmarks.
+#
+#   from apps.rag.client import RagClient
+#   with RagClient() as client:
+#       client.ask("What is SamsuBot?")
+#       client.ask_many(["...", "..."], timeout=120)
+#
+# asyncio.run() per question builds and tears down an event loop every time,
+# and the pooled Ollama connections (bound to their loop) go with it. A
+# RagClient owns one event loop in a background thread instead, so every
+# question after the first takes the same warm path as the API: open
+# connections, resident model, loaded embedder.
+
+import asyncio
+import atexit
+import concurrent.futures
+import logging
+import threading
+from typing import Awaitable, List, Optional
+
+from apps.rag.config import BATCH_CONCURRENCY, DEFAULT_TENANT, OLLAMA_KEEP_WARM_INTERVAL, REQUEST_TIMEOUT
+from apps.rag.resilience import Deadline
+
+log = logging.getLogger(__name__)
+
+# Extra wait on top of the query deadline: the pipeline turns an expired
+# deadline into a timeout answer, which still has to come back
+RESULT_GRACE = 2.0
+
+
+class RagClient:
+    def __init__(
+        self,
+        tenant_id: str = DEFAULT_TENANT,
+        timeout: float = REQUEST_TIMEOUT,
+        concurrency: int = BATCH_CONCURRENCY,
+        keep_warm: bool = False,
+    ):
+        self.tenant_id = tenant_id
+        self.timeout = timeout
+        self.concurrency = concurrency
+        self.keep_warm = keep_warm
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._closed = False
+
+    # ---------------------------
+    # Event loop
+    # ---------------------------
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        if self._loop is not None:
+            return self._loop
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("RagClient is closed")
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                ready = threading.Event()
+
+                def serve():
+                    asyncio.set_event_loop(loop)
+                    loop.call_soon(ready.set)
+                    loop.run_forever()
+
+                self._thread = threading.Thread(target=serve, name="rag-client", daemon=True)
+                self._thread.start()
+                ready.wait()
+                self._loop = loop
+                if self.keep_warm:
+                    asyncio.run_coroutine_threadsafe(self._start_keep_warm(), loop).result()
+        return self._loop
+
+    async def _start_keep_warm(self):
+        from apps.rag.llm import ollama_pool
+        ollama_pool.start_keep_warm(OLLAMA_KEEP_WARM_INTERVAL)
+
+    def _on_own_loop(self) -> bool:
+        return self._thread is not None and threading.current_thread() is self._thread
+
+    def submit(self, aw: Awaitable) -> concurrent.futures.Future:
+        """Schedule a coroutine on the client's loop from any thread."""
+        return asyncio.run_coroutine_threadsafe(aw, self._ensure_loop())
+
+    def run(self, aw: Awaitable, timeout: Optional[float] = None):
+        """Run a coroutine on the client's loop and wait for it; cancelled on timeout."""
+        if self._on_own_loop():
+            raise RuntimeError("RagClient.run() called from its own loop; await the *_async method instead")
+        future = self.submit(aw)
+        try:
+            return future.result(timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise TimeoutError(f"no result within {timeout:.1f}s")
+
+    async def _await_on_loop(self, aw: Awaitable):
+        # Callers on another loop (their own asyncio.run, a notebook) wait on a
+        # wrapped future; the work itself stays on the client's loop
+        if self._on_own_loop():
+            return await aw
+        return await asyncio.wrap_future(self.submit(aw))
+
+    # ---------------------------
+    # Questions
+    # ---------------------------
+    async def _ask(self, question: str, tenant_id: str, timeout: float) -> dict:
+        from apps.rag.query import run_rag_query
+        return await run_rag_query(question, tenant_id, Deadline(timeout))
+
+    async def _ask_many(self, questions: List[str], tenant_id: str, concurrency: int) -> List[dict]:
+        from apps.rag.query import iter_batch_queries
+        results: List[Optional[dict]] = [None] * len(questions)
+        async for result in iter_batch_queries(questions, tenant_id, concurrency):
+            for i in result["indices"]:
+                results[i] = result
+        return results
+
+    def ask(self, question: str, tenant_id: Optional[str] = None, timeout: Optional[float] = None) -> dict:
+        timeout = timeout or self.timeout
+        return self.run(self._ask(question, tenant_id or self.tenant_id, timeout), timeout + RESULT_GRACE)
+
+    async def ask_async(self, question: str, tenant_id: Optional[str] = None, timeout: Optional[float] = None) -> dict:
+        timeout = timeout or self.timeout
+        return await self._await_on_loop(self._ask(question, tenant_id or self.tenant_id, timeout))
+
+    def ask_many(
+        self, questions: List[str], tenant_id: Optional[str] = None, timeout: Optional[float] = None
+    ) -> List[dict]:
+        """Batched retrieval, bounded generation concurrency; results in input order. `timeout` covers the whole batch."""
+        return self.run(self._ask_many(questions, tenant_id or self.tenant_id, self.concurrency), timeout)
+
+    async def ask_many_async(
+        self, questions: List[str], tenant_id: Optional[str] = None, timeout: Optional[float] = None
+    ) -> List[dict]:
+        aw = self._await_on_loop(self._ask_many(questions, tenant_id or self.tenant_id, self.concurrency))
+        return await asyncio.wait_for(aw, timeout)
+
+    # ---------------------------
+    # Shutdown
+    # ---------------------------
+    async def _drain(self):
+        from apps.rag.llm import ollama_pool
+        current = asyncio.current_task()
+        pending = [t for t in asyncio.all_tasks() if t is not current]
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        # The pool is shared: only the connections and keep-warm tasks of this
+        # loop are closed, the API's and other clients' stay open
+        await ollama_pool.aclose()
+
+    def close(self, timeout: float = 10.0):
+        """Cancel outstanding questions, close pooled connections and stop the loop."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            loop, thread = self._loop, self._thread
+        if loop is None:
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(self._drain(), loop).result(timeout)
+        except Exception as e:
+            log.warning(f"⚠️ RagClient shutdown: {e}")
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(timeout)
+        if not thread.is_alive():
+            loop.close()
+
+    def __enter__(self) -> "RagClient":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# Global instance (its loop starts on first use)
+rag_client = RagClient()
+atexit.register(rag_client.close)
+
+# Convenience functions
+def ask(question: str, tenant_id: Optional[str] = None, timeout: Optional[float] = None) -> dict:
+    return rag_client.ask(question, tenant_id, timeout)
+
+def ask_many(questions: List[str], tenant_id: Optional[str] = None, timeout: Optional[float] = None) -> List[dict]:
+    return rag_client.ask_many(questions, tenant_id, timeout)
@@ -1,5 +1,6 @@
 # apps/rag/config.py
 
+import os
 from pathlib import Path
 
 # Where your raw documents live (mounted into the backend container)
@@ -9,12 +10,170 @@ DOCS_DIR = "apps/docs"
 EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
 
 # Qdrant configuration
-VECTOR_DB_URL = "http://samsubot_qdrant:6333"
+#   server: the Qdrant service at VECTOR_DB_URL
+#   local:  embedded in this process, persisted under QDRANT_PATH (single-box
+#           installs; one process at a time may open the path)
+#   memory: embedded and not persisted (benchmarks)
+# VECTOR_DB_URL=":memory:" is still accepted as memory mode.
+VECTOR_DB_URL = os.getenv("VECTOR_DB_URL", "http://samsubot_qdrant:6333")
+QDRANT_MODE = os.getenv("QDRANT_MODE", "memory" if VECTOR_DB_URL == ":memory:" else "server")
+QDRANT_PATH = os.getenv("QDRANT_PATH", "vectorstore/qdrant")
+QDRANT_TIMEOUT = int(os.getenv("QDRANT_TIMEOUT", "10"))
 QDRANT_COLLECTION = "vectorstore"
 
 # Docker container name of Ollama
 OLLAMA_BASE_URL = "http://samsubot_llm:11434"
+# Pool of Ollama replicas, e.g. OLLAMA_BASE_URLS="http://llm1:11434,http://llm2:11434"
+OLLAMA_BASE_URLS = [
+    u.strip() for u in os.getenv("OLLAMA_BASE_URLS", OLLAMA_BASE_URL).split(",") if u.strip()
+]
 
-# Document chunking parameters
-CHUNK_SIZE = 500
-CHUNK_OVERLAP = 50
+# Latency/quality knobs: all of them live here and can be overridden from the
+# environment; pick values with tests/performance/sweep_rag.py.
+
+# Document chunking parameters (changing them needs a re-ingest)
+CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "500"))
+CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "50"))
+
+# Multi-tenancy
+# Every point carries metadata.tenant_id; searches filter on it (payload-indexed).
+TENANT_FIELD = "tenant_id"
+DEFAULT_TENANT = "default"
+# Large tenants that get their own collection instead of the shared one,
+# e.g. DEDICATED_TENANTS="acme,globex"
+DEDICATED_TENANTS = {t.strip() for t in os.getenv("DEDICATED_TENANTS", "").split(",") if t.strip()}
+# Other tenants of the shared collection, e.g. KNOWN_TENANTS="initech,hooli".
+# X-Tenant-ID is not authenticated: per-tenant state (retrievers, FAQ
+# freshness) is only kept for these, DEFAULT_TENANT and DEDICATED_TENANTS.
+KNOWN_TENANTS = {t.strip() for t in os.getenv("KNOWN_TENANTS", "").split(",") if t.strip()}
+
+# Ollama generation
+OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "mistral")
+# How long Ollama keeps the model loaded after a request ("-1" = forever)
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+# Background ping interval; keep it well below OLLAMA_KEEP_ALIVE
+OLLAMA_KEEP_WARM_INTERVAL = float(os.getenv("OLLAMA_KEEP_WARM_INTERVAL", "240"))
+OLLAMA_CONNECT_TIMEOUT = float(os.getenv("OLLAMA_CONNECT_TIMEOUT", "2"))
+OLLAMA_READ_TIMEOUT = float(os.getenv("OLLAMA_READ_TIMEOUT", "60"))
+OLLAMA_MAX_CONNECTIONS = int(os.getenv("OLLAMA_MAX_CONNECTIONS", "16"))
+# Replica health checks; a failed replica is skipped for OLLAMA_EJECT_COOLDOWN seconds
+OLLAMA_HEALTH_INTERVAL = float(os.getenv("OLLAMA_HEALTH_INTERVAL", "10"))
+OLLAMA_EJECT_COOLDOWN = float(os.getenv("OLLAMA_EJECT_COOLDOWN", "30"))
+LLM_OPTIONS = {
+    "num_ctx": int(os.getenv("LLM_NUM_CTX", "2048")),
+    "num_predict": int(os.getenv("LLM_NUM_PREDICT", "150")),
+    "temperature": 0.1,
+    "top_p": 0.9,
+    "repeat_penalty": 1.1,
+}
+
+# Request deadlines and LLM circuit breaker
+REQUEST_TIMEOUT = float(os.getenv("RAG_REQUEST_TIMEOUT", "30"))
+# Below this much remaining budget, skip generation and answer degraded
+LLM_MIN_BUDGET = 1.0
+BREAKER_FAILURE_THRESHOLD = 3    # consecutive failures/timeouts
+BREAKER_ERROR_RATE = 0.5         # over the last BREAKER_WINDOW calls
+BREAKER_WINDOW = 20
+BREAKER_MIN_CALLS = 6
+BREAKER_RESET_TIMEOUT = 30.0     # seconds open before a probe call
+# Generations in flight across the process; later ones wait in a FIFO line
+# (callers on the WebSocket are told their position). 0 = no limit.
+LLM_MAX_ACTIVE = int(os.getenv("LLM_MAX_ACTIVE", str(OLLAMA_MAX_CONNECTIONS * len(OLLAMA_BASE_URLS))))
+# Chunks quoted in a degraded (retrieval-only) answer
+DEGRADED_CHUNKS = 3
+
+# Retrieval
+RETRIEVAL_K = int(os.getenv("RETRIEVAL_K", "3"))
+RETRIEVAL_FETCH_K = int(os.getenv("RETRIEVAL_FETCH_K", "20"))   # MMR candidate pool
+RETRIEVAL_MMR = os.getenv("RETRIEVAL_MMR", "1") == "1"           # off = plain top-k by score
+HNSW_EF = int(os.getenv("HNSW_EF", "16"))
+EXACT_SEARCH = os.getenv("EXACT_SEARCH", "1") == "1"
+# Characters of retrieved text packed into the prompt
+MAX_CONTEXT = int(os.getenv("MAX_CONTEXT", "1500"))
+
+# Routing: answer without the LLM when retrieval is confident enough
+EXTRACTIVE_ENABLED = os.getenv("EXTRACTIVE_ENABLED", "1") == "1"
+EXTRACTIVE_MIN_SCORE = float(os.getenv("EXTRACTIVE_MIN_SCORE", "0.75"))      # cosine of top chunk
+EXTRACTIVE_MIN_OVERLAP = float(os.getenv("EXTRACTIVE_MIN_OVERLAP", "0.8"))   # query terms found in sentence
+SMALL_TALK_MAX_WORDS = 6
+
+# Model cascade: try a small model first and escalate to OLLAMA_MODEL only
+# when its answer fails cheap checks (opt-in: the small model must be pulled)
+LLM_CASCADE_ENABLED = os.getenv("LLM_CASCADE_ENABLED", "0") == "1"
+LLM_FAST_MODEL = os.getenv("LLM_FAST_MODEL", "qwen2.5:1.5b")
+LLM_FAST_OPTIONS = {"num_predict": 150}
+# Checks that trigger escalation: empty, refusal, truncated, low_grounding, fast_error
+CASCADE_ESCALATE_ON = {
+    r.strip() for r in os.getenv(
+        "CASCADE_ESCALATE_ON", "empty,refusal,truncated,low_grounding,fast_error"
+    ).split(",") if r.strip()
+}
+# Share of the answer's content terms that must appear in the context
+CASCADE_MIN_GROUNDING = float(os.getenv("CASCADE_MIN_GROUNDING", "0.5"))
+
+# Batch queries (POST /chat/rag/batch)
+BATCH_MAX_QUESTIONS = 100
+BATCH_CONCURRENCY = 4           # generations in flight per batch
+
+# Precomputed FAQ answers (built offline by apps/rag/faq.py)
+FAQ_ENABLED = os.getenv("FAQ_ENABLED", "1") == "1"
+FAQ_MATCH_THRESHOLD = float(os.getenv("FAQ_MATCH_THRESHOLD", "0.92"))  # cosine question similarity
+FAQ_TOP_LOGGED = 300            # most frequent logged questions to precompute
+FAQ_LOG_DAYS = 30
+FAQ_QUESTIONS_PER_CHUNK = 2     # LLM-generated questions per chunk
+FAQ_BUILD_CONCURRENCY = 2
+FAQ_VERSION_TTL = 60.0          # seconds between freshness checks at query time
+# The API rebuilds a stale FAQ index in the background when the collection
+# version changes (ingest itself only builds it with --faq)
+FAQ_AUTO_REBUILD = os.getenv("FAQ_AUTO_REBUILD", "1") == "1"
+FAQ_REBUILD_LEASE = 3600.0      # seconds one replica's claim on a rebuild holds off the others
+
+# Answer cache (cleared whenever the collection version changes)
+CACHE_MAX_SIZE = int(os.getenv("CACHE_MAX_SIZE", "1000"))
+CACHE_TTL = float(os.getenv("CACHE_TTL", "1800"))
+
+# Conversation sessions (requests with a session_id), kept in Redis
+CONVERSATION_ENABLED = os.getenv("CONVERSATION_ENABLED", "1") == "1"
+CONVERSATION_TTL = int(os.getenv("CONVERSATION_TTL", "1800"))     # seconds since the last turn
+CONVERSATION_MAX_TURNS = int(os.getenv("CONVERSATION_MAX_TURNS", "4"))   # older turns are folded into the summary
+CONVERSATION_SUMMARY_CHARS = 600
+CONVERSATION_ANSWER_CHARS = 300  # of each answer kept for the prompt
+CONVERSATION_REDIS_RETRY = 5.0   # seconds to answer without sessions after a Redis error
+
+# Cache warm-up from chat-log history (startup and after re-indexing)
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "1") == "1"
+WARMUP_TOP_N = int(os.getenv("WARMUP_TOP_N", "100"))
+WARMUP_LOG_DAYS = 7
+WARMUP_CONCURRENCY = 2
+# Warm-up pauses while live generations in flight reach this many
+WARMUP_MAX_LIVE_IN_FLIGHT = 2
+WARMUP_TIMEOUT = 60.0
+INDEX_VERSION_POLL_INTERVAL = 30.0
+
+# Near-duplicate chunk removal at ingest (MinHash + LSH over word shingles)
+DEDUP_ENABLED = os.getenv("DEDUP_ENABLED", "1") == "1"
+DEDUP_THRESHOLD = float(os.getenv("DEDUP_THRESHOLD", "0.85"))  # estimated Jaccard similarity
+DEDUP_SHINGLE_SIZE = 5          # words per shingle
+DEDUP_NUM_PERM = 128            # MinHash signature length
+DEDUP_BANDS = 32                # LSH bands (NUM_PERM / BANDS rows each)
+
+# Watch mode: re-index changed files under DOCS_DIR (ingest --watch, or WATCH_DOCS=1 in the API)
+WATCH_DOCS = os.getenv("WATCH_DOCS", "0") == "1"
+WATCH_TENANT = os.getenv("WATCH_TENANT", DEFAULT_TENANT)
+WATCH_DEBOUNCE_MS = int(os.getenv("WATCH_DEBOUNCE_MS", "1500"))  # coalesce bursts of saves
+
+# Background ingest jobs (POST /admin/ingest/jobs), run in a separate worker process
+INGEST_BATCH_SIZE = 64          # chunks embedded + upserted per batch
+INGEST_WORKER_NICE = int(os.getenv("INGEST_WORKER_NICE", "10"))      # lower CPU priority than the API
+INGEST_WORKER_THREADS = int(os.getenv("INGEST_WORKER_THREADS", "1"))  # torch/BLAS threads in the worker
+# Worker pauses between batches while query retrieval (embed + search) is slower than this
+INGEST_RETRIEVAL_SLO = float(os.getenv("INGEST_RETRIEVAL_SLO", "0.3"))
+INGEST_JOB_HISTORY = 50         # finished jobs kept in memory (all of them go to Mongo)
+INGEST_MAX_PAUSE = 30.0         # longest single pause, so a busy API can't starve ingest forever
+
+# Local chunk-text store: ingest writes chunk texts/metadata/vectors to
+# append-only mmap'd files, so retrieval asks Qdrant for IDs + scores only
+CHUNK_STORE_ENABLED = os.getenv("CHUNK_STORE_ENABLED", "1") == "1"
+CHUNK_STORE_DIR = os.getenv("CHUNK_STORE_DIR", "vectorstore/chunks")
+# Compact after an ingest once overwritten/deleted records exceed this share of the file
+CHUNK_STORE_COMPACT_RATIO = float(os.getenv("CHUNK_STORE_COMPACT_RATIO", "0.5"))
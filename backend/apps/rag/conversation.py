@@ -0,0 +1,190 @@
+# apps/rag/conversation.py
+# Conversation sessions: follow-up questions ("and how do I reset it?")
+# answered with what came before, from state kept in Redis, so the hot path
+# never reads chat history from Mongo.
+#
+# Per session (conv:<tenant>:<user>:<session_id>, expires CONVERSATION_TTL
+# after the last turn):
+#   turns        last CONVERSATION_MAX_TURNS question/answer pairs
+#   summary      older turns, condensed to "question -> first sentence"
+#   topic        the last standalone question follow-ups refer back to
+#   topic_terms  content terms of the last exchange
+#   chunks       [point id, score] of the last retrieval
+#
+# A follow-up is rewritten into a standalone question for retrieval and the
+# cache; when it brings in no new terms (same topic) the previous chunks are
+# read back by id instead of embedding and searching again.
+
+import logging
+import re
+import time
+from typing import Optional
+
+from redis.exceptions import RedisError
+
+from apps.core.redis_client import redis_manager
+from apps.core.tracing import span
+from apps.rag.config import (
+    CONVERSATION_TTL, CONVERSATION_MAX_TURNS, CONVERSATION_SUMMARY_CHARS,
+    CONVERSATION_ANSWER_CHARS, CONVERSATION_REDIS_RETRY,
+)
+from apps.rag.routing import classify_intent, content_terms
+
+log = logging.getLogger(__name__)
+
+FOLLOW_UP_OPENER = re.compile(r"^(and|also|but|so|then|or|what about|how about|what else|why|tell me more|more)\b")
+REFERENCES = {"it", "its", "that", "this", "these", "those", "they", "them", "their", "there", "one", "ones"}
+MAX_TOPIC_TERMS = 200
+
+
+def new_state() -> dict:
+    return {"turns": [], "summary": "", "topic": None, "topic_terms": [], "chunks": []}
+
+
+def is_follow_up(question: str, state: dict) -> bool:
+    """Whether `question` leans on the previous turns (cheap lexical checks, no LLM)."""
+    if not state["topic"] or classify_intent(question) != "question":
+        return False
+    text = " ".join(question.lower().split())
+    if FOLLOW_UP_OPENER.match(text) or REFERENCES & set(re.findall(r"[a-z]+", text)):
+        return True
+    # "Why?", "Any limits?": too little to search on by itself
+    return len(content_terms(question)) <= 1
+
+
+def standalone_question(question: str, state: dict) -> str:
+    return f"{question.strip()} (regarding: {state['topic']})"
+
+
+def same_topic(question: str, state: dict) -> bool:
+    """No new content terms: the previous retrieval still covers the question."""
+    return bool(state["chunks"]) and content_terms(question) <= set(state["topic_terms"])
+
+
+def history_block(state: dict) -> str:
+    lines = [f"Earlier: {state['summary']}"] if state["summary"] else []
+    for turn in state["turns"]:
+        lines.append(f"User: {turn['q']}\nSamsuBot: {turn['a']}")
+    return "\n".join(lines)
+
+
+def _first_sentence(text: str) -> str:
+    return re.split(r"(?<=[.!?])\s", text.strip(), maxsplit=1)[0]
+
+
+def _fold(summary: str, turn: dict) -> str:
+    entry = f"{turn['q']} -> {_first_sentence(turn['a'])}"
+    summary = f"{summary}; {entry}" if summary else entry
+    if len(summary) > CONVERSATION_SUMMARY_CHARS:
+        # Keep the most recent part, from a word boundary
+        summary = summary[-CONVERSATION_SUMMARY_CHARS:].split(" ", 1)[-1]
+    return summary
+
+
+class Conversation:
+    """One turn in progress: the state as loaded plus how this question is handled."""
+
+    def __init__(self, key: str, state: dict, question: str):
+        self.key = key
+        self.state = state
+        self.question = question
+        self.follow_up = is_follow_up(question, state)
+        self.standalone = standalone_question(question, state) if self.follow_up else question
+        self.reuse = self.follow_up and same_topic(question, state)
+
+    def query_context(self) -> Optional[dict]:
+        """What run_rag_query needs for a follow-up, or None for a standalone question."""
+        if not self.follow_up:
+            return None
+        return {
+            "question": self.question,
+            "history": history_block(self.state),
+            "chunks": self.state["chunks"] if self.reuse else None,
+        }
+
+    def record(self, response: dict):
+        state = self.state
+        if not self.follow_up and classify_intent(self.question) != "question":
+            return  # small talk adds nothing to the context
+        if not self.follow_up:
+            state["topic"] = self.question
+        answer = " ".join(response.get("message", "").split())
+        state["turns"].append({"q": self.question, "a": answer[:CONVERSATION_ANSWER_CHARS]})
+        while len(state["turns"]) > CONVERSATION_MAX_TURNS:
+            state["summary"] = _fold(state["summary"], state["turns"].pop(0))
+        if response.get("chunks"):
+            # Small talk and FAQ answers keep the previous retrieval
+            state["chunks"] = response["chunks"]
+            state["topic_terms"] = sorted(content_terms(f"{self.standalone} {answer}"))[:MAX_TOPIC_TERMS]
+
+
+class ConversationStore:
+    def __init__(self):
+        self._redis_retry_at = 0.0
+        self.stats = {
+            "turns": 0,
+            "new_sessions": 0,
+            "follow_ups": 0,
+            "reused_retrievals": 0,
+            "redis_errors": 0,
+        }
+
+    @staticmethod
+    def key(tenant_id: str, username: str, session_id: str) -> str:
+        return f"conv:{tenant_id}:{username}:{session_id}"
+
+    def _redis_failed(self, e: Exception):
+        self.stats["redis_errors"] += 1
+        self._redis_retry_at = time.monotonic() + CONVERSATION_REDIS_RETRY
+        log.warning(f"⚠️ Conversation store unavailable, answering without sessions: {e}")
+
+    async def begin(self, username: str, tenant_id: str, session_id: str, question: str) -> Conversation:
+        """Load the session (empty if new, expired or Redis is down) and classify the question."""
+        key = self.key(tenant_id, username, session_id)
+        state = None
+        if time.monotonic() >= self._redis_retry_at:
+            with span("conversation.load") as s:
+                try:
+                    state = await redis_manager.get_cache(key)
+                except (RedisError, OSError) as e:
+                    self._redis_failed(e)
+                s.set(found=state is not None)
+        if state is None:
+            self.stats["new_sessions"] += 1
+            state = new_state()
+        conversation = Conversation(key, state, question)
+        self.stats["turns"] += 1
+        if conversation.follow_up:
+            self.stats["follow_ups"] += 1
+        if conversation.reuse:
+            self.stats["reused_retrievals"] += 1
+        return conversation
+
+    async def finish(self, conversation: Conversation, response: dict):
+        """Append the answered turn and refresh the TTL; failures only cost the context."""
+        if response.get("error"):
+            return
+        conversation.record(response)
+        if time.monotonic() < self._redis_retry_at:
+            return
+        with span("conversation.save"):
+            try:
+                await redis_manager.set_cache(conversation.key, conversation.state, expire=CONVERSATION_TTL)
+            except (RedisError, OSError) as e:
+                self._redis_failed(e)
+
+    def get_stats(self) -> dict:
+        turns = self.stats["turns"]
+        return {
+            **self.stats,
+            "follow_up_rate": round(self.stats["follow_ups"] / turns, 3) if turns else 0.0,
+            "using_redis": time.monotonic() >= self._redis_retry_at,
+        }
+
+
+# Global instance
+conversations = ConversationStore()
+
+# Convenience functions
+def get_conversation_stats() -> dict:
+    return conversations.get_stats()
@@ -4,14 +4,14 @@ import os
 import sys
 import time
 import asyncio
-from qdrant_client import QdrantClient
 from qdrant_client.http import models as rest
 from langchain_qdrant import QdrantVectorStore
 from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_ollama import OllamaLLM
 from langchain.prompts import PromptTemplate
 from langchain.chains import RetrievalQA
-from apps.rag.config import VECTOR_DB_URL, EMBEDDING_MODEL, OLLAMA_BASE_URL, QDRANT_COLLECTION
+from apps.rag.config import EMBEDDING_MODEL, OLLAMA_BASE_URL, QDRANT_COLLECTION
+from apps.rag.qdrant import get_qdrant_client
 
 # ---------------------------
 # Embeddings
@@ -23,7 +23,7 @@ print(f"⚡ Using embeddings: {EMBEDDING_MODEL}")
 # Vectorstore
 # ---------------------------
 def get_vectorstore():
-    client = QdrantClient(url=VECTOR_DB_URL)
+    client = get_qdrant_client()
     if not client.collection_exists(QDRANT_COLLECTION):
         client.create_collection(
             collection_name=QDRANT_COLLECTION,
@@ -101,11 +101,30 @@ async def debug_query(question: str):
     except Exception as e:
         print(f"❌ Debug query failed: {e}")
 
-def ask_question(question: str):
-    asyncio.run(debug_query(question))
+def ask_question(question: str, profile: bool = False):
+    from apps.rag.client import rag_client
+    if not profile:
+        rag_client.run(debug_query(question))
+        return
+
+    # Where the time went, not just how much: stack samples of this process
+    from apps.core.profiler import sampling_profiler
+
+    async def profiled():
+        session = sampling_profiler.begin("debug_query", forced=True)
+        try:
+            await debug_query(question)
+        finally:
+            meta = sampling_profiler.end(session)
+        print(f"\n🔬 Profile ({meta['samples']} samples) saved to {meta['file']}:")
+        for row in meta["top_frames"]:
+            print(f"  {row['share']:6.1%}  {row['frame']}")
+
+    rag_client.run(profiled())
 
 if __name__ == "__main__":
-    if len(sys.argv) < 2:
+    args = [a for a in sys.argv[1:] if a != "--profile"]
+    if not args:
         print("❌ Please provide a question.")
         sys.exit(1)
-    ask_question(sys.argv[1])
+    ask_question(args[0], profile="--profile" in sys.argv)
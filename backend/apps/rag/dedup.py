@@ -0,0 +1,115 @@
+# apps/rag/dedup.py
+# Near-duplicate chunk detection for ingest: MinHash signatures over word
+# shingles, bucketed with LSH so only likely pairs are compared. One copy of
+# each near-duplicate group is kept; the others' sources go into its
+# metadata["alt_sources"].
+
+import hashlib
+import logging
+import re
+from typing import List, Tuple
+
+import numpy as np
+
+from apps.rag.config import DEDUP_THRESHOLD, DEDUP_SHINGLE_SIZE, DEDUP_NUM_PERM, DEDUP_BANDS
+
+log = logging.getLogger("ingest")
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+_WORD = re.compile(r"\w+")
+
+
+def shingles(text: str, size: int = DEDUP_SHINGLE_SIZE) -> set:
+    """Word n-grams of the normalized text (whitespace/case/punctuation-insensitive)."""
+    words = _WORD.findall(text.lower())
+    if len(words) <= size:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+class MinHasher:
+    """Fixed random permutations so signatures are comparable across chunks."""
+
+    def __init__(self, num_perm: int = DEDUP_NUM_PERM, seed: int = 1):
+        rng = np.random.RandomState(seed)
+        self.num_perm = num_perm
+        self.a = rng.randint(1, (1 << 31) - 1, size=num_perm, dtype=np.uint64)
+        self.b = rng.randint(0, (1 << 31) - 1, size=num_perm, dtype=np.uint64)
+
+    def signature(self, items: set) -> np.ndarray:
+        if not items:
+            return np.full(self.num_perm, _MAX_HASH, dtype=np.uint64)
+        hashes = np.array(
+            [int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=4).digest(), "little") for s in items],
+            dtype=np.uint64,
+        )
+        # (a*h + b) mod p, one row per permutation; keep the minimum per row
+        permuted = (np.outer(self.a, hashes) + self.b[:, None]) % _MERSENNE_PRIME & _MAX_HASH
+        return permuted.min(axis=1)
+
+
+def estimated_jaccard(sig_a: np.ndarray, sig_b: np.ndarray) -> float:
+    return float(np.mean(sig_a == sig_b))
+
+
+def find_near_duplicates(
+    texts: List[str],
+    threshold: float = DEDUP_THRESHOLD,
+    num_perm: int = DEDUP_NUM_PERM,
+    bands: int = DEDUP_BANDS,
+) -> List[int]:
+    """
+    For each text, the index of the earlier text it duplicates (itself if it
+    is the first of its group).
+    """
+    rows = num_perm // bands
+    hasher = MinHasher(num_perm)
+    signatures = [hasher.signature(shingles(t)) for t in texts]
+
+    keep_of = list(range(len(texts)))
+    buckets = {}
+    for i, sig in enumerate(signatures):
+        candidates = set()
+        keys = [(band, sig[band * rows:(band + 1) * rows].tobytes()) for band in range(bands)]
+        for key in keys:
+            candidates.update(buckets.get(key, ()))
+        # Compare against kept chunks only, so groups don't chain together
+        for j in sorted(candidates):
+            if estimated_jaccard(sig, signatures[j]) >= threshold:
+                keep_of[i] = j
+                break
+        if keep_of[i] == i:
+            for key in keys:
+                buckets.setdefault(key, []).append(i)
+    return keep_of
+
+
+def dedup_chunks(chunks: List, threshold: float = DEDUP_THRESHOLD) -> Tuple[List, dict]:
+    """Drop near-duplicate chunks; return (kept chunks, stats)."""
+    keep_of = find_near_duplicates([c.page_content for c in chunks], threshold)
+
+    kept = []
+    for i, c in enumerate(chunks):
+        j = keep_of[i]
+        if j == i:
+            kept.append(c)
+            continue
+        original = chunks[j]
+        src = c.metadata.get("source", "unknown")
+        alt = original.metadata.setdefault("alt_sources", [])
+        if src != original.metadata.get("source") and src not in alt:
+            alt.append(src)
+
+    removed = len(chunks) - len(kept)
+    removed_chars = sum(len(c.page_content) for i, c in enumerate(chunks) if keep_of[i] != i)
+    total_chars = sum(len(c.page_content) for c in chunks) or 1
+    stats = {
+        "chunks_in": len(chunks),
+        "chunks_out": len(kept),
+        "removed": removed,
+        "removed_pct": round(100 * removed / len(chunks), 1) if chunks else 0.0,
+        "removed_chars_pct": round(100 * removed_chars / total_chars, 1),
+        "groups": sum(1 for c in kept if c.metadata.get("alt_sources")) if removed else 0,
+    }
+    return kept, stats
@@ -0,0 +1,345 @@
+# apps/rag/faq.py
+# Offline FAQ precomputation + the precomputed-answer index used at query time.
+#
+# Build:  python -m apps.rag.faq [--tenant acme] [--if-stale]
+#         (or with the ingest: python -m apps.rag.ingest --faq)
+# Likely questions come from chat-log frequency (Mongo) plus LLM-generated
+# questions per chunk; each runs through the full RAG pipeline and the answer
+# is stored in "<collection>__faq", searchable by question embedding. An index
+# built against an older version of the tenant's documents is ignored until
+# rebuilt; the API rebuilds it in the background when it sees the change.
+
+import argparse
+import asyncio
+import logging
+import re
+import time
+import uuid
+from typing import List, Optional
+
+from qdrant_client.http import models as rest
+
+from apps.rag.cache import get_cache_key
+from apps.rag.config import (
+    DEFAULT_TENANT, TENANT_FIELD, FAQ_MATCH_THRESHOLD, FAQ_TOP_LOGGED, FAQ_LOG_DAYS,
+    FAQ_QUESTIONS_PER_CHUNK, FAQ_BUILD_CONCURRENCY, FAQ_VERSION_TTL, FAQ_REBUILD_LEASE,
+)
+from apps.rag.index_meta import get_tenant_version, get_meta, set_meta
+from apps.rag.prompt import faq_question_prompt, REFUSAL_ANSWER
+from apps.rag.retriever import client, embedding
+from apps.rag.tenancy import collection_for_tenant, tenant_filter, ensure_collection, is_known_tenant
+
+log = logging.getLogger("faq")
+
+# Answers we never want to serve from the index
+UNUSABLE_ROUTES = {"smalltalk", "degraded", "no_docs"}
+REFUSAL_PHRASE = REFUSAL_ANSWER.lower().rstrip(".")
+
+
+def faq_collection_for(tenant_id: str) -> str:
+    return f"{collection_for_tenant(tenant_id)}__faq"
+
+
+def _faq_meta_key(tenant_id: str) -> str:
+    return f"faq:{faq_collection_for(tenant_id)}:{tenant_id}"
+
+
+# ---------------------------
+# Query-time lookup
+# ---------------------------
+_freshness = {}  # tenant_id -> (checked_at, is_fresh)
+
+
+def is_faq_fresh(tenant_id: str) -> bool:
+    """True when the tenant's FAQ index was built against the tenant's current version."""
+    checked_at, fresh = _freshness.get(tenant_id, (0.0, False))
+    if time.monotonic() - checked_at < FAQ_VERSION_TTL:
+        return fresh
+    try:
+        meta = get_meta(client, _faq_meta_key(tenant_id))
+        current = get_tenant_version(client, collection_for_tenant(tenant_id), tenant_id)
+        fresh = bool(meta) and meta.get("source_version") == current
+    except Exception as e:
+        log.warning(f"⚠️ FAQ freshness check failed: {e}")
+        fresh = False
+    if is_known_tenant(tenant_id):
+        _freshness[tenant_id] = (time.monotonic(), fresh)
+    return fresh
+
+
+def _hit_to_response(point) -> dict:
+    payload = point.payload or {}
+    return {
+        "message": payload.get("answer", ""),
+        "sources": payload.get("sources", []),
+        "alt_sources": payload.get("alt_sources", []),
+        "cached": False,
+        "metrics": {
+            "route": "faq",
+            "faq_score": round(point.score, 3),
+            "faq_question": payload.get("question"),
+        },
+    }
+
+
+def lookup_faq_batch(vectors: List[List[float]], tenant_id: str = DEFAULT_TENANT) -> List[Optional[dict]]:
+    """Best precomputed answer per query vector, or None below FAQ_MATCH_THRESHOLD."""
+    if not vectors or not is_faq_fresh(tenant_id):
+        return [None] * len(vectors)
+    try:
+        responses = client.query_batch_points(
+            collection_name=faq_collection_for(tenant_id),
+            requests=[
+                rest.QueryRequest(
+                    query=vector,
+                    filter=tenant_filter(tenant_id),
+                    limit=1,
+                    score_threshold=FAQ_MATCH_THRESHOLD,
+                    with_payload=True,
+                )
+                for vector in vectors
+            ],
+        )
+    except Exception as e:
+        # The FAQ index is an optimization; fall through to normal retrieval
+        log.warning(f"⚠️ FAQ lookup failed: {e}")
+        return [None] * len(vectors)
+    return [_hit_to_response(r.points[0]) if r.points else None for r in responses]
+
+
+def lookup_faq(vector: List[float], tenant_id: str = DEFAULT_TENANT) -> Optional[dict]:
+    return lookup_faq_batch([vector], tenant_id)[0]
+
+
+# ---------------------------
+# Candidate questions
+# ---------------------------
+def parse_generated_questions(text: str) -> List[str]:
+    questions = []
+    for line in text.splitlines():
+        q = re.sub(r"^\s*(?:[-*•]|\d+[.)])\s*", "", line).strip().strip('"')
+        if len(q) < 10:
+            continue
+        questions.append(q if q.endswith("?") else q + "?")
+    return questions
+
+
+def iter_chunks(tenant_id: str):
+    """Yield every chunk text stored for the tenant."""
+    offset = None
+    while True:
+        points, offset = client.scroll(
+            collection_name=collection_for_tenant(tenant_id),
+            scroll_filter=tenant_filter(tenant_id),
+            limit=256,
+            offset=offset,
+            with_payload=True,
+            with_vectors=False,
+        )
+        for p in points:
+            text = (p.payload or {}).get("page_content", "")
+            if text.strip():
+                yield text
+        if offset is None:
+            break
+
+
+async def generated_questions(tenant_id: str, per_chunk: int) -> List[str]:
+    from apps.rag.llm import generate
+
+    questions = []
+    for chunk in iter_chunks(tenant_id):
+        try:
+            result = await generate(faq_question_prompt.format(chunk=chunk, n=per_chunk))
+        except Exception as e:
+            log.warning(f"⚠️ Question generation failed for a chunk: {e}")
+            continue
+        questions.extend(parse_generated_questions(result["text"])[:per_chunk])
+    return questions
+
+
+async def candidate_questions(tenant_id: str, top_logged: int, per_chunk: int) -> List[dict]:
+    """Logged questions (by frequency) first, then generated ones; de-duplicated."""
+    candidates = {}
+    try:
+        from apps.core.mongo import get_top_questions
+        for row in await get_top_questions(top_logged, FAQ_LOG_DAYS, tenant_id):
+            candidates.setdefault(get_cache_key(row["question"], tenant_id), {
+                "question": row["question"], "origin": "logs", "count": row["count"],
+            })
+        log.info(f"📈 {len(candidates)} frequent questions from chat logs")
+    except Exception as e:
+        log.warning(f"⚠️ Could not read chat logs: {e}")
+
+    if per_chunk > 0:
+        for q in await generated_questions(tenant_id, per_chunk):
+            candidates.setdefault(get_cache_key(q, tenant_id), {
+                "question": q, "origin": "generated", "count": 0,
+            })
+    return list(candidates.values())
+
+
+# ---------------------------
+# Build
+# ---------------------------
+async def build_faq_index(
+    tenant_id: str = DEFAULT_TENANT,
+    top_logged: int = FAQ_TOP_LOGGED,
+    per_chunk: int = FAQ_QUESTIONS_PER_CHUNK,
+    concurrency: int = FAQ_BUILD_CONCURRENCY,
+) -> int:
+    """Answer the candidate questions offline and replace the tenant's FAQ index."""
+    from apps.rag.query import run_rag_query
+
+    start = time.time()
+    source_version = get_tenant_version(client, collection_for_tenant(tenant_id), tenant_id)
+    candidates = await candidate_questions(tenant_id, top_logged, per_chunk)
+    log.info(f"❓ Answering {len(candidates)} candidate questions (tenant: {tenant_id})")
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def answer(candidate: dict) -> Optional[dict]:
+        async with semaphore:
+            response = await run_rag_query(candidate["question"], tenant_id, use_faq=False)
+        route = response.get("metrics", {}).get("route")
+        if response.get("error") or response.get("degraded") or route in UNUSABLE_ROUTES:
+            return None
+        if REFUSAL_PHRASE in response["message"].lower():
+            return None
+        return {
+            **candidate,
+            "answer": response["message"],
+            "sources": response["sources"],
+            "alt_sources": response.get("alt_sources", []),
+        }
+
+    entries = [e for e in await asyncio.gather(*(answer(c) for c in candidates)) if e]
+
+    faq_collection = faq_collection_for(tenant_id)
+    ensure_collection(client, faq_collection)
+    client.delete(
+        collection_name=faq_collection,
+        points_selector=rest.FilterSelector(filter=tenant_filter(tenant_id) or rest.Filter()),
+    )
+    if entries:
+        vectors = embedding.embed_documents([e["question"] for e in entries])
+        client.upsert(
+            collection_name=faq_collection,
+            points=[
+                rest.PointStruct(
+                    id=str(uuid.uuid5(uuid.NAMESPACE_URL, get_cache_key(e["question"], tenant_id))),
+                    vector=vector,
+                    payload={
+                        "question": e["question"],
+                        "answer": e["answer"],
+                        "sources": e["sources"],
+                        "alt_sources": e["alt_sources"],
+                        "origin": e["origin"],
+                        "count": e["count"],
+                        "metadata": {TENANT_FIELD: tenant_id},
+                    },
+                )
+                for e, vector in zip(entries, vectors)
+            ],
+        )
+    set_meta(client, _faq_meta_key(tenant_id), {
+        "source_version": source_version,
+        "entries": len(entries),
+        "built_at": time.time(),
+    })
+    _freshness.pop(tenant_id, None)
+    log.info(f"✅ FAQ index: {len(entries)} answers in {time.time() - start:.1f}s ({faq_collection})")
+    return len(entries)
+
+
+def prune_faq_sources(tenant_id: str, sources: List[str], previous_version: Optional[str], version: str) -> int:
+    """
+    After an incremental re-index, drop the FAQ answers built from the changed
+    files and carry the rest over to the tenant's new version.
+    """
+    meta = get_meta(client, _faq_meta_key(tenant_id))
+    if not meta or meta.get("source_version") != previous_version:
+        return 0  # already stale; only a full build can refresh it
+    faq_collection = faq_collection_for(tenant_id)
+    removed = 0
+    if client.collection_exists(faq_collection):
+        must = [rest.Filter(should=[
+            rest.FieldCondition(key=key, match=rest.MatchAny(any=list(sources)))
+            for key in ("sources", "alt_sources")
+        ])]
+        tf = tenant_filter(tenant_id)
+        if tf is not None:
+            must.append(tf)
+        affected = rest.Filter(must=must)
+        removed = client.count(faq_collection, count_filter=affected, exact=True).count
+        if removed:
+            client.delete(collection_name=faq_collection, points_selector=rest.FilterSelector(filter=affected))
+    set_meta(client, _faq_meta_key(tenant_id), {
+        **meta,
+        "source_version": version,
+        "entries": max(0, meta.get("entries", 0) - removed),
+    })
+    _freshness.pop(tenant_id, None)
+    return removed
+
+
+# ---------------------------
+# Background rebuild (API process)
+# ---------------------------
+_stale_tenants = set()
+_rebuild_task: Optional[asyncio.Task] = None
+
+
+def _claim_rebuild(tenant_id: str) -> bool:
+    """
+    True if the tenant's FAQ index is stale and no other replica is already
+    rebuilding it for the same version (best effort: a lease in the meta store).
+    """
+    _freshness.pop(tenant_id, None)
+    if is_faq_fresh(tenant_id):
+        return False
+    key = f"faq-build:{faq_collection_for(tenant_id)}:{tenant_id}"
+    version = get_tenant_version(client, collection_for_tenant(tenant_id), tenant_id)
+    claim = get_meta(client, key)
+    if claim and claim.get("version") == version and claim.get("until", 0) > time.time():
+        return False
+    set_meta(client, key, {"version": version, "until": time.time() + FAQ_REBUILD_LEASE})
+    return True
+
+
+async def _rebuild_stale():
+    loop = asyncio.get_running_loop()
+    while _stale_tenants:
+        tenant_id = _stale_tenants.pop()
+        try:
+            if await loop.run_in_executor(None, _claim_rebuild, tenant_id):
+                log.info(f"🔁 FAQ index stale for tenant {tenant_id}: rebuilding in the background")
+                await build_faq_index(tenant_id)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            log.warning(f"⚠️ Background FAQ rebuild failed (tenant {tenant_id}): {e}")
+
+
+def schedule_faq_rebuild(tenant_id: str):
+    """Queue the equivalent of `--if-stale` for the tenant; one rebuild runs at a time."""
+    global _rebuild_task
+    _stale_tenants.add(tenant_id)
+    if _rebuild_task is None or _rebuild_task.done():
+        _rebuild_task = asyncio.get_running_loop().create_task(_rebuild_stale())
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    parser = argparse.ArgumentParser(description="Precompute answers for likely questions")
+    parser.add_argument("--tenant", default=DEFAULT_TENANT)
+    parser.add_argument("--top-logged", type=int, default=FAQ_TOP_LOGGED)
+    parser.add_argument("--per-chunk", type=int, default=FAQ_QUESTIONS_PER_CHUNK)
+    parser.add_argument(
+        "--if-stale", action="store_true", help="Only rebuild if the tenant's documents changed since the last build"
+    )
+    args = parser.parse_args()
+    if args.if_stale and is_faq_fresh(args.tenant):
+        log.info("FAQ index is up to date")
+    else:
+        asyncio.run(build_faq_index(args.tenant, args.top_logged, args.per_chunk))
@@ -0,0 +1,88 @@
+# apps/rag/index_meta.py
+# Small key/value registry kept in Qdrant itself (collection versions, FAQ
+# build state), so every backend process and replica sees the same values.
+
+import time
+import uuid
+from typing import List, Optional
+from qdrant_client import QdrantClient
+from qdrant_client.http import models as rest
+
+from apps.rag.config import QDRANT_COLLECTION
+
+META_COLLECTION = f"{QDRANT_COLLECTION}__meta"
+
+
+def _point_id(key: str) -> str:
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"samsubot-meta:{key}"))
+
+
+def _ensure(client: QdrantClient):
+    if not client.collection_exists(META_COLLECTION):
+        # Payload-only store; Qdrant still wants a vector, so use a 1-d dummy
+        client.create_collection(
+            collection_name=META_COLLECTION,
+            vectors_config=rest.VectorParams(size=1, distance=rest.Distance.DOT),
+        )
+
+
+def get_meta(client: QdrantClient, key: str) -> Optional[dict]:
+    if not client.collection_exists(META_COLLECTION):
+        return None
+    points = client.retrieve(META_COLLECTION, ids=[_point_id(key)], with_payload=True)
+    return points[0].payload if points else None
+
+
+def set_meta(client: QdrantClient, key: str, payload: dict):
+    _ensure(client)
+    client.upsert(
+        collection_name=META_COLLECTION,
+        points=[rest.PointStruct(id=_point_id(key), vector=[1.0], payload={"key": key, **payload})],
+    )
+
+
+def get_version_record(client: QdrantClient, collection: str) -> Optional[dict]:
+    """The latest version entry: version, previous, tenant_id, changed_sources."""
+    return get_meta(client, f"version:{collection}")
+
+
+def get_collection_version(client: QdrantClient, collection: str) -> Optional[str]:
+    meta = get_version_record(client, collection)
+    return meta["version"] if meta else None
+
+
+def get_tenant_version(client: QdrantClient, collection: str, tenant_id: str) -> Optional[str]:
+    """
+    Version of the last change to this tenant's points. In the shared
+    collection other tenants' ingests bump the collection version but not this
+    one. Falls back to the collection version for data written before
+    per-tenant versions were recorded.
+    """
+    meta = get_meta(client, f"version:{collection}:{tenant_id}")
+    return meta["version"] if meta else get_collection_version(client, collection)
+
+
+def bump_collection_version(
+    client: QdrantClient,
+    collection: str,
+    tenant_id: Optional[str] = None,
+    changed_sources: Optional[List[str]] = None,
+) -> str:
+    """
+    Record that the collection's content changed; returns the new version.
+    `changed_sources` lists the only files touched (incremental re-index);
+    None means anything may have changed. With a `tenant_id`, the version is
+    also recorded as that tenant's (see get_tenant_version).
+    """
+    version = uuid.uuid4().hex[:12]
+    updated_at = time.time()
+    set_meta(client, f"version:{collection}", {
+        "version": version,
+        "previous": get_collection_version(client, collection),
+        "tenant_id": tenant_id,
+        "changed_sources": changed_sources,
+        "updated_at": updated_at,
+    })
+    if tenant_id is not None:
+        set_meta(client, f"version:{collection}:{tenant_id}", {"version": version, "updated_at": updated_at})
+    return version
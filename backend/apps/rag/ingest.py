@@ -8,61 +8,88 @@ import hashlib
 import logging
 import uuid
 from pathlib import Path
-from typing import List
+from typing import Callable, Iterable, List, Optional
 
 from langchain_community.document_loaders import TextLoader, UnstructuredMarkdownLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_qdrant import QdrantVectorStore
 from qdrant_client import QdrantClient
 from qdrant_client.http import models as rest
 
-from apps.rag.config import DOCS_DIR, VECTOR_DB_URL, EMBEDDING_MODEL, QDRANT_COLLECTION
+from apps.rag.config import (
+    DOCS_DIR, EMBEDDING_MODEL, TENANT_FIELD, DEFAULT_TENANT, DEDUP_ENABLED,
+    INGEST_BATCH_SIZE, CHUNK_STORE_ENABLED, CHUNK_SIZE, CHUNK_OVERLAP,
+)
+from apps.rag.chunk_store import get_chunk_store
+from apps.rag.dedup import dedup_chunks
+from apps.rag.qdrant import get_qdrant_client
+from apps.rag.tenancy import (
+    collection_for_tenant, tenant_filter, source_filter, linked_source_filter, ensure_collection, is_dedicated,
+)
+from apps.rag.index_meta import bump_collection_version, get_tenant_version
 
 logging.basicConfig(level=logging.INFO, format="%(message)s")
 log = logging.getLogger("ingest")
 
-# Initialize embeddings globally
-embeddings = HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL)
+SUPPORTED_SUFFIXES = {".txt", ".md"}
 
+# Loaded on first use, so importing this module (e.g. for watch mode in the
+# API process, which passes its own model) doesn't load a second copy
+_embeddings = None
 
-def load_all_docs(docs_dir: Path) -> List:
-    """Load .txt and .md files from DOCS_DIR, normalize 'source' metadata."""
-    docs = []
-    for path in docs_dir.rglob("*"):
-        if not path.is_file():
-            continue
-        suffix = path.suffix.lower()
 
-        try:
-            if suffix == ".txt":
-                loader = TextLoader(str(path), encoding="utf-8")
-            elif suffix == ".md":
-                loader = UnstructuredMarkdownLoader(str(path))
-            else:
-                continue  # skip unsupported files
+def get_embeddings():
+    global _embeddings
+    if _embeddings is None:
+        _embeddings = HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL)
+    return _embeddings
 
-            loaded = loader.load()
 
-            rel = path.relative_to(docs_dir).as_posix()
-            for d in loaded:
-                d.metadata.clear()
-                d.metadata["source"] = rel
+def is_supported(path: Path) -> bool:
+    return path.suffix.lower() in SUPPORTED_SUFFIXES
 
-            log.info(f"📄 Loaded file: {rel} → {len(loaded)} docs")
-            docs.extend(loaded)
 
-        except Exception as e:
-            log.error(f"❌ Failed to load {path.name}: {e}")
+def load_file(path: Path, docs_dir: Path, tenant_id: str = DEFAULT_TENANT) -> List:
+    """Load one .txt/.md file with normalized 'source' and 'tenant_id' metadata."""
+    suffix = path.suffix.lower()
+    try:
+        if suffix == ".txt":
+            loader = TextLoader(str(path), encoding="utf-8")
+        elif suffix == ".md":
+            loader = UnstructuredMarkdownLoader(str(path))
+        else:
+            return []  # skip unsupported files
+
+        loaded = loader.load()
+
+        rel = path.relative_to(docs_dir).as_posix()
+        for d in loaded:
+            d.metadata.clear()
+            d.metadata["source"] = rel
+            d.metadata[TENANT_FIELD] = tenant_id
+
+        log.info(f"📄 Loaded file: {rel} → {len(loaded)} docs")
+        return loaded
+
+    except Exception as e:
+        log.error(f"❌ Failed to load {path.name}: {e}")
+        return []
+
 
+def load_all_docs(docs_dir: Path, tenant_id: str = DEFAULT_TENANT) -> List:
+    """Load .txt and .md files from DOCS_DIR, normalize 'source' and 'tenant_id' metadata."""
+    docs = []
+    for path in docs_dir.rglob("*"):
+        if path.is_file():
+            docs.extend(load_file(path, docs_dir, tenant_id))
     return docs
 
 
-def split_docs(docs: List) -> List:
+def split_docs(docs: List, chunk_size: int = CHUNK_SIZE, chunk_overlap: int = CHUNK_OVERLAP) -> List:
     """Chunk documents for better retrieval."""
     splitter = RecursiveCharacterTextSplitter(
-        chunk_size=500,
-        chunk_overlap=50,
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
         separators=["\n\n", "\n", " ", ""],
     )
     chunks = splitter.split_documents(docs)
@@ -82,55 +109,299 @@ def make_ids(chunks: List) -> List[str]:
     """Generate stable UUIDs from chunk content."""
     ids = []
     for d in chunks:
-        raw = (d.page_content + "|" + d.metadata.get("source", "")).encode("utf-8")
+        key = d.page_content + "|" + d.metadata.get("source", "")
+        tenant_id = d.metadata.get(TENANT_FIELD, DEFAULT_TENANT)
+        if tenant_id != DEFAULT_TENANT:
+            # Same file under two tenants must not collide in the shared collection;
+            # default-tenant IDs stay unchanged so existing points are updated in place.
+            key += "|" + tenant_id
+        raw = key.encode("utf-8")
         sha1 = hashlib.sha1(raw).hexdigest()
         ids.append(str(uuid.UUID(sha1[:32])))  # Convert to UUID format
     return ids
 
 
-def main(rebuild: bool = False):
+def remove_near_duplicates(chunks: List) -> List:
+    """Keep one copy of repeated boilerplate (headers, footers, copied sections)."""
+    kept, stats = dedup_chunks(chunks)
+    log.info(
+        f"🧹 Near-duplicates: removed {stats['removed']}/{stats['chunks_in']} chunks "
+        f"({stats['removed_pct']}%, {stats['removed_chars_pct']}% of text) "
+        f"across {stats['groups']} groups"
+    )
+    return kept
+
+
+def upsert_chunks(
+    client: QdrantClient,
+    collection: str,
+    chunks: List,
+    ids: List[str],
+    embedding=None,
+    batch_size: int = INGEST_BATCH_SIZE,
+    before_batch: Optional[Callable[[], None]] = None,
+    progress: Optional[Callable[[str, int, int], None]] = None,
+):
+    """
+    Embed and upsert in batches, mirroring each batch into the local chunk
+    store. `before_batch` runs between batches (ingest jobs use it to
+    throttle and to cancel); `progress` gets (stage, done, total).
+    """
+    embedding = embedding or get_embeddings()
+    store = get_chunk_store(collection) if CHUNK_STORE_ENABLED else None
+    for start in range(0, len(chunks), batch_size):
+        if before_batch:
+            before_batch()
+        batch, batch_ids = chunks[start:start + batch_size], ids[start:start + batch_size]
+        texts = [c.page_content for c in batch]
+        vectors = embedding.embed_documents(texts)
+        # Same payload layout as LangChain's QdrantVectorStore
+        client.upsert(
+            collection_name=collection,
+            points=[
+                rest.PointStruct(id=pid, vector=vector, payload={"page_content": c.page_content, "metadata": c.metadata})
+                for pid, c, vector in zip(batch_ids, batch, vectors)
+            ],
+        )
+        if store is not None:
+            store.append(batch_ids, texts, [c.metadata for c in batch], vectors)
+        if progress:
+            progress("embedding", min(start + batch_size, len(chunks)), len(chunks))
+
+
+def compact_chunk_store(collection: str):
+    """Drop overwritten and deleted records once they make up too much of the store."""
+    kept = get_chunk_store(collection).compact_if_needed()
+    if kept is not None:
+        log.info(f"🗜️ Chunk store compacted: {kept} records")
+
+
+def point_ids(client: QdrantClient, collection: str, flt: Optional[rest.Filter] = None) -> List[str]:
+    """IDs of the points matching `flt` (no payloads or vectors transferred)."""
+    ids, offset = [], None
+    while True:
+        points, offset = client.scroll(
+            collection_name=collection,
+            scroll_filter=flt,
+            limit=1000,
+            offset=offset,
+            with_payload=False,
+            with_vectors=False,
+        )
+        ids.extend(str(p.id) for p in points)
+        if offset is None:
+            return ids
+
+
+def linked_sources(client: QdrantClient, collection: str, tenant_id: str, sources: Iterable[str]) -> List[str]:
+    """
+    `sources` plus every file sharing a deduplicated chunk with them, transitively:
+    deleting a kept chunk would otherwise lose the copies dedup dropped from
+    its alt_sources, and re-adding a file must be deduplicated against them.
+    """
+    linked, frontier = set(sources), set(sources)
+    while frontier:
+        found, offset = set(), None
+        while True:
+            points, offset = client.scroll(
+                collection_name=collection,
+                scroll_filter=linked_source_filter(tenant_id, sorted(frontier)),
+                limit=1000,
+                offset=offset,
+                with_payload=["metadata"],
+                with_vectors=False,
+            )
+            for p in points:
+                meta = (p.payload or {}).get("metadata", {})
+                found.update([meta.get("source"), *meta.get("alt_sources", [])])
+            if offset is None:
+                break
+        found.discard(None)
+        frontier = found - linked
+        linked |= found
+    return sorted(linked)
+
+
+def reindex_sources(
+    client: QdrantClient,
+    sources: Iterable[str],
+    tenant_id: str = DEFAULT_TENANT,
+    docs_dir: Path = Path(DOCS_DIR),
+    embedding=None,
+    dedup: bool = DEDUP_ENABLED,
+    before_batch: Optional[Callable[[], None]] = None,
+    progress: Optional[Callable[[str, int, int], None]] = None,
+) -> Optional[dict]:
+    """
+    Incremental re-index of the given files (paths relative to docs_dir):
+    files that still exist are re-embedded and upserted, then their points
+    that are not part of the new version are deleted. Files linked to them by
+    near-duplicate chunks are re-indexed with them; near-duplicates are only
+    removed within that set.
+    """
+    requested = set(sources)
+    if not requested:
+        return None
+    collection = collection_for_tenant(tenant_id)
+    ensure_collection(client, collection)
+    sources = linked_sources(client, collection, tenant_id, requested)
+    if len(sources) > len(requested):
+        log.info(f"🔗 Re-indexing {len(sources) - len(requested)} linked file(s) sharing deduplicated chunks")
+
+    docs = []
+    for rel in sources:
+        path = docs_dir / rel
+        if path.is_file():
+            docs.extend(load_file(path, docs_dir, tenant_id))
+    chunks = split_docs(docs) if docs else []
+    split_count = len(chunks)
+    if dedup and chunks:
+        chunks = remove_near_duplicates(chunks)
+
+    # New version first, so the files stay searchable while they are embedded;
+    # then only the points that are no longer part of it go (IDs are content hashes)
+    ids = make_ids(chunks)
+    if chunks:
+        upsert_chunks(
+            client, collection, chunks, ids, embedding,
+            before_batch=before_batch, progress=progress,
+        )
+    current = set(ids)
+    stale = [pid for pid in point_ids(client, collection, source_filter(tenant_id, sources)) if pid not in current]
+    if stale:
+        if CHUNK_STORE_ENABLED:
+            get_chunk_store(collection).delete(stale)
+        client.delete(collection_name=collection, points_selector=rest.PointIdsList(points=stale))
+
+    if CHUNK_STORE_ENABLED:
+        compact_chunk_store(collection)
+
+    previous = get_tenant_version(client, collection, tenant_id)
+    version = bump_collection_version(client, collection, tenant_id, changed_sources=sources)
+    log.info(f"🔁 Re-indexed {len(sources)} file(s) → {len(chunks)} chunks ({collection}, version {version})")
+
+    try:
+        from apps.rag.faq import prune_faq_sources
+        prune_faq_sources(tenant_id, sources, previous, version)
+    except Exception as e:
+        log.warning(f"⚠️ FAQ prune failed (index will be treated as stale): {e}")
+
+    return {
+        "collection": collection,
+        "version": version,
+        "sources": sources,
+        "documents": len(docs),
+        "chunks": len(chunks),
+        "duplicates_removed": split_count - len(chunks),
+    }
+
+
+def main(
+    rebuild: bool = False,
+    tenant_id: str = DEFAULT_TENANT,
+    build_faq: bool = False,
+    dedup: bool = DEDUP_ENABLED,
+    before_batch: Optional[Callable[[], None]] = None,
+    progress: Optional[Callable[[str, int, int], None]] = None,
+) -> Optional[dict]:
     Path(DOCS_DIR).mkdir(parents=True, exist_ok=True)
+    collection = collection_for_tenant(tenant_id)
 
     # 1️⃣ Load and split documents
-    log.info(f"📚 Loading documents from: {DOCS_DIR}")
-    raw_docs = load_all_docs(Path(DOCS_DIR))
+    log.info(f"📚 Loading documents from: {DOCS_DIR} (tenant: {tenant_id})")
+    raw_docs = load_all_docs(Path(DOCS_DIR), tenant_id)
     if not raw_docs:
         log.warning("⚠️ No documents found. Add files to apps/docs and re-run.")
-        return
+        return None
 
     chunks = split_docs(raw_docs)
+    split_count = len(chunks)
+    if dedup:
+        chunks = remove_near_duplicates(chunks)
     ids = make_ids(chunks)
 
     # 2️⃣ Setup Qdrant client
-    log.info(f"🧠 Connecting to Qdrant at: {VECTOR_DB_URL}")
-    client = QdrantClient(url=VECTOR_DB_URL)
+    client = get_qdrant_client()
 
     if rebuild:
-        if client.collection_exists(QDRANT_COLLECTION):
-            client.delete_collection(QDRANT_COLLECTION)
-            log.info(f"🗑️ Deleted existing collection: {QDRANT_COLLECTION}")
-
-        client.create_collection(
-            collection_name=QDRANT_COLLECTION,
-            vectors_config=rest.VectorParams(size=384, distance=rest.Distance.COSINE),
-        )
-        log.info(f"✅ Created new collection: {QDRANT_COLLECTION}")
-
-    # 3️⃣ Upsert into Qdrant
-    vectordb = QdrantVectorStore(
-        client=client,
-        collection_name=QDRANT_COLLECTION,
-        embedding=embeddings,
-    )
+        if is_dedicated(tenant_id):
+            if client.collection_exists(collection):
+                client.delete_collection(collection)
+                log.info(f"🗑️ Deleted existing collection: {collection}")
+        elif client.collection_exists(collection):
+            # Shared collection: only drop this tenant's points
+            client.delete(
+                collection_name=collection,
+                points_selector=rest.FilterSelector(filter=tenant_filter(tenant_id)),
+            )
+            log.info(f"🗑️ Deleted tenant '{tenant_id}' points from: {collection}")
+
+    ensure_collection(client, collection)
+    log.info(f"✅ Collection ready: {collection}")
+
+    # 3️⃣ Upsert into Qdrant (+ local chunk store)
+    upsert_chunks(client, collection, chunks, ids, before_batch=before_batch, progress=progress)
+    if rebuild and CHUNK_STORE_ENABLED:
+        # Drop records of points the rebuild deleted
+        kept = get_chunk_store(collection).compact(keep_ids=point_ids(client, collection))
+        log.info(f"🗜️ Chunk store compacted: {kept} records")
+    elif CHUNK_STORE_ENABLED:
+        compact_chunk_store(collection)
+    version = bump_collection_version(client, collection, tenant_id)
+    log.info(f"🎉 Ingested {len(chunks)} chunks into Qdrant ({collection}, version {version})!")
+
+    # 4️⃣ Precompute answers for popular questions against the new version
+    if build_faq:
+        import asyncio
+        from apps.rag.faq import build_faq_index
+        if progress:
+            progress("faq", 0, 1)
+        try:
+            asyncio.run(build_faq_index(tenant_id))
+        except Exception as e:
+            log.warning(f"⚠️ FAQ index build failed (online lookups will skip it): {e}")
 
-    vectordb.add_documents(chunks, ids=ids)
-    log.info(f"🎉 Ingested {len(chunks)} chunks into Qdrant!")
+    return {
+        "collection": collection,
+        "version": version,
+        "documents": len(raw_docs),
+        "chunks": len(chunks),
+        "duplicates_removed": split_count - len(chunks),
+    }
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument(
-        "--rebuild", action="store_true", help="Delete and rebuild the vector DB"
+        "--rebuild", action="store_true",
+        help="Delete the tenant's points and rebuild them (a dedicated tenant's whole collection; "
+             "in the shared collection, other tenants' points are kept)"
+    )
+    parser.add_argument(
+        "--tenant", default=DEFAULT_TENANT, help="Tenant that owns the ingested documents"
+    )
+    parser.add_argument(
+        "--faq", action="store_true",
+        help="Also rebuild the precomputed FAQ answers now (slow: needs Ollama, one generation per "
+             "entry); otherwise a running API rebuilds them in the background"
+    )
+    parser.add_argument(
+        "--no-dedup", action="store_true", help="Keep near-duplicate chunks"
+    )
+    parser.add_argument(
+        "--watch", action="store_true", help="After ingesting, keep re-indexing files as they change"
     )
     args = parser.parse_args()
-    main(rebuild=args.rebuild)
+    main(
+        rebuild=args.rebuild,
+        tenant_id=args.tenant,
+        build_faq=args.faq,
+        dedup=DEDUP_ENABLED and not args.no_dedup,
+    )
+    if args.watch:
+        import asyncio
+        from apps.rag.watch import watch_docs
+        try:
+            asyncio.run(watch_docs(args.tenant, dedup=DEDUP_ENABLED and not args.no_dedup))
+        except KeyboardInterrupt:
+            log.info("👋 Stopped watching")
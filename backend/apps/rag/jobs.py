@@ -0,0 +1,367 @@
+# apps/rag/jobs.py
+# Background ingest jobs for the admin API.
+#
+# Each job runs in its own worker process (spawned, niced, with a small
+# torch/BLAS thread cap) so embedding never competes with the API's event
+# loop. With embedded Qdrant (QDRANT_MODE local/memory) only the API process
+# may open the store, so jobs run in a thread of the API process instead.
+# Between embedding batches the worker also pauses while the API's query
+# retrieval latency is above INGEST_RETRIEVAL_SLO. Jobs run one at a time;
+# finished jobs are written to Mongo for capacity planning.
+
+import asyncio
+import logging
+import multiprocessing as mp
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+from typing import List, Optional
+
+from apps.rag.config import (
+    DOCS_DIR, DEFAULT_TENANT, INGEST_WORKER_NICE, INGEST_WORKER_THREADS,
+    INGEST_RETRIEVAL_SLO, INGEST_MAX_PAUSE, INGEST_JOB_HISTORY,
+)
+
+log = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = {"queued", "running", "cancelling"}
+
+
+class JobCancelled(Exception):
+    """Raised inside the worker when the job is cancelled between batches."""
+
+
+# ---------------------------
+# Worker process
+# ---------------------------
+def _limit_worker_resources():
+    for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+        os.environ[var] = str(INGEST_WORKER_THREADS)
+    os.environ["TOKENIZERS_PARALLELISM"] = "false"
+    try:
+        os.nice(INGEST_WORKER_NICE)
+    except (AttributeError, OSError):
+        pass  # not supported here; the thread cap and SLO pauses still apply
+    try:
+        import torch
+        torch.set_num_threads(INGEST_WORKER_THREADS)
+    except ImportError:
+        pass
+
+
+def _worker(job: dict, events, cancel, pause, in_process: bool = False):
+    """Entry point of the worker process; reports back through `events`."""
+    if not in_process:
+        _limit_worker_resources()  # nice/thread caps would hit the whole API process
+    from apps.rag import ingest
+    from apps.rag.qdrant import get_qdrant_client
+    from apps.rag.index_meta import bump_collection_version
+    from apps.rag.tenancy import collection_for_tenant
+
+    throttled = {"seconds": 0.0}
+
+    def progress(stage: str, done: int, total: int):
+        events.put(("progress", {"stage": stage, "done": done, "total": total}))
+
+    def before_batch():
+        paused_at = time.monotonic()
+        while pause.is_set() and not cancel.is_set():
+            if time.monotonic() - paused_at >= INGEST_MAX_PAUSE:
+                break
+            time.sleep(0.2)
+        throttled["seconds"] += time.monotonic() - paused_at
+        # A rebuild deleted the old points before its first batch: stopping
+        # now would leave a partial index live, so it always runs to the end
+        if cancel.is_set() and not job["rebuild"]:
+            raise JobCancelled()
+
+    progress("loading", 0, 0)
+    try:
+        if job["mode"] == "incremental":
+            result = ingest.reindex_sources(
+                get_qdrant_client(),
+                job["sources"],
+                job["tenant_id"],
+                dedup=job["dedup"],
+                before_batch=before_batch,
+                progress=progress,
+            )
+        else:
+            result = ingest.main(
+                rebuild=job["rebuild"],
+                tenant_id=job["tenant_id"],
+                build_faq=job["build_faq"],
+                dedup=job["dedup"],
+                before_batch=before_batch,
+                progress=progress,
+            )
+        events.put(("done", {**(result or {}), "throttled_seconds": round(throttled["seconds"], 1)}))
+    except JobCancelled:
+        # Whatever was upserted is live now: bump the version so caches drop it
+        try:
+            collection = collection_for_tenant(job["tenant_id"])
+            bump_collection_version(get_qdrant_client(), collection, job["tenant_id"])
+        except Exception:
+            pass
+        events.put(("cancelled", {"throttled_seconds": round(throttled["seconds"], 1)}))
+    except Exception as e:
+        events.put(("failed", {"error": str(e)}))
+
+
+class _InProcessWorker(threading.Thread):
+    """Thread with the bits of the mp.Process interface the manager uses."""
+    exitcode = None
+
+    def __init__(self, target, args, name, daemon):
+        super().__init__(target=target, args=args + (True,), name=name, daemon=daemon)
+
+    def terminate(self):
+        pass  # threads cannot be killed; the manager waits for the next batch boundary
+
+
+class _InProcessContext:
+    """Drop-in for the spawn context when jobs must share the API's embedded Qdrant."""
+    Event = threading.Event
+    Queue = queue.Queue
+    Process = _InProcessWorker
+
+
+# ---------------------------
+# Job manager (API process)
+# ---------------------------
+class IngestJobManager:
+    def __init__(self):
+        from apps.rag.qdrant import is_embedded
+        self.jobs = OrderedDict()  # job_id -> job dict, newest last
+        self._ctx = _InProcessContext() if is_embedded() else mp.get_context("spawn")
+        self._queue: Optional[asyncio.Queue] = None
+        self._runner: Optional[asyncio.Task] = None
+        self._cancel_events = {}
+        self._pause = None
+        # Query-path signal for the throttle
+        self.retrieval_ewma = 0.0
+        self._last_sample = 0.0
+
+    # ---- throttle signal ----
+    def note_retrieval_latency(self, seconds: float):
+        self.retrieval_ewma = seconds if not self._last_sample else 0.8 * self.retrieval_ewma + 0.2 * seconds
+        self._last_sample = time.monotonic()
+
+    def _over_slo(self) -> bool:
+        # Without recent queries there is nothing to protect
+        recent = time.monotonic() - self._last_sample < 2.0
+        return recent and self.retrieval_ewma > INGEST_RETRIEVAL_SLO
+
+    # ---- public API ----
+    async def submit(
+        self,
+        tenant_id: str = DEFAULT_TENANT,
+        mode: str = "full",
+        rebuild: bool = False,
+        sources: Optional[List[str]] = None,
+        build_faq: bool = False,
+        dedup: bool = True,
+        submitted_by: Optional[str] = None,
+    ) -> dict:
+        if mode == "incremental":
+            sources = self._check_sources(sources) if sources else await self._changed_since_last_job(tenant_id)
+            if not sources:
+                raise ValueError("No changed files since the last successful ingest")
+        job = {
+            "job_id": uuid.uuid4().hex[:12],
+            "tenant_id": tenant_id,
+            "mode": mode,
+            "rebuild": rebuild and mode == "full",
+            "sources": sources if mode == "incremental" else None,
+            "build_faq": build_faq and mode == "full",
+            "dedup": dedup,
+            "submitted_by": submitted_by,
+            "status": "queued",
+            "progress": {"stage": "queued", "done": 0, "total": 0},
+            "result": None,
+            "error": None,
+            "created_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+        }
+        self.jobs[job["job_id"]] = job
+        self._trim_history()
+        self._ensure_runner()
+        await self._queue.put(job["job_id"])
+        return self.view(job)
+
+    def get(self, job_id: str) -> Optional[dict]:
+        job = self.jobs.get(job_id)
+        return self.view(job) if job else None
+
+    def list(self) -> List[dict]:
+        return [self.view(j) for j in reversed(self.jobs.values())]
+
+    def cancel(self, job_id: str) -> Optional[dict]:
+        job = self.jobs.get(job_id)
+        if not job:
+            return None
+        if job["status"] == "queued":
+            job["status"] = "cancelled"
+            job["finished_at"] = time.time()
+        elif job["status"] == "running" and job["rebuild"]:
+            raise ValueError("A running rebuild cannot be cancelled: the old index is already deleted")
+        elif job["status"] == "running":
+            job["status"] = "cancelling"
+            self._cancel_events[job_id].set()
+        return self.view(job)
+
+    def view(self, job: dict) -> dict:
+        out = dict(job)
+        p = job["progress"]
+        out["progress"] = {**p, "fraction": round(p["done"] / p["total"], 3) if p["total"] else None}
+        return out
+
+    def get_stats(self) -> dict:
+        return {
+            "active": sum(1 for j in self.jobs.values() if j["status"] in ACTIVE_STATUSES),
+            "retrieval_ewma": round(self.retrieval_ewma, 3),
+            "throttling": bool(self._pause is not None and self._pause.is_set()),
+        }
+
+    # ---- internals ----
+    def _check_sources(self, sources: List[str]) -> List[str]:
+        docs_dir = Path(DOCS_DIR).resolve()
+        checked = []
+        for rel in sources:
+            path = (docs_dir / rel).resolve()
+            if docs_dir not in path.parents:
+                raise ValueError(f"Source outside the docs directory: {rel}")
+            checked.append(path.relative_to(docs_dir).as_posix())
+        return sorted(set(checked))
+
+    async def _changed_since_last_job(self, tenant_id: str) -> List[str]:
+        """Files modified since the tenant's last successful job (deletions must be listed)."""
+        from apps.core.mongo import get_ingest_jobs
+        try:
+            last = await get_ingest_jobs(limit=1, tenant_id=tenant_id, status="done")
+        except Exception as e:
+            log.warning(f"⚠️ Could not read ingest history: {e}")
+            last = [j for j in reversed(self.jobs.values()) if j["tenant_id"] == tenant_id and j["status"] == "done"][:1]
+        since = last[0]["started_at"] if last else 0.0
+
+        from apps.rag.ingest import is_supported
+        docs_dir = Path(DOCS_DIR)
+        return sorted(
+            p.relative_to(docs_dir).as_posix()
+            for p in docs_dir.rglob("*")
+            if p.is_file() and is_supported(p) and p.stat().st_mtime > since
+        )
+
+    def _trim_history(self):
+        finished = [k for k, j in self.jobs.items() if j["status"] not in ACTIVE_STATUSES]
+        for job_id in finished[:max(0, len(finished) - INGEST_JOB_HISTORY)]:
+            self.jobs.pop(job_id, None)
+
+    def _ensure_runner(self):
+        if self._runner is None or self._runner.done():
+            self._queue = asyncio.Queue()
+            for job_id, job in self.jobs.items():
+                if job["status"] == "queued":
+                    self._queue.put_nowait(job_id)
+            self._runner = asyncio.get_running_loop().create_task(self._run_loop())
+
+    async def _run_loop(self):
+        while True:
+            job_id = await self._queue.get()
+            job = self.jobs.get(job_id)
+            if not job or job["status"] != "queued":
+                continue
+            try:
+                await self._run(job)
+            except Exception as e:
+                job.update({"status": "failed", "error": str(e), "finished_at": time.time()})
+                log.error(f"❌ Ingest job {job_id} crashed: {e}")
+            await self._save(job)
+
+    async def _run(self, job: dict):
+        if self._pause is None:
+            self._pause = self._ctx.Event()
+        events = self._ctx.Queue()
+        cancel = self._ctx.Event()
+        self._cancel_events[job["job_id"]] = cancel
+        params = {k: job[k] for k in ("tenant_id", "mode", "rebuild", "sources", "build_faq", "dedup")}
+        process = self._ctx.Process(
+            target=_worker, args=(params, events, cancel, self._pause), name=f"ingest-{job['job_id']}", daemon=True
+        )
+
+        job.update({"status": "running", "started_at": time.time()})
+        log.info(f"🚚 Ingest job {job['job_id']} started ({job['mode']}, tenant {job['tenant_id']})")
+        process.start()
+        loop = asyncio.get_running_loop()
+        outcome, cancel_sent_at, waiting_logged = None, None, False
+        try:
+            while outcome is None:
+                if self._over_slo():
+                    self._pause.set()
+                else:
+                    self._pause.clear()
+                try:
+                    kind, data = await loop.run_in_executor(None, events.get, True, 0.5)
+                except queue.Empty:
+                    if cancel.is_set():
+                        cancel_sent_at = cancel_sent_at or time.monotonic()
+                        if time.monotonic() - cancel_sent_at > 15:
+                            if not isinstance(process, _InProcessWorker):
+                                process.terminate()  # stuck outside a batch boundary
+                                outcome = ("cancelled", {})
+                            elif not waiting_logged:
+                                # A thread keeps writing until it reaches a batch
+                                # boundary: not cancelled (and no next job) until it exits
+                                log.warning(f"⏳ Ingest job {job['job_id']} still finishing its current batch")
+                                waiting_logged = True
+                    if outcome is None and not process.is_alive():
+                        outcome = ("failed", {"error": f"worker exited with code {process.exitcode}"})
+                    continue
+                if kind == "progress":
+                    job["progress"] = data
+                else:
+                    outcome = (kind, data)
+        except asyncio.CancelledError:
+            process.terminate()
+            raise
+        finally:
+            self._pause.clear()
+            self._cancel_events.pop(job["job_id"], None)
+            await loop.run_in_executor(None, process.join, 5)
+
+        kind, data = outcome
+        finished = time.time()
+        duration = finished - job["started_at"]
+        job.update({"status": kind, "finished_at": finished, "duration": round(duration, 2)})
+        if kind == "failed":
+            job["error"] = data.get("error")
+        else:
+            chunks = data.get("chunks", 0)
+            job["result"] = {**data, "chunks_per_second": round(chunks / duration, 2) if duration and chunks else 0.0}
+        log.info(f"🏁 Ingest job {job['job_id']} {kind} in {duration:.1f}s")
+
+    async def _save(self, job: dict):
+        from apps.core.mongo import save_ingest_job
+        try:
+            await save_ingest_job(job)
+        except Exception as e:
+            log.warning(f"⚠️ Could not save ingest job history: {e}")
+
+    async def shutdown(self):
+        for cancel in self._cancel_events.values():
+            cancel.set()
+        if self._runner is not None:
+            self._runner.cancel()
+
+
+# Global instance
+ingest_jobs = IngestJobManager()
+
+
+def note_retrieval_latency(seconds: float):
+    ingest_jobs.note_retrieval_latency(seconds)
@@ -3,26 +3,66 @@
 
 import time
 from langchain_ollama import OllamaLLM
-from apps.rag.config import OLLAMA_BASE_URL
+from apps.rag.config import (
+    OLLAMA_BASE_URLS, OLLAMA_MODEL, OLLAMA_KEEP_ALIVE, OLLAMA_CONNECT_TIMEOUT,
+    OLLAMA_READ_TIMEOUT, OLLAMA_MAX_CONNECTIONS, OLLAMA_HEALTH_INTERVAL,
+    OLLAMA_EJECT_COOLDOWN, LLM_OPTIONS, BREAKER_FAILURE_THRESHOLD, BREAKER_ERROR_RATE,
+    BREAKER_WINDOW, BREAKER_MIN_CALLS, BREAKER_RESET_TIMEOUT, LLM_CASCADE_ENABLED, LLM_FAST_MODEL,
+    LLM_MAX_ACTIVE,
+)
+from apps.rag.ollama_client import OllamaClient, OllamaPool
+from apps.rag.resilience import AdmissionQueue, CircuitBreaker
+
+# Async pooled clients (one per replica) used on the query path
+ollama_pool = OllamaPool(
+    [
+        OllamaClient(
+            base_url=url,
+            model=OLLAMA_MODEL,
+            keep_alive=OLLAMA_KEEP_ALIVE,
+            options=LLM_OPTIONS,
+            connect_timeout=OLLAMA_CONNECT_TIMEOUT,
+            read_timeout=OLLAMA_READ_TIMEOUT,
+            max_connections=OLLAMA_MAX_CONNECTIONS,
+            extra_models=[LLM_FAST_MODEL] if LLM_CASCADE_ENABLED else [],
+        )
+        for url in OLLAMA_BASE_URLS
+    ],
+    eject_cooldown=OLLAMA_EJECT_COOLDOWN,
+    health_interval=OLLAMA_HEALTH_INTERVAL,
+)
+
+# Trips on LLM timeouts/errors so requests fail fast with a degraded answer
+llm_breaker = CircuitBreaker(
+    "ollama",
+    failure_threshold=BREAKER_FAILURE_THRESHOLD,
+    error_rate=BREAKER_ERROR_RATE,
+    window=BREAKER_WINDOW,
+    min_calls=BREAKER_MIN_CALLS,
+    reset_timeout=BREAKER_RESET_TIMEOUT,
+)
+
+# FIFO line for generation slots, shared by every caller in the process
+llm_queue = AdmissionQueue("ollama", LLM_MAX_ACTIVE)
 
+# LangChain wrapper, kept for chain-based tooling
 llm = OllamaLLM(
-    model="mistral",
-    base_url=OLLAMA_BASE_URL,
+    model=OLLAMA_MODEL,
+    base_url=OLLAMA_BASE_URLS[0],
     streaming=False,
-    num_ctx=2048,
-    num_predict=150,
-    temperature=0.1,
-    top_p=0.9,
-    repeat_penalty=1.1
+    keep_alive=OLLAMA_KEEP_ALIVE,
+    **LLM_OPTIONS
 )
 
-def warmup_llm():
+async def generate(prompt: str, **kwargs) -> dict:
+    """Generate an answer on the least-loaded replica; returns text plus Ollama timings."""
+    return await ollama_pool.generate(prompt, **kwargs)
+
+async def warmup_llm():
     try:
         print("🟡 Warming up LLM...")
         start = time.time()
-        _ = llm.invoke("Hi")
+        await ollama_pool.keep_warm()
         print(f"✅ LLM warmup complete ({time.time() - start:.2f}s)")
     except Exception as e:
         print(f"⚠️ LLM warmup failed: {e}")
-
-warmup_llm()
@@ -0,0 +1,122 @@
+# apps/rag/migrate.py
+# Copy collections between Qdrant modes: server <-> embedded (on disk).
+#
+#   # server -> local store (then run with QDRANT_MODE=local)
+#   python -m apps.rag.migrate --from server --to local --path vectorstore/qdrant
+#   # back again
+#   python -m apps.rag.migrate --from local --to server --url http://samsubot_qdrant:6333
+#
+# Points are copied verbatim (same IDs, vectors and payloads) so the chunk
+# store, FAQ metadata and index versions stay valid in the new mode. Stop the
+# API first when either side is the embedded store: only one process may open it.
+
+import argparse
+import logging
+import sys
+from typing import List, Optional
+
+from qdrant_client import QdrantClient
+from qdrant_client.http import models as rest
+
+from apps.rag.config import QDRANT_PATH, VECTOR_DB_URL
+from apps.rag.qdrant import MODES, make_client, is_embedded
+from apps.rag.tenancy import SOURCE_PAYLOAD_KEY, TENANT_PAYLOAD_KEY
+
+logging.basicConfig(level=logging.INFO, format="%(message)s")
+log = logging.getLogger(__name__)
+
+
+def copy_collection(
+    src: QdrantClient,
+    dst: QdrantClient,
+    collection: str,
+    batch_size: int = 256,
+    recreate: bool = False,
+    index_fields: bool = True,
+) -> int:
+    """Copy one collection point for point; returns the number of points copied."""
+    info = src.get_collection(collection)
+    params = info.config.params
+    if dst.collection_exists(collection):
+        if not recreate:
+            raise RuntimeError(f"{collection} already exists in the target (use --recreate to replace it)")
+        dst.delete_collection(collection)
+    dst.create_collection(
+        collection_name=collection,
+        vectors_config=params.vectors,
+        on_disk_payload=params.on_disk_payload,
+    )
+    # Keyword indexes only exist on the server
+    if index_fields:
+        for field in (TENANT_PAYLOAD_KEY, SOURCE_PAYLOAD_KEY):
+            dst.create_payload_index(collection, field_name=field, field_schema=rest.PayloadSchemaType.KEYWORD)
+
+    copied, offset = 0, None
+    while True:
+        points, offset = src.scroll(
+            collection_name=collection,
+            limit=batch_size,
+            offset=offset,
+            with_payload=True,
+            with_vectors=True,
+        )
+        if points:
+            dst.upsert(
+                collection_name=collection,
+                points=[rest.PointStruct(id=p.id, vector=p.vector, payload=p.payload) for p in points],
+                wait=True,
+            )
+            copied += len(points)
+            log.info(f"  {collection}: {copied} points")
+        if offset is None:
+            break
+    return copied
+
+
+def migrate(
+    src: QdrantClient,
+    dst: QdrantClient,
+    collections: Optional[List[str]] = None,
+    recreate: bool = False,
+    index_fields: bool = True,
+) -> dict:
+    names = collections or [c.name for c in src.get_collections().collections]
+    copied = {}
+    for name in names:
+        log.info(f"📦 Copying {name}...")
+        copied[name] = copy_collection(src, dst, name, recreate=recreate, index_fields=index_fields)
+        expected = src.count(name, exact=True).count
+        actual = dst.count(name, exact=True).count
+        if actual != expected:
+            raise RuntimeError(f"{name}: copied {actual} points, source has {expected}")
+        log.info(f"✅ {name}: {actual} points")
+    return copied
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Copy Qdrant collections between server and embedded mode")
+    parser.add_argument("--from", dest="source", choices=MODES, required=True)
+    parser.add_argument("--to", dest="target", choices=MODES, required=True)
+    parser.add_argument("--url", default=VECTOR_DB_URL, help="Server URL (either side)")
+    parser.add_argument("--path", default=QDRANT_PATH, help="Embedded store path (either side)")
+    parser.add_argument("--collection", action="append", help="Only these collections (repeatable)")
+    parser.add_argument("--recreate", action="store_true", help="Replace collections that already exist in the target")
+    args = parser.parse_args()
+
+    if args.source == args.target:
+        parser.error("--from and --to must differ")
+    src = make_client(args.source, url=args.url, path=args.path)
+    dst = make_client(args.target, url=args.url, path=args.path)
+    try:
+        copied = migrate(src, dst, args.collection, args.recreate, index_fields=not is_embedded(args.target))
+    except RuntimeError as e:
+        log.error(f"❌ {e}")
+        sys.exit(1)
+    finally:
+        src.close()
+        dst.close()
+    log.info(f"🎉 Migrated {sum(copied.values())} points in {len(copied)} collections ({args.source} -> {args.target})")
+
+
+if __name__ == "__main__":
+    main()
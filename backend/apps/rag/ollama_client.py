@@ -0,0 +1,389 @@
+# apps/rag/ollama_client.py
+# Async Ollama client: pooled keep-alive connections, explicit timeouts,
+# model residency (keep_alive) and a background keep-warm ping.
+# OllamaPool spreads generations over several Ollama replicas.
+
+import asyncio
+import json
+import logging
+import time
+import weakref
+from typing import Callable, List, Optional
+
+import httpx
+
+log = logging.getLogger(__name__)
+
+NS_PER_SECOND = 1e9
+# A load_duration above this means Ollama had to (re)load the model from disk
+COLD_LOAD_THRESHOLD = 1.0
+# Smoothing factor for the per-replica latency average
+LATENCY_EWMA_ALPHA = 0.2
+
+
+class OllamaClient:
+    def __init__(
+        self,
+        base_url: str,
+        model: str,
+        keep_alive: str,
+        options: dict,
+        connect_timeout: float,
+        read_timeout: float,
+        max_connections: int,
+        extra_models: List[str] = (),
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.model = model
+        # Models the keep-warm loop keeps resident (cascade tiers)
+        self.warm_models = [model, *extra_models]
+        self.keep_alive = keep_alive
+        self.options = options
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_connections = max_connections
+        # Event loop -> httpx client; entries go away with their loop
+        self._clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = (
+            weakref.WeakKeyDictionary()
+        )
+        self._keep_warm_task: Optional[asyncio.Task] = None
+        # Replica state used by OllamaPool
+        self.in_flight = 0
+        self.latency_ewma = 0.0
+        self.healthy = True
+        self.ejected_until = 0.0
+        self.stats = {
+            "calls": 0,
+            "errors": 0,
+            "cold_loads": 0,
+            "total_time": 0.0,
+            "load_time": 0.0,
+            "prompt_eval_time": 0.0,
+            "eval_time": 0.0,
+            "prompt_tokens": 0,
+            "eval_tokens": 0,
+            "keep_warm_pings": 0,
+            "cancelled": 0,
+            "cancelled_time": 0.0,
+        }
+
+    # ---------------------------
+    # Connection pool
+    # ---------------------------
+    def _http(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        # Pooled connections belong to the loop that opened them, so each loop
+        # (the API's, a RagClient's, an asyncio.run() wrapper's) gets its own
+        client = self._clients.get(loop)
+        if client is None or client.is_closed:
+            client = self._clients[loop] = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=httpx.Timeout(self.read_timeout, connect=self.connect_timeout),
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                    keepalive_expiry=60,
+                ),
+            )
+        return client
+
+    async def aclose(self):
+        """Close the calling loop's connections and keep-warm task; other loops keep theirs."""
+        loop = asyncio.get_running_loop()
+        if self._keep_warm_task is not None and self._keep_warm_task.get_loop() is loop:
+            self.stop_keep_warm()
+        client = self._clients.pop(loop, None)
+        if client is not None and not client.is_closed:
+            await client.aclose()
+
+    # ---------------------------
+    # Generation
+    # ---------------------------
+    async def generate(
+        self,
+        prompt: str,
+        model: Optional[str] = None,
+        options: Optional[dict] = None,
+        timeout: Optional[float] = None,
+        on_token: Optional[Callable[[str], None]] = None,
+    ) -> dict:
+        """
+        /api/generate call; returns text plus Ollama's timings. With `on_token`
+        the answer is streamed and each fragment is passed on as it arrives.
+        """
+        payload = {
+            "model": model or self.model,
+            "prompt": prompt,
+            "stream": on_token is not None,
+            "keep_alive": self.keep_alive,
+            "options": {**self.options, **(options or {})},
+        }
+        request_timeout = httpx.USE_CLIENT_DEFAULT
+        if timeout is not None:
+            request_timeout = httpx.Timeout(timeout, connect=min(self.connect_timeout, timeout))
+
+        start = time.perf_counter()
+        self.stats["calls"] += 1
+        self.in_flight += 1
+        try:
+            if on_token is None:
+                r = await self._http().post("/api/generate", json=payload, timeout=request_timeout)
+                r.raise_for_status()
+                data = r.json()
+            else:
+                data = await self._stream(payload, request_timeout, on_token)
+        except asyncio.CancelledError:
+            # Closing the connection makes Ollama abort the generation
+            self.stats["cancelled"] += 1
+            self.stats["cancelled_time"] += time.perf_counter() - start
+            raise
+        except Exception:
+            self.stats["errors"] += 1
+            raise
+        finally:
+            self.in_flight -= 1
+
+        result = {
+            "text": data.get("response", ""),
+            "model": data.get("model", payload["model"]),
+            "done_reason": data.get("done_reason"),
+            "total_time": time.perf_counter() - start,
+            # Ollama reports durations in nanoseconds
+            "load_time": data.get("load_duration", 0) / NS_PER_SECOND,
+            "prompt_eval_time": data.get("prompt_eval_duration", 0) / NS_PER_SECOND,
+            "eval_time": data.get("eval_duration", 0) / NS_PER_SECOND,
+            "prompt_tokens": data.get("prompt_eval_count", 0),
+            "eval_tokens": data.get("eval_count", 0),
+        }
+        self._record(result)
+        return result
+
+    async def _stream(self, payload: dict, timeout, on_token: Callable[[str], None]) -> dict:
+        """Read Ollama's NDJSON stream; returns the final chunk with the whole text as "response"."""
+        parts = []
+        async with self._http().stream("POST", "/api/generate", json=payload, timeout=timeout) as r:
+            r.raise_for_status()
+            async for line in r.aiter_lines():
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                if "error" in chunk:
+                    raise RuntimeError(f"Ollama: {chunk['error']}")
+                if chunk.get("response"):
+                    parts.append(chunk["response"])
+                    on_token(chunk["response"])
+                if chunk.get("done"):
+                    return {**chunk, "response": "".join(parts)}
+        raise httpx.RemoteProtocolError("Ollama stream ended before the final chunk")
+
+    def _record(self, result: dict):
+        if self.latency_ewma:
+            self.latency_ewma += LATENCY_EWMA_ALPHA * (result["total_time"] - self.latency_ewma)
+        else:
+            self.latency_ewma = result["total_time"]
+        for key in ("total_time", "load_time", "prompt_eval_time", "eval_time", "prompt_tokens", "eval_tokens"):
+            self.stats[key] += result[key]
+        if result["load_time"] > COLD_LOAD_THRESHOLD:
+            self.stats["cold_loads"] += 1
+            log.warning(f"🧊 Ollama cold load of {result['model']}: {result['load_time']:.2f}s")
+
+    # ---------------------------
+    # Model residency
+    # ---------------------------
+    async def keep_warm(self, model: Optional[str] = None) -> float:
+        """Load the model (if needed) and reset its keep_alive timer; returns seconds taken."""
+        start = time.perf_counter()
+        # An empty prompt makes Ollama load the model without generating anything
+        r = await self._http().post(
+            "/api/generate",
+            json={"model": model or self.model, "keep_alive": self.keep_alive},
+        )
+        r.raise_for_status()
+        self.stats["keep_warm_pings"] += 1
+        return time.perf_counter() - start
+
+    async def _keep_warm_loop(self, interval: float):
+        while True:
+            for model in self.warm_models:
+                try:
+                    elapsed = await self.keep_warm(model)
+                    if elapsed > COLD_LOAD_THRESHOLD:
+                        log.info(f"✅ Ollama model {model} loaded ({elapsed:.2f}s)")
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    log.warning(f"⚠️ Ollama keep-warm of {model} failed: {e}")
+            await asyncio.sleep(interval)
+
+    def start_keep_warm(self, interval: float):
+        """Start the periodic keep-warm ping on the running loop (first ping is immediate)."""
+        if self._keep_warm_task is None or self._keep_warm_task.done():
+            self._keep_warm_task = asyncio.get_running_loop().create_task(self._keep_warm_loop(interval))
+
+    def stop_keep_warm(self):
+        if self._keep_warm_task is not None:
+            self._keep_warm_task.cancel()
+            self._keep_warm_task = None
+
+    # ---------------------------
+    # Health
+    # ---------------------------
+    def available(self) -> bool:
+        """Healthy, or ejected long enough ago to deserve another try."""
+        return self.healthy or time.monotonic() >= self.ejected_until
+
+    def eject(self, cooldown: float):
+        self.healthy = False
+        self.ejected_until = time.monotonic() + cooldown
+
+    async def health_check(self) -> bool:
+        try:
+            r = await self._http().get("/api/version", timeout=self.connect_timeout)
+            r.raise_for_status()
+            return True
+        except httpx.HTTPError:
+            return False
+
+    def get_stats(self) -> dict:
+        calls = max(self.stats["calls"] - self.stats["errors"] - self.stats["cancelled"], 1)
+        return {
+            "url": self.base_url,
+            "healthy": self.healthy,
+            "ejected_for": round(max(0.0, self.ejected_until - time.monotonic()), 1),
+            "in_flight": self.in_flight,
+            "latency_ewma": round(self.latency_ewma, 3),
+            **{k: round(v, 3) if isinstance(v, float) else v for k, v in self.stats.items()},
+            "avg_time": round(self.stats["total_time"] / calls, 3),
+            "avg_load_time": round(self.stats["load_time"] / calls, 3),
+            "avg_prompt_eval_time": round(self.stats["prompt_eval_time"] / calls, 3),
+            "avg_eval_time": round(self.stats["eval_time"] / calls, 3),
+        }
+
+
+class OllamaPool:
+    """Least-loaded routing over Ollama replicas with ejection and one retry."""
+
+    def __init__(self, replicas: List[OllamaClient], eject_cooldown: float, health_interval: float):
+        self.replicas = replicas
+        self.eject_cooldown = eject_cooldown
+        self.health_interval = health_interval
+        self._health_task: Optional[asyncio.Task] = None
+        self.stats = {"retries": 0, "ejections": 0, "exhausted": 0}
+
+    @property
+    def model(self) -> str:
+        return self.replicas[0].model
+
+    def _pick(self, exclude: List[OllamaClient]) -> Optional[OllamaClient]:
+        candidates = [r for r in self.replicas if r not in exclude and r.available()]
+        if not candidates:
+            # Everything is ejected: still try the one whose cooldown ends first
+            candidates = sorted(
+                (r for r in self.replicas if r not in exclude), key=lambda r: r.ejected_until
+            )[:1]
+        if not candidates:
+            return None
+        return min(candidates, key=lambda r: (r.in_flight, r.latency_ewma))
+
+    def _eject(self, replica: OllamaClient, error: Exception):
+        if replica.healthy:
+            self.stats["ejections"] += 1
+            log.warning(f"⚠️ Ejecting Ollama replica {replica.base_url} for {self.eject_cooldown:.0f}s: {error}")
+        replica.eject(self.eject_cooldown)
+
+    async def generate(self, prompt: str, on_token: Optional[Callable[[str], None]] = None, **kwargs) -> dict:
+        """Generate on the least-loaded replica; retry once on another if it fails."""
+        tried: List[OllamaClient] = []
+        last_error: Optional[Exception] = None
+        streamed = False
+
+        def relay(token: str):
+            nonlocal streamed
+            streamed = True
+            on_token(token)
+
+        for attempt in range(2):
+            replica = self._pick(tried)
+            if replica is None:
+                break
+            if attempt:
+                self.stats["retries"] += 1
+            tried.append(replica)
+            try:
+                result = await replica.generate(prompt, on_token=relay if on_token else None, **kwargs)
+            except httpx.HTTPStatusError as e:
+                if e.response.status_code < 500:
+                    raise  # bad request: another replica would reject it too
+                self._eject(replica, e)
+                last_error = e
+                continue
+            except httpx.TransportError as e:
+                if self._caller_timed_out(replica, e, kwargs.get("timeout")):
+                    raise  # the caller's budget ran out, not the replica's fault
+                self._eject(replica, e)
+                if streamed:
+                    raise  # the caller already has part of this answer
+                last_error = e
+                continue
+            replica.healthy = True
+            result["replica"] = replica.base_url
+            return result
+        self.stats["exhausted"] += 1
+        raise last_error or RuntimeError("No Ollama replica available")
+
+    @staticmethod
+    def _caller_timed_out(replica: OllamaClient, error: Exception, timeout: Optional[float]) -> bool:
+        """A timeout that only happened because the caller allowed less than the client's own limits."""
+        if not isinstance(error, httpx.TimeoutException) or timeout is None:
+            return False
+        limit = replica.connect_timeout if isinstance(error, httpx.ConnectTimeout) else replica.read_timeout
+        return timeout < limit
+
+    async def keep_warm(self):
+        """Load the models on every replica."""
+        await asyncio.gather(
+            *(r.keep_warm(m) for r in self.replicas for m in r.warm_models),
+            return_exceptions=True,
+        )
+
+    # ---------------------------
+    # Background tasks
+    # ---------------------------
+    async def _health_loop(self):
+        while True:
+            await asyncio.sleep(self.health_interval)
+            results = await asyncio.gather(*(r.health_check() for r in self.replicas))
+            for replica, ok in zip(self.replicas, results):
+                if ok and not replica.healthy and time.monotonic() >= replica.ejected_until:
+                    replica.healthy = True
+                    log.info(f"✅ Ollama replica {replica.base_url} back in rotation")
+                elif not ok:
+                    self._eject(replica, RuntimeError("health check failed"))
+
+    def start_keep_warm(self, interval: float):
+        """Start keep-warm pings on every replica plus the health checker."""
+        for replica in self.replicas:
+            replica.start_keep_warm(interval)
+        if self._health_task is None or self._health_task.done():
+            self._health_task = asyncio.get_running_loop().create_task(self._health_loop())
+
+    def stop_keep_warm(self):
+        for replica in self.replicas:
+            replica.stop_keep_warm()
+        if self._health_task is not None:
+            self._health_task.cancel()
+            self._health_task = None
+
+    async def aclose(self):
+        """Close what runs on the calling loop (see OllamaClient.aclose)."""
+        if self._health_task is not None and self._health_task.get_loop() is asyncio.get_running_loop():
+            self._health_task.cancel()
+            self._health_task = None
+        for replica in self.replicas:
+            await replica.aclose()
+
+    def get_stats(self) -> dict:
+        return {
+            **self.stats,
+            "replicas": [r.get_stats() for r in self.replicas],
+        }
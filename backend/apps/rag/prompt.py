@@ -3,6 +3,9 @@
 
 from langchain.prompts import PromptTemplate
 
+# Exact refusal sentence the model is told to use; checked by cascade.py and faq.py
+REFUSAL_ANSWER = "I don't know based on the provided documents."
+
 rag_prompt = PromptTemplate.from_template(
     "You are SamsuBot. Answer concisely using only the context below.\n\n"
     "Context: {context}\n\n"
@@ -10,6 +13,29 @@ rag_prompt = PromptTemplate.from_template(
     "Guidelines:\n"
     "- Answer concisely and in a human-friendly manner.\n"
     "- If the context does not contain the answer, reply exactly:\n"
-    "'I don't know based on the provided documents.'\n\n"
+    "'" + REFUSAL_ANSWER + "'\n\n"
     "Answer:"
 )
+
+# Follow-up questions in a conversation session (apps/rag/conversation.py)
+conversation_prompt = PromptTemplate.from_template(
+    "You are SamsuBot. Answer concisely using only the context below.\n"
+    "Use the conversation only to understand what the question refers to.\n\n"
+    "Conversation so far:\n{history}\n\n"
+    "Context: {context}\n\n"
+    "Question: {question}\n\n"
+    "Guidelines:\n"
+    "- Answer concisely and in a human-friendly manner.\n"
+    "- If the context does not contain the answer, reply exactly:\n"
+    "'" + REFUSAL_ANSWER + "'\n\n"
+    "Answer:"
+)
+
+# Offline FAQ generation (apps/rag/faq.py)
+faq_question_prompt = PromptTemplate.from_template(
+    "You write FAQ entries for SamsuBot's documentation.\n\n"
+    "Text: {chunk}\n\n"
+    "Write {n} short questions a user might ask that this text answers.\n"
+    "One question per line, no numbering, no answers.\n\n"
+    "Questions:"
+)
@@ -0,0 +1,49 @@
+# apps/rag/qdrant.py
+# One Qdrant client per process, built from QDRANT_MODE: the server over the
+# network, or qdrant-client's embedded engine (on disk at QDRANT_PATH, or in
+# memory). The embedded store is locked by the process that opens it, so
+# everything in the process (retriever, ingest, FAQ, watch, admin jobs) must
+# share this client instead of constructing its own.
+
+import logging
+import threading
+from typing import Optional
+
+from qdrant_client import QdrantClient
+
+from apps.rag.config import QDRANT_MODE, QDRANT_PATH, QDRANT_TIMEOUT, VECTOR_DB_URL
+
+log = logging.getLogger(__name__)
+
+MODES = ("server", "local", "memory")
+
+_client: Optional[QdrantClient] = None
+_lock = threading.Lock()
+
+
+def make_client(mode: str = QDRANT_MODE, url: str = VECTOR_DB_URL, path: str = QDRANT_PATH) -> QdrantClient:
+    """A new client for `mode` (the migration uses one per side)."""
+    if mode == "server":
+        return QdrantClient(url=url, timeout=QDRANT_TIMEOUT, prefer_grpc=True)
+    if mode == "local":
+        return QdrantClient(path=path)
+    if mode == "memory":
+        return QdrantClient(location=":memory:")
+    raise ValueError(f"Unknown QDRANT_MODE {mode!r} (expected one of {', '.join(MODES)})")
+
+
+def get_qdrant_client() -> QdrantClient:
+    """The process-wide client for the configured mode."""
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                where = VECTOR_DB_URL if QDRANT_MODE == "server" else (QDRANT_PATH if QDRANT_MODE == "local" else "in memory")
+                log.info(f"🧠 Qdrant ({QDRANT_MODE}): {where}")
+                _client = make_client()
+    return _client
+
+
+def is_embedded(mode: str = QDRANT_MODE) -> bool:
+    """True when Qdrant runs inside this process (no server, no other process may share it)."""
+    return mode != "server"
@@ -4,33 +4,57 @@ import time
 import asyncio
 import functools
 from concurrent.futures import ThreadPoolExecutor
-from typing import List
+from typing import AsyncIterator, Callable, List, Optional, Tuple
+import httpx
 from langchain.schema import Document
-from qdrant_client import QdrantClient
 
-from apps.rag.cache import cache_response, get_cached_response, clear_cache, get_cache_stats
-from apps.rag.llm import llm
-from apps.rag.prompt import rag_prompt
-from apps.rag.retriever import retriever
-from apps.rag.config import VECTOR_DB_URL, QDRANT_COLLECTION
+from apps.rag.cascade import generate_cascaded
+from apps.rag.cache import cache_response, get_cached_response, get_cache_key, clear_cache, get_cache_stats
+from apps.rag.llm import generate, llm_breaker, llm_queue
+from apps.rag.prompt import rag_prompt, conversation_prompt
+from apps.rag.resilience import Deadline, DeadlineExceeded
+from apps.rag.faq import lookup_faq, lookup_faq_batch
+from apps.rag.jobs import note_retrieval_latency
+from apps.rag.qdrant import get_qdrant_client
+from apps.core.profiler import register_queue_probe
+from apps.core.tracing import span, traced
+from apps.rag.retriever import (
+    embed_query, embed_questions, search_by_vector, search_batch_by_vectors, fetch_scored_chunks,
+)
+from apps.rag.warmup import warm_generation
+from apps.rag.routing import classify_intent, small_talk_reply, extractive_answer, record_route
+from apps.rag.config import (
+    QDRANT_COLLECTION, DEFAULT_TENANT, REQUEST_TIMEOUT, LLM_MIN_BUDGET,
+    DEGRADED_CHUNKS, EXTRACTIVE_ENABLED, EXTRACTIVE_MIN_SCORE, EXTRACTIVE_MIN_OVERLAP,
+    LLM_CASCADE_ENABLED, BATCH_CONCURRENCY, FAQ_ENABLED, MAX_CONTEXT,
+)
 
 # ---------------------------
 # Performance optimizations
 # ---------------------------
-executor = ThreadPoolExecutor(max_workers=4)
+executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="rag")
+# Work waiting for a free executor thread shows up in request profiles
+register_queue_probe("rag_executor", executor._work_queue.qsize)
+
+NO_INFO_MESSAGE = "I don't have relevant information to answer this question."
+
+# Progress hook for streaming callers (WebSocket): receives
+# {"type": "queued", "position": n}, {"type": "sources", "sources": [...]}
+# and {"type": "token", "text": "..."} while the answer is being produced
+EventHook = Optional[Callable[[dict], None]]
+
+# Follow-up in a conversation session (apps/rag/conversation.py):
+# {"question": as asked, "history": prompt block, "chunks": [[id, score]] to reuse or None}
+FollowUp = Optional[dict]
 
 # ---------------------------
 # Document processing
 # ---------------------------
-def process_documents_sync(docs: List[Document], question: str) -> str:
-    """Synchronously process documents with LLM."""
-    if not docs:
-        return "I don't have relevant information to answer this question."
-    
+def build_context(docs: List[Document], max_context: int = MAX_CONTEXT) -> str:
+    """Pack retrieved chunks into a context string of at most max_context chars."""
     # Truncate context if too long
     context_parts = []
     total_length = 0
-    max_context = 1500
     
     for doc in docs:
         content = doc.page_content
@@ -44,114 +68,429 @@ def process_documents_sync(docs: List[Document], question: str) -> str:
                 context_parts.append(content[:remaining] + "...")
             break
     
-    context = "\n\n".join(context_parts)
+    return "\n\n".join(context_parts)
+
+def generation_metrics(generation: dict | None) -> dict:
+    """Per-call Ollama timings (load / prompt eval / eval) for the response metrics."""
+    if not generation:
+        return {}
+    cascade = {}
+    if "tier" in generation:
+        cascade = {
+            "llm_tier": generation["tier"],
+            "llm_escalation_reason": generation["escalation_reason"],
+            "llm_fast_time": round(generation["fast_time"], 3),
+        }
+    return {
+        **cascade,
+        "llm_model": generation["model"],
+        "llm_replica": generation.get("replica"),
+        "llm_load_time": round(generation["load_time"], 3),
+        "llm_prompt_eval_time": round(generation["prompt_eval_time"], 3),
+        "llm_eval_time": round(generation["eval_time"], 3),
+        "llm_prompt_tokens": generation["prompt_tokens"],
+        "llm_eval_tokens": generation["eval_tokens"],
+    }
+
+# ---------------------------
+# Degraded (retrieval-only) answers
+# ---------------------------
+def degraded_answer(docs: List[Document]) -> str:
+    """Quote the top retrieved chunks when the LLM is unavailable."""
+    lines = ["The assistant is busy right now. Here is what I found in the documents:"]
+    for doc in docs[:DEGRADED_CHUNKS]:
+        snippet = " ".join(doc.page_content.split())
+        if len(snippet) > 300:
+            snippet = snippet[:300].rsplit(" ", 1)[0] + "..."
+        lines.append(f"- [{doc.metadata.get('source', 'Unknown')}] {snippet}")
+    return "\n".join(lines)
+
+async def generate_answer(
+    prompt: str, context: str, deadline: Deadline, on_event: EventHook = None
+) -> tuple[dict | None, str | None]:
+    """Call the LLM behind the admission queue and circuit breaker; returns (generation, degraded_reason)."""
+    if deadline.remaining() < LLM_MIN_BUDGET:
+        return None, "deadline"
+    on_position = on_token = None
+    if on_event:
+        on_position = lambda n: on_event({"type": "queued", "position": n})
+        on_token = lambda text: on_event({"type": "token", "text": text})
+    try:
+        await deadline.run(llm_queue.acquire(on_position))
+    except DeadlineExceeded:
+        return None, "queue_timeout"
+    try:
+        return await _call_llm(prompt, context, deadline, on_token)
+    finally:
+        llm_queue.release()
+
+async def _call_llm(prompt: str, context: str, deadline: Deadline, on_token) -> tuple[dict | None, str | None]:
+    # Waiting for a slot may have used up the budget
+    if deadline.remaining() < LLM_MIN_BUDGET:
+        return None, "deadline"
+    if not llm_breaker.allow():
+        return None, "circuit_open"
+    try:
+        if LLM_CASCADE_ENABLED:
+            call = generate_cascaded(prompt, context, deadline, on_token=on_token)
+        else:
+            call = generate(prompt, timeout=deadline.remaining(), on_token=on_token)
+        with warm_generation():
+            generation = await deadline.run(call)
+    except (DeadlineExceeded, httpx.TimeoutException) as e:
+        if deadline.timeout < REQUEST_TIMEOUT:
+            # The caller asked for less time than the server allows (X-Request-Timeout):
+            # running out of it says nothing about the LLM's health
+            llm_breaker.release()
+            return None, "deadline"
+        llm_breaker.record_failure(timeout=True)
+        print(f"⚠️ LLM timed out, answering degraded: {e}")
+        return None, "timeout"
+    except asyncio.CancelledError:
+        llm_breaker.release()
+        raise
+    except Exception as e:
+        llm_breaker.record_failure()
+        print(f"⚠️ LLM failed, answering degraded: {e}")
+        return None, "llm_error"
+    llm_breaker.record_success()
+    return generation, None
+
+# ---------------------------
+# Pipeline stages
+# ---------------------------
+def answer_without_retrieval(question: str, tenant_id: str, start_time: float, use_cache: bool = True) -> dict | None:
+    """Small-talk reply or cached answer, if the question needs neither retrieval nor LLM."""
+    # Small talk never needs retrieval or the LLM
+    intent = classify_intent(question)
+    if intent != "question":
+        record_route("smalltalk")
+        return {
+            "message": small_talk_reply(intent),
+            "sources": [],
+            "response_time": round(time.time() - start_time, 3),
+            "cached": False,
+            "metrics": {"route": "smalltalk", "intent": intent}
+        }
+    
+    # Check cache first
+    if not use_cache:
+        return None
+    with span("cache.lookup") as s:
+        cached_response = get_cached_response(question, tenant_id)
+        s.set(hit=cached_response is not None)
+    if cached_response:
+        record_route("cache")
+        cached_response['response_time'] = round(time.time() - start_time, 3)
+        cached_response['cached'] = True
+        cached_response['metrics'] = {**cached_response.get('metrics', {}), "route": "cache"}
+        return cached_response
+    return None
+
+async def answer_from_documents(
+    question: str,
+    tenant_id: str,
+    scored_docs: List[Tuple[Document, float]],
+    deadline: Deadline,
+    start_time: float,
+    retrieval_time: float,
+    on_event: EventHook = None,
+    follow_up: FollowUp = None
+) -> dict:
+    """Route on retrieval results (extractive answer or LLM) and build the response."""
+    docs = [doc for doc, _ in scored_docs]
     
-    # Generate response using the imported prompt template
-    prompt = rag_prompt.format(context=context, question=question)
-    return llm.invoke(prompt)
+    # Route: extractive answer from the top chunk, or LLM generation
+    llm_start = time.time()
+    generation, degraded_reason = None, None
+    answer = NO_INFO_MESSAGE
+    extractive = None
+    # Not for follow-ups: the standalone text is for retrieval, the answer needs the conversation
+    if EXTRACTIVE_ENABLED and not follow_up:
+        extractive = extractive_answer(
+            question, scored_docs, EXTRACTIVE_MIN_SCORE, EXTRACTIVE_MIN_OVERLAP
+        )
+    if extractive:
+        route = "extractive"
+        answer, top_doc = extractive
+        docs = [top_doc]
+    elif docs:
+        if on_event:
+            # Sources are known before generation starts
+            on_event({"type": "sources", "sources": source_list(docs)})
+        # Async HTTP, no executor thread held
+        with span("prompt.build", chunks=len(docs)) as s:
+            context = build_context(docs)
+            if follow_up:
+                prompt = conversation_prompt.format(
+                    history=follow_up["history"], context=context, question=follow_up["question"]
+                )
+            else:
+                prompt = rag_prompt.format(context=context, question=question)
+            s.set(context_chars=len(context))
+        with span("generation") as s:
+            generation, degraded_reason = await generate_answer(prompt, context, deadline, on_event)
+            s.set(degraded_reason=degraded_reason, **{
+                k: v for k, v in generation_metrics(generation).items()
+                if k in ("llm_model", "llm_replica", "llm_tier", "llm_prompt_tokens", "llm_eval_tokens")
+            })
+        answer = generation["text"] if generation else degraded_answer(docs)
+        route = "degraded" if degraded_reason else "llm"
+    else:
+        route = "no_docs"
+    llm_time = time.time() - llm_start
+    record_route(route)
+    
+    # Process response
+    if degraded_reason:
+        clean_answer = answer  # keep the bullet layout
+    else:
+        clean_answer = " ".join(answer.split()).strip()
+    if not clean_answer:
+        clean_answer = NO_INFO_MESSAGE
+    
+    sources = source_list(docs)
+    
+    response_time = round(time.time() - start_time, 3)
+    
+    response = {
+        "message": clean_answer,
+        "sources": sources,
+        "alt_sources": alt_source_list(docs),
+        "response_time": response_time,
+        "cached": False,
+        "degraded": degraded_reason is not None,
+        # Point ids + scores, so a follow-up on the same topic can skip the search
+        "chunks": [[doc.id, round(score, 4)] for doc, score in scored_docs if doc.id],
+        "metrics": {
+            "route": route,
+            "retrieval_time": round(retrieval_time, 3),
+            "llm_time": round(llm_time, 3),
+            "docs_retrieved": len(scored_docs),
+            "top_score": round(scored_docs[0][1], 3) if scored_docs else None,
+            "follow_up": follow_up is not None,
+            "reused_retrieval": bool(follow_up and follow_up.get("chunks")),
+            **generation_metrics(generation)
+        }
+    }
+    
+    if degraded_reason:
+        response["metrics"]["degraded_reason"] = degraded_reason
+    elif not follow_up:
+        # Cache successful responses (never a degraded one, nor a follow-up:
+        # its answer depends on this conversation's history)
+        with span("cache.store"):
+            cache_response(question, response, tenant_id)
+    
+    return response
+
+def source_list(docs: List[Document]) -> List[str]:
+    """Distinct sources of the top 3 chunks."""
+    return sorted({doc.metadata.get("source", "Unknown") for doc in docs[:3]})
+
+def alt_source_list(docs: List[Document]) -> List[str]:
+    """Files whose duplicate chunks the top 3 chunks stand in for (cache/FAQ invalidation)."""
+    return sorted({alt for doc in docs[:3] for alt in doc.metadata.get("alt_sources", [])} - set(source_list(docs)))
+
+def faq_response(question: str, tenant_id: str, hit: dict, start_time: float) -> dict:
+    """Serve a precomputed answer (and cache it like any other answer)."""
+    record_route("faq")
+    response = {**hit, "response_time": round(time.time() - start_time, 3)}
+    cache_response(question, response, tenant_id)
+    return response
+
+def timeout_response(e: Exception, start_time: float) -> dict:
+    print(f"⏱ RAG query deadline exceeded: {e}")
+    return {
+        "message": "I'm sorry, that took too long. Please try again.",
+        "sources": [],
+        "response_time": round(time.time() - start_time, 3),
+        "cached": False,
+        "degraded": True,
+        "error": str(e)
+    }
+
+def error_response(e: Exception, start_time: float) -> dict:
+    print(f"❌ RAG query error: {e}")
+    return {
+        "message": "I'm sorry, I encountered an error processing your query.",
+        "sources": [],
+        "response_time": round(time.time() - start_time, 3),
+        "cached": False,
+        "error": str(e)
+    }
 
 # ---------------------------
 # Main query function
 # ---------------------------
-async def run_rag_query(question: str) -> dict:
-    """Execute RAG query with performance optimizations."""
+async def run_rag_query(
+    question: str,
+    tenant_id: str = DEFAULT_TENANT,
+    deadline: Deadline | None = None,
+    use_faq: bool = True,
+    on_event: EventHook = None,
+    follow_up: FollowUp = None
+) -> dict:
+    """Execute RAG query with performance optimizations, scoped to one tenant."""
+    with span("rag.query", tenant_id=tenant_id) as s:
+        response = await _run_rag_query(question, tenant_id, deadline, use_faq, on_event, follow_up)
+        s.set(route=response.get("metrics", {}).get("route"), cached=response.get("cached"),
+              degraded=response.get("degraded", False), error=response.get("error"))
+        return response
+
+async def _run_rag_query(
+    question: str, tenant_id: str, deadline: Deadline | None, use_faq: bool, on_event: EventHook, follow_up: FollowUp
+) -> dict:
     start_time = time.time()
+    deadline = deadline or Deadline(REQUEST_TIMEOUT)
     
     try:
-        # Handle greetings immediately
-        greetings = {"hello", "hi", "hey", "good morning", "good afternoon", "good evening"}
-        if question.lower().strip() in greetings:
-            return {
-                "message": "Hello! I'm SamsuBot, your assistant.",
-                "sources": [],
-                "response_time": round(time.time() - start_time, 3),
-                "cached": False
-            }
-        
-        # Check cache first
-        cached_response = get_cached_response(question)
-        if cached_response:
-            cached_response['response_time'] = round(time.time() - start_time, 3)
-            cached_response['cached'] = True
-            return cached_response
+        early = answer_without_retrieval(question, tenant_id, start_time, use_cache=not follow_up)
+        if early:
+            return early
         
         # Parallel execution
         loop = asyncio.get_running_loop()
         
-        # 1. Document retrieval
         retrieval_start = time.time()
-        docs = await loop.run_in_executor(
-            executor, 
-            functools.partial(retriever.get_relevant_documents, question)
-        )
+        scored_docs = None
+        if follow_up and follow_up.get("chunks"):
+            # Same topic as the previous turn: read its chunks back, no embedding or search
+            scored_docs = await deadline.run(loop.run_in_executor(
+                executor, traced("reuse", fetch_scored_chunks), [tuple(c) for c in follow_up["chunks"]], tenant_id
+            ))
+            if not scored_docs:
+                follow_up = {**follow_up, "chunks": None}  # re-indexed since: search again
+        
+        if not scored_docs:
+            # Embed once: the vector serves the FAQ lookup and the document search
+            vector = await deadline.run(loop.run_in_executor(executor, traced("embedding", embed_query), question))
+            
+            # Precomputed answers for popular questions (not for follow-ups: they depend on the conversation)
+            if use_faq and FAQ_ENABLED and not follow_up:
+                hit = await deadline.run(loop.run_in_executor(executor, traced("faq.lookup", lookup_faq), vector, tenant_id))
+                if hit:
+                    return faq_response(question, tenant_id, hit, start_time)
+            
+            # Document retrieval (with similarity scores for routing)
+            scored_docs = await deadline.run(loop.run_in_executor(
+                executor, 
+                traced("search", functools.partial(search_by_vector, vector, tenant_id))
+            ))
+            note_retrieval_latency(time.time() - retrieval_start)
         retrieval_time = time.time() - retrieval_start
         
-        # 2. LLM processing
-        llm_start = time.time()
-        answer = await loop.run_in_executor(
-            executor,
-            process_documents_sync,
-            docs,
-            question
+        return await answer_from_documents(
+            question, tenant_id, scored_docs, deadline, start_time, retrieval_time, on_event, follow_up
         )
-        llm_time = time.time() - llm_start
-        
-        # Process response
-        clean_answer = " ".join(answer.split()).strip()
-        if not clean_answer:
-            clean_answer = "I don't have relevant information to answer this question."
-        
-        # Extract sources efficiently
-        sources = list({
-            doc.metadata.get("source", "Unknown") 
-            for doc in docs[:3]
-        })
-        
-        response_time = round(time.time() - start_time, 3)
-        
-        response = {
-            "message": clean_answer,
-            "sources": sorted(sources),
-            "response_time": response_time,
-            "cached": False,
-            "metrics": {
-                "retrieval_time": round(retrieval_time, 3),
-                "llm_time": round(llm_time, 3),
-                "docs_retrieved": len(docs)
-            }
-        }
-        
-        # Cache successful responses
-        cache_response(question, response)
-        
-        return response
         
+    except DeadlineExceeded as e:
+        return timeout_response(e, start_time)
     except Exception as e:
-        error_time = round(time.time() - start_time, 3)
-        print(f"❌ RAG query error: {e}")
-        return {
-            "message": "I'm sorry, I encountered an error processing your query.",
-            "sources": [],
-            "response_time": error_time,
-            "cached": False,
-            "error": str(e)
-        }
+        return error_response(e, start_time)
 
 # ---------------------------
 # Batch processing for multiple queries
 # ---------------------------
-async def run_batch_queries(questions: List[str]) -> List[dict]:
-    """Process multiple queries efficiently."""
-    tasks = [run_rag_query(q) for q in questions]
-    return await asyncio.gather(*tasks, return_exceptions=True)
+async def iter_batch_queries(
+    questions: List[str],
+    tenant_id: str = DEFAULT_TENANT,
+    concurrency: int = BATCH_CONCURRENCY
+) -> AsyncIterator[dict]:
+    """
+    Answer many questions at once, yielding each result as soon as it is ready.
+    Duplicates are answered once; all remaining questions are embedded in one
+    forward pass and searched with one batched Qdrant request; generation runs
+    with bounded concurrency. Each result carries the input `indices` it answers.
+    """
+    batch_start = time.time()
+    unique: dict = {}
+    for i, q in enumerate(questions):
+        unique.setdefault(get_cache_key(q, tenant_id), {"question": q, "indices": []})["indices"].append(i)
+    
+    def tagged(item: dict, response: dict) -> dict:
+        return {"indices": item["indices"], "question": item["question"], **response}
+    
+    # Small talk and cache hits are answered before any retrieval
+    pending = []
+    for item in unique.values():
+        early = answer_without_retrieval(item["question"], tenant_id, batch_start)
+        if early:
+            yield tagged(item, early)
+        else:
+            pending.append(item)
+    if not pending:
+        return
+    
+    # One embedding pass + one batched search for everything left
+    loop = asyncio.get_running_loop()
+    retrieval_start = time.time()
+    try:
+        vectors = await loop.run_in_executor(
+            executor, traced("embedding", embed_questions, batch=len(pending)), [item["question"] for item in pending]
+        )
+        if FAQ_ENABLED:
+            hits = await loop.run_in_executor(executor, traced("faq.lookup", lookup_faq_batch, batch=len(vectors)), vectors, tenant_id)
+            remaining = []
+            for item, vector, hit in zip(pending, vectors, hits):
+                if hit:
+                    yield tagged(item, faq_response(item["question"], tenant_id, hit, batch_start))
+                else:
+                    remaining.append((item, vector))
+            pending = [item for item, _ in remaining]
+            vectors = [vector for _, vector in remaining]
+        scored_lists = await loop.run_in_executor(
+            executor,
+            traced("search", functools.partial(search_batch_by_vectors, vectors, tenant_id), batch=len(vectors))
+        )
+    except Exception as e:
+        for item in pending:
+            yield tagged(item, error_response(e, batch_start))
+        return
+    retrieval_time = time.time() - retrieval_start
+    
+    semaphore = asyncio.Semaphore(concurrency)
+    
+    async def answer(item: dict, scored_docs) -> dict:
+        async with semaphore:
+            # The deadline starts when the question gets a generation slot
+            start_time = time.time()
+            try:
+                response = await answer_from_documents(
+                    item["question"], tenant_id, scored_docs, Deadline(REQUEST_TIMEOUT),
+                    start_time, retrieval_time
+                )
+            except DeadlineExceeded as e:
+                response = timeout_response(e, start_time)
+            except Exception as e:
+                response = error_response(e, start_time)
+            return tagged(item, response)
+    
+    tasks = [asyncio.ensure_future(answer(item, scored)) for item, scored in zip(pending, scored_lists)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        # Consumer went away (e.g. client disconnected): stop remaining generations
+        for task in tasks:
+            task.cancel()
+
+async def run_batch_queries(questions: List[str], tenant_id: str = DEFAULT_TENANT) -> List[dict]:
+    """Process multiple queries efficiently; results are returned in input order."""
+    results: List[dict | None] = [None] * len(questions)
+    async for result in iter_batch_queries(questions, tenant_id):
+        for i in result["indices"]:
+            results[i] = result
+    return results
 
 # ---------------------------
-# Synchronous wrapper //this can be moved to rag_service.py in the future
+# Synchronous wrapper
 # ---------------------------
-def ask_question(query: str) -> dict:
-    """Synchronous wrapper with performance monitoring."""
+def ask_question(query: str, tenant_id: str = DEFAULT_TENANT) -> dict:
+    """Synchronous wrapper; runs on the shared in-process client's loop (see apps/rag/client.py)."""
+    from apps.rag.client import rag_client
     try:
-        return asyncio.run(run_rag_query(query))
+        return rag_client.ask(query, tenant_id)
     except Exception as e:
         return {
             "message": "System error occurred.",
@@ -167,7 +506,7 @@ def ask_question(query: str) -> dict:
 def optimize_collection():
     """Optimize the Qdrant collection for better performance."""
     try:
-        client = QdrantClient(url=VECTOR_DB_URL)
+        client = get_qdrant_client()
         client.optimize_vectors(collection_name=QDRANT_COLLECTION)
         print("✅ Collection optimized")
     except Exception as e:
@@ -1,9 +1,8 @@
 # apps/rag/rag_service.py
 # High-level RAG service interface
-from apps.rag.query import run_rag_query
+from apps.rag.client import rag_client
 
 # thin wrapper (if you want sync call)
 def ask_question(query: str):
-    """Wrapper around async RAG query"""
-    import asyncio
-    return asyncio.run(run_rag_query(query))
+    """Sync RAG query on the shared client's event loop (connections are reused between calls)"""
+    return rag_client.ask(query)
@@ -0,0 +1,203 @@
+# apps/rag/resilience.py
+# Per-request deadlines, a circuit breaker and a FIFO admission queue for the LLM call
+
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Optional
+
+
+class DeadlineExceeded(Exception):
+    """The request ran out of its time budget."""
+
+
+class Deadline:
+    """Absolute time budget carried from the route through retrieval and generation."""
+
+    def __init__(self, timeout: float):
+        self.timeout = timeout
+        self.expires_at = time.monotonic() + timeout
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    async def run(self, aw: Awaitable):
+        """Await `aw`, cancelling it if the deadline passes first."""
+        if self.expired:
+            if asyncio.iscoroutine(aw):
+                aw.close()
+            elif isinstance(aw, asyncio.Future):
+                aw.cancel()
+            raise DeadlineExceeded("deadline exceeded")
+        try:
+            return await asyncio.wait_for(aw, self.remaining())
+        except asyncio.TimeoutError:
+            raise DeadlineExceeded(f"deadline of {self.timeout:.1f}s exceeded")
+
+
+class CircuitBreaker:
+    """
+    Closed -> open after `failure_threshold` consecutive failures, or when the
+    error rate over the last `window` calls reaches `error_rate`.
+    Open -> half-open after `reset_timeout`; one probe call decides whether to
+    close again or re-open.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = 3,
+        error_rate: float = 0.5,
+        window: int = 20,
+        min_calls: int = 6,
+        reset_timeout: float = 30.0,
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.error_rate = error_rate
+        self.min_calls = min_calls
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self._outcomes = deque(maxlen=window)
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self.stats = {"successes": 0, "failures": 0, "timeouts": 0, "rejected": 0, "opened": 0}
+
+    def allow(self) -> bool:
+        """Whether the protected call may be attempted now."""
+        if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self.state = self.HALF_OPEN
+            self._probe_in_flight = False
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.HALF_OPEN and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return True
+        self.stats["rejected"] += 1
+        return False
+
+    def record_success(self):
+        self.stats["successes"] += 1
+        self._consecutive_failures = 0
+        self._outcomes.append(True)
+        if self.state == self.HALF_OPEN:
+            self.state = self.CLOSED
+            self._outcomes.clear()
+        self._probe_in_flight = False
+
+    def record_failure(self, timeout: bool = False):
+        self.stats["failures"] += 1
+        if timeout:
+            self.stats["timeouts"] += 1
+        self._consecutive_failures += 1
+        self._outcomes.append(False)
+        self._probe_in_flight = False
+
+        if self.state == self.HALF_OPEN or self._consecutive_failures >= self.failure_threshold:
+            self._open()
+            return
+        if len(self._outcomes) >= self.min_calls:
+            failures = self._outcomes.count(False)
+            if failures / len(self._outcomes) >= self.error_rate:
+                self._open()
+
+    def release(self):
+        """The call was abandoned without an outcome (e.g. cancelled)."""
+        self._probe_in_flight = False
+
+    def _open(self):
+        if self.state != self.OPEN:
+            self.stats["opened"] += 1
+        self.state = self.OPEN
+        self._opened_at = time.monotonic()
+
+    def get_stats(self) -> dict:
+        return {"name": self.name, "state": self.state, **self.stats}
+
+
+class AdmissionQueue:
+    """
+    At most `capacity` callers inside at once (0 = unlimited); the rest wait in
+    arrival order. A waiter may pass `on_position` to hear its place in line
+    (1 = next) whenever the line moves, e.g. to push it to a WebSocket client.
+    A freed slot is handed straight to the next waiter, so late arrivals can't
+    overtake the line.
+    """
+
+    def __init__(self, name: str, capacity: int):
+        self.name = name
+        self.capacity = capacity
+        self.active = 0
+        self._waiters: deque = deque()
+        self.stats = {"admitted": 0, "queued": 0, "abandoned": 0, "max_depth": 0, "wait_time": 0.0}
+
+    @asynccontextmanager
+    async def slot(self, on_position: Optional[Callable[[int], None]] = None):
+        await self.acquire(on_position)
+        try:
+            yield
+        finally:
+            self.release()
+
+    async def acquire(self, on_position: Optional[Callable[[int], None]] = None):
+        self.stats["admitted"] += 1
+        if self.capacity <= 0 or (self.active < self.capacity and not self._waiters):
+            self.active += 1
+            return
+        entry = (asyncio.get_running_loop().create_future(), on_position)
+        self._waiters.append(entry)
+        self.stats["queued"] += 1
+        self.stats["max_depth"] = max(self.stats["max_depth"], len(self._waiters))
+        self._notify(entry)
+        start = time.monotonic()
+        try:
+            await entry[0]
+        except asyncio.CancelledError:
+            self.stats["abandoned"] += 1
+            if entry[0].done() and not entry[0].cancelled():
+                # The slot was already handed over: pass it on
+                self.release()
+            else:
+                self._waiters.remove(entry)
+                self._notify()
+            raise
+        finally:
+            self.stats["wait_time"] += time.monotonic() - start
+
+    def release(self):
+        while self._waiters:
+            future, _ = self._waiters.popleft()
+            if not future.done():
+                future.set_result(None)
+                self._notify()
+                return
+        self.active -= 1
+
+    def _notify(self, only=None):
+        for position, entry in enumerate(self._waiters, 1):
+            if entry[1] is not None and (only is None or entry is only):
+                try:
+                    entry[1](position)
+                except Exception:
+                    pass
+
+    def get_stats(self) -> dict:
+        queued = self.stats["queued"]
+        return {
+            "name": self.name,
+            "capacity": self.capacity,
+            "active": self.active,
+            "waiting": len(self._waiters),
+            **{k: v for k, v in self.stats.items() if k != "wait_time"},
+            "avg_wait": round(self.stats["wait_time"] / queued, 3) if queued else 0.0,
+        }
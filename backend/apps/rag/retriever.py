@@ -1,11 +1,21 @@
 # apps/rag/retriever.py
  # Vector store + retriever setup
 
-from qdrant_client import QdrantClient
+from typing import List, Optional, Tuple
+import numpy as np
 from qdrant_client.http import models as rest
+from langchain.schema import Document
+from langchain_community.vectorstores.utils import maximal_marginal_relevance
 from langchain_qdrant import QdrantVectorStore
 from langchain_huggingface import HuggingFaceEmbeddings
-from apps.rag.config import VECTOR_DB_URL, EMBEDDING_MODEL, QDRANT_COLLECTION
+from apps.rag.config import (
+    EMBEDDING_MODEL, QDRANT_COLLECTION, DEFAULT_TENANT, TENANT_FIELD,
+    RETRIEVAL_K, RETRIEVAL_FETCH_K, RETRIEVAL_MMR, HNSW_EF, EXACT_SEARCH, CHUNK_STORE_ENABLED,
+)
+from apps.core.tracing import span
+from apps.rag.chunk_store import get_chunk_store
+from apps.rag.qdrant import get_qdrant_client
+from apps.rag.tenancy import collection_for_tenant, tenant_filter, ensure_collection, is_known_tenant
 
 embedding = HuggingFaceEmbeddings(
     model_name=EMBEDDING_MODEL,
@@ -13,24 +23,166 @@ embedding = HuggingFaceEmbeddings(
     encode_kwargs={'normalize_embeddings': True}
 )
 
-def get_vectorstore():
-    client = QdrantClient(url=VECTOR_DB_URL, timeout=10, prefer_grpc=True)
+client = get_qdrant_client()
+
+_vectorstores = {}
+_retrievers = {}
 
-    if not client.collection_exists(QDRANT_COLLECTION):
-        client.create_collection(
-            collection_name=QDRANT_COLLECTION,
-            vectors_config=rest.VectorParams(size=384, distance=rest.Distance.COSINE)
+def get_vectorstore(collection_name: str = QDRANT_COLLECTION):
+    if collection_name not in _vectorstores:
+        ensure_collection(client, collection_name)
+        _vectorstores[collection_name] = QdrantVectorStore(
+            client=client,
+            collection_name=collection_name,
+            embedding=embedding
         )
+    return _vectorstores[collection_name]
+
+def get_retriever(tenant_id: str = DEFAULT_TENANT):
+    """MMR retriever scoped to one tenant's documents (cached for known tenants only)."""
+    if tenant_id in _retrievers:
+        return _retrievers[tenant_id]
+    search_kwargs = {"k": RETRIEVAL_K, "search_params": {"hnsw_ef": HNSW_EF, "exact": EXACT_SEARCH}}
+    flt = tenant_filter(tenant_id)
+    if flt is not None:
+        search_kwargs["filter"] = flt
+    retriever = get_vectorstore(collection_for_tenant(tenant_id)).as_retriever(
+        search_type="mmr" if RETRIEVAL_MMR else "similarity",
+        search_kwargs=search_kwargs
+    )
+    if is_known_tenant(tenant_id):
+        _retrievers[tenant_id] = retriever
+    return retriever
 
-    return QdrantVectorStore(
-        client=client,
-        collection_name=QDRANT_COLLECTION,
-        embedding=embedding
+def embed_query(question: str) -> List[float]:
+    return embedding.embed_query(question)
+
+def search_by_vector(
+    vector: List[float],
+    tenant_id: str = DEFAULT_TENANT,
+    k: int = RETRIEVAL_K,
+    fetch_k: int = RETRIEVAL_FETCH_K,
+) -> List[Tuple[Document, float]]:
+    """MMR search returning (document, similarity) pairs for one tenant."""
+    return search_batch_by_vectors([vector], tenant_id, k=k, fetch_k=fetch_k)[0]
+
+def search_with_scores(question: str, tenant_id: str = DEFAULT_TENANT, k: int = RETRIEVAL_K) -> List[Tuple[Document, float]]:
+    return search_by_vector(embed_query(question), tenant_id, k=k)
+
+def _point_to_document(point) -> Document:
+    payload = point.payload or {}
+    return Document(
+        id=str(point.id),
+        page_content=payload.get("page_content", ""),
+        metadata=payload.get("metadata") or {}
     )
 
+def _point_vector(point):
+    if point.vector is None or isinstance(point.vector, list):
+        return point.vector
+    return point.vector.get("")
+
+def _hydrate(collection: str, ids) -> dict:
+    """
+    point id -> (Document, vector) for every id, from the local chunk store;
+    points it doesn't have yet (ingested before it existed) come from Qdrant.
+    """
+    found = {
+        pid: (Document(id=pid, page_content=text, metadata=meta), vector)
+        for pid, (text, meta, vector) in get_chunk_store(collection).get_many(ids).items()
+    }
+    missing = [pid for pid in ids if pid not in found]
+    if missing:
+        for p in client.retrieve(collection, ids=missing, with_payload=True, with_vectors=True):
+            found[str(p.id)] = (_point_to_document(p), _point_vector(p))
+    return found
+
+def embed_questions(questions: List[str]) -> List[List[float]]:
+    """Embed many questions in one forward pass."""
+    return embedding.embed_documents(questions) if questions else []
+
+def search_batch_by_vectors(
+    vectors: List[List[float]],
+    tenant_id: str = DEFAULT_TENANT,
+    k: int = RETRIEVAL_K,
+    fetch_k: int = RETRIEVAL_FETCH_K,
+    mmr: bool = RETRIEVAL_MMR,
+    hnsw_ef: int = HNSW_EF,
+    exact: bool = EXACT_SEARCH,
+    collection: Optional[str] = None,
+) -> List[List[Tuple[Document, float]]]:
+    """
+    One batched Qdrant query for many vectors; MMR re-ranking is applied
+    locally per question. With the chunk store populated, Qdrant only returns
+    IDs and scores; texts and vectors are read from the local mmap.
+    `collection` overrides the tenant's collection (parameter sweeps).
+    """
+    if not vectors:
+        return []
+    collection = collection or collection_for_tenant(tenant_id)
+    get_vectorstore(collection)  # make sure the collection exists
+    flt = tenant_filter(tenant_id)
+    local = CHUNK_STORE_ENABLED and len(get_chunk_store(collection)) > 0
+    with span("qdrant.query", collection=collection, batch=len(vectors), limit=fetch_k if mmr else k):
+        responses = client.query_batch_points(
+            collection_name=collection,
+            requests=[
+                rest.QueryRequest(
+                    query=vector,
+                    filter=flt,
+                    limit=fetch_k if mmr else k,
+                    with_payload=not local,
+                    with_vector=not local and mmr,
+                    params=rest.SearchParams(hnsw_ef=hnsw_ef, exact=exact),
+                )
+                for vector in vectors
+            ],
+        )
+    with span("hydrate", source="chunk_store" if local else "qdrant"):
+        hits = _hydrate(collection, {str(p.id) for r in responses for p in r.points}) if local else {
+            str(p.id): (_point_to_document(p), _point_vector(p))
+            for r in responses for p in r.points
+        }
+
+    results = []
+    with span("rerank", mmr=mmr):
+        for vector, response in zip(vectors, responses):
+            points = [p for p in response.points if str(p.id) in hits]
+            if not points:
+                results.append([])
+                continue
+            if mmr:
+                candidates = [hits[str(p.id)][1] for p in points]
+                selected = maximal_marginal_relevance(np.array(vector), candidates, k=k)
+            else:
+                selected = range(min(k, len(points)))
+            results.append([(hits[str(points[i].id)][0], points[i].score) for i in selected])
+    return results
+
+def fetch_scored_chunks(chunks: List[Tuple[str, float]], tenant_id: str = DEFAULT_TENANT) -> List[Tuple[Document, float]]:
+    """
+    Re-read earlier hits by point id (a follow-up on the same topic) without
+    searching again; ids that no longer exist or belong to another tenant are dropped.
+    """
+    if not chunks:
+        return []
+    collection = collection_for_tenant(tenant_id)
+    with span("hydrate", source="reuse", chunks=len(chunks)):
+        if CHUNK_STORE_ENABLED:
+            found = _hydrate(collection, {pid for pid, _ in chunks})
+        else:
+            found = {
+                str(p.id): (_point_to_document(p), None)
+                for p in client.retrieve(collection, ids=[pid for pid, _ in chunks], with_payload=True)
+            }
+    return [
+        (found[pid][0], score) for pid, score in chunks
+        if pid in found and found[pid][0].metadata.get(TENANT_FIELD, tenant_id) == tenant_id
+    ]
+
+def search_batch(questions: List[str], tenant_id: str = DEFAULT_TENANT, k: int = RETRIEVAL_K) -> List[List[Tuple[Document, float]]]:
+    return search_batch_by_vectors(embed_questions(questions), tenant_id, k=k)
+
 vectorstore = get_vectorstore()
 
-retriever = vectorstore.as_retriever(
-    search_type="mmr",
-    search_kwargs={"k": 3, "search_params": {"hnsw_ef": 16, "exact": True}}
-)
+retriever = get_retriever(DEFAULT_TENANT)
@@ -0,0 +1,143 @@
+# apps/rag/routing.py
+# Cheap routing that lets a request skip the LLM:
+# small-talk intents before retrieval, extractive answers after it.
+
+import re
+from collections import Counter
+from typing import List, Optional, Tuple
+from langchain.schema import Document
+
+from apps.rag.config import SMALL_TALK_MAX_WORDS
+
+STOPWORDS = {
+    "a", "an", "the", "is", "are", "was", "were", "be", "been", "am", "do", "does", "did",
+    "i", "me", "my", "we", "our", "you", "your", "it", "its", "this", "that", "these", "those",
+    "what", "which", "who", "whom", "how", "why", "when", "where", "can", "could", "should",
+    "would", "will", "shall", "may", "might", "must", "of", "to", "in", "on", "at", "for",
+    "with", "by", "from", "about", "as", "into", "and", "or", "but", "if", "so", "not", "no",
+    "there", "here", "please", "tell", "explain", "any", "some", "all", "use", "using",
+}
+
+# Words that may trail a small-talk phrase without making it a question
+SMALL_TALK_FILLERS = {
+    "lot", "much", "very", "again", "there", "everyone", "guys", "friend", "mate",
+    "today", "bot", "samsubot", "buddy",
+}
+
+# ---------------------------
+# Intent / small-talk classifier
+# ---------------------------
+INTENT_PATTERNS = [
+    ("greeting", re.compile(r"^(hi|hello|hey|hiya|howdy|greetings|good (morning|afternoon|evening))\b")),
+    ("thanks", re.compile(r"^(thanks|thank you|thx|ty|cheers|much appreciated)\b")),
+    ("goodbye", re.compile(r"^(bye|goodbye|see you|see ya|good night|later)\b")),
+    ("identity", re.compile(r"^(who are you|what('s| is) your name|are you a (bot|robot|human))\b")),
+    ("wellbeing", re.compile(r"^(how are you|how's it going|how are things)\b")),
+    ("ack", re.compile(r"^(ok|okay|cool|great|nice|got it|sure|alright)\b")),
+]
+
+SMALL_TALK_REPLIES = {
+    "greeting": "Hello! I'm SamsuBot, your assistant.",
+    "thanks": "You're welcome! Anything else I can help with?",
+    "goodbye": "Goodbye! Come back any time.",
+    "identity": "I'm SamsuBot, an assistant that answers questions from your documents.",
+    "wellbeing": "I'm doing well, thanks! What would you like to know?",
+    "ack": "Great! Let me know if you have another question.",
+}
+
+
+def _stem(token: str) -> str:
+    """Crude suffix stripping so "supports"/"supported" match "support" and "prices"/"pricing" match "price"."""
+    for suffix in ("ing", "ed", "es", "s"):
+        if len(token) > len(suffix) + 3 and token.endswith(suffix):
+            token = token[: -len(suffix)]
+            break
+    # Drop a final "e" as well: "price" -> "pric" meets "prices"/"priced" -> "pric"
+    if len(token) > 3 and token.endswith("e"):
+        token = token[:-1]
+    return token
+
+
+def content_terms(text: str) -> set:
+    return {
+        _stem(t) for t in re.findall(r"[a-z0-9]+", text.lower())
+        if len(t) > 1 and t not in STOPWORDS
+    }
+
+
+def classify_intent(question: str) -> str:
+    """Return a small-talk intent, or "question" when it needs the RAG pipeline."""
+    text = " ".join(re.sub(r"[^\w\s']", " ", question.lower()).split())
+    if not text or len(text.split()) > SMALL_TALK_MAX_WORDS:
+        return "question"
+    for intent, pattern in INTENT_PATTERNS:
+        m = pattern.match(text)
+        if m:
+            # "hi, how do I reset my password" still carries a real question
+            if content_terms(text[m.end():]) - SMALL_TALK_FILLERS:
+                return "question"
+            return intent
+    return "question"
+
+
+def small_talk_reply(intent: str) -> str:
+    return SMALL_TALK_REPLIES.get(intent, SMALL_TALK_REPLIES["greeting"])
+
+
+# ---------------------------
+# Extractive fast path
+# ---------------------------
+def split_sentences(text: str) -> List[str]:
+    parts = re.split(r"(?<=[.!?])\s+|\n+", text)
+    return [" ".join(p.split()) for p in parts if p.strip()]
+
+
+def extractive_answer(
+    question: str,
+    scored_docs: List[Tuple[Document, float]],
+    min_score: float,
+    min_overlap: float,
+) -> Optional[Tuple[str, Document]]:
+    """
+    When the top chunk is a strong match and one of its sentences covers the
+    question's content terms, return that sentence (and its chunk) as the answer.
+    """
+    if not scored_docs:
+        return None
+    top_doc, top_score = scored_docs[0]
+    if top_score < min_score:
+        return None
+    q_terms = content_terms(question)
+    if len(q_terms) < 2:
+        return None  # too vague to trust a term match
+
+    best, best_overlap = None, 0.0
+    for sentence in split_sentences(top_doc.page_content):
+        if not 20 <= len(sentence) <= 400:
+            continue
+        overlap = len(q_terms & content_terms(sentence)) / len(q_terms)
+        if overlap > best_overlap:
+            best, best_overlap = sentence, overlap
+
+    if best is None or best_overlap < min_overlap:
+        return None
+    return best, top_doc
+
+
+# ---------------------------
+# Route accounting
+# ---------------------------
+route_counts = Counter()
+
+
+def record_route(route: str):
+    route_counts[route] += 1
+
+
+def get_route_stats() -> dict:
+    total = sum(route_counts.values())
+    return {
+        "total": total,
+        "routes": dict(route_counts),
+        "llm_skipped_ratio": round(1 - route_counts["llm"] / total, 3) if total else 0.0,
+    }
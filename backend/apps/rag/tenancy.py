@@ -0,0 +1,88 @@
+# apps/rag/tenancy.py
+# Tenant -> collection mapping and tenant payload filters
+
+from typing import List, Optional
+from qdrant_client import QdrantClient
+from qdrant_client.http import models as rest
+
+from apps.rag.config import QDRANT_COLLECTION, TENANT_FIELD, DEFAULT_TENANT, DEDICATED_TENANTS, KNOWN_TENANTS
+from apps.rag.qdrant import is_embedded
+
+# LangChain's QdrantVectorStore nests document metadata under this payload key
+TENANT_PAYLOAD_KEY = f"metadata.{TENANT_FIELD}"
+SOURCE_PAYLOAD_KEY = "metadata.source"
+# Files whose near-duplicate chunks were folded into this one (ingest dedup)
+ALT_SOURCES_PAYLOAD_KEY = "metadata.alt_sources"
+
+
+def is_dedicated(tenant_id: str) -> bool:
+    return tenant_id in DEDICATED_TENANTS
+
+
+def is_known_tenant(tenant_id: str) -> bool:
+    """Configured tenants; anything else came from a header and must not grow per-tenant caches."""
+    return tenant_id == DEFAULT_TENANT or tenant_id in DEDICATED_TENANTS or tenant_id in KNOWN_TENANTS
+
+
+def collection_for_tenant(tenant_id: str) -> str:
+    """Large tenants get their own collection; everyone else shares one."""
+    if is_dedicated(tenant_id):
+        return f"{QDRANT_COLLECTION}__{tenant_id}"
+    return QDRANT_COLLECTION
+
+
+def tenant_filter(tenant_id: str) -> Optional[rest.Filter]:
+    """Payload filter restricting a search in the shared collection to one tenant."""
+    if is_dedicated(tenant_id):
+        return None  # the whole collection belongs to the tenant
+
+    match = rest.FieldCondition(key=TENANT_PAYLOAD_KEY, match=rest.MatchValue(value=tenant_id))
+    if tenant_id != DEFAULT_TENANT:
+        return rest.Filter(must=[match])
+
+    # Points ingested before tenancy existed have no tenant_id: they belong to "default"
+    return rest.Filter(should=[
+        match,
+        rest.IsEmptyCondition(is_empty=rest.PayloadField(key=TENANT_PAYLOAD_KEY)),
+    ])
+
+
+def source_filter(tenant_id: str, sources: List[str]) -> rest.Filter:
+    """The tenant's points that came from any of `sources` (relative file paths)."""
+    must = [rest.FieldCondition(key=SOURCE_PAYLOAD_KEY, match=rest.MatchAny(any=list(sources)))]
+    tf = tenant_filter(tenant_id)
+    if tf is not None:
+        must.append(tf)
+    return rest.Filter(must=must)
+
+
+def linked_source_filter(tenant_id: str, sources: List[str]) -> rest.Filter:
+    """The tenant's points that came from, or stand in for a duplicate in, any of `sources`."""
+    must = [rest.Filter(should=[
+        rest.FieldCondition(key=key, match=rest.MatchAny(any=list(sources)))
+        for key in (SOURCE_PAYLOAD_KEY, ALT_SOURCES_PAYLOAD_KEY)
+    ])]
+    tf = tenant_filter(tenant_id)
+    if tf is not None:
+        must.append(tf)
+    return rest.Filter(must=must)
+
+
+def ensure_collection(client: QdrantClient, collection_name: str, vector_size: int = 384):
+    """Create the collection if needed and make sure the tenant and source fields are indexed."""
+    if not client.collection_exists(collection_name):
+        client.create_collection(
+            collection_name=collection_name,
+            vectors_config=rest.VectorParams(size=vector_size, distance=rest.Distance.COSINE),
+            # Retrieval reads texts from the local chunk store, not the payload
+            on_disk_payload=True,
+        )
+    if is_embedded():
+        return  # the embedded engine has no payload indexes (filters scan)
+    # Idempotent: Qdrant keeps the existing index if it is already there
+    for field in (TENANT_PAYLOAD_KEY, SOURCE_PAYLOAD_KEY, ALT_SOURCES_PAYLOAD_KEY):
+        client.create_payload_index(
+            collection_name=collection_name,
+            field_name=field,
+            field_schema=rest.PayloadSchemaType.KEYWORD,
+        )
@@ -2,12 +2,12 @@
 
 from langchain_community.embeddings import HuggingFaceEmbeddings
 from langchain_qdrant import Qdrant
-from qdrant_client import QdrantClient
 from apps.rag.config import *
+from apps.rag.qdrant import get_qdrant_client
 
 def load_vector_store():
     embeddings = HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL)
-    client = QdrantClient(url=VECTOR_DB_URL)
+    client = get_qdrant_client()
     db = Qdrant(
         client=client,
         collection_name=QDRANT_COLLECTION,
@@ -0,0 +1,181 @@
+# apps/rag/warmup.py
+# Answer-cache warm-up: replay the most frequent recent questions from the
+# chat logs through run_rag_query in the background, at low priority, so the
+# first users after a deploy or re-index hit a warm cache.
+
+import asyncio
+import logging
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+from apps.rag.cache import clear_cache, invalidate_sources, is_cached, mark_warmed, get_cache_stats, warming
+from apps.rag.config import (
+    QDRANT_COLLECTION, DEDICATED_TENANTS, DEFAULT_TENANT, WARMUP_TOP_N, WARMUP_LOG_DAYS, WARMUP_CONCURRENCY,
+    WARMUP_MAX_LIVE_IN_FLIGHT, WARMUP_TIMEOUT, INDEX_VERSION_POLL_INTERVAL, FAQ_ENABLED, FAQ_AUTO_REBUILD,
+)
+from apps.rag.resilience import Deadline
+
+log = logging.getLogger(__name__)
+
+warmup_state = {
+    "status": "idle",       # idle | running | done | failed
+    "trigger": None,
+    "total": 0,
+    "done": 0,
+    "warmed": 0,
+    "already_cached": 0,
+    "failed": 0,
+    "started_at": None,
+    "finished_at": None,
+}
+_warmup_task: Optional[asyncio.Task] = None
+_warm_in_flight = 0
+
+
+def _live_in_flight() -> int:
+    """Generations in flight that belong to real traffic."""
+    from apps.rag.llm import ollama_pool
+    return max(0, sum(r.in_flight for r in ollama_pool.replicas) - _warm_in_flight)
+
+
+@contextmanager
+def warm_generation():
+    """Around an LLM call: counts it as warm-up load when it comes from the warm-up job."""
+    global _warm_in_flight
+    if not warming.get():
+        yield
+        return
+    _warm_in_flight += 1
+    try:
+        yield
+    finally:
+        _warm_in_flight -= 1
+
+
+async def warm_cache(limit: int = WARMUP_TOP_N, concurrency: int = WARMUP_CONCURRENCY, trigger: str = "manual"):
+    """Fill the answer cache with the top-N most frequent recent questions."""
+    from apps.core.mongo import get_top_questions
+    from apps.rag.query import run_rag_query
+
+    warmup_state.update({
+        "status": "running", "trigger": trigger, "total": 0, "done": 0, "warmed": 0,
+        "already_cached": 0, "failed": 0, "started_at": time.time(), "finished_at": None,
+    })
+    try:
+        rows = await get_top_questions(limit, WARMUP_LOG_DAYS)
+    except Exception as e:
+        log.warning(f"⚠️ Cache warm-up could not read chat logs: {e}")
+        warmup_state.update({"status": "failed", "finished_at": time.time()})
+        return
+    warmup_state["total"] = len(rows)
+    log.info(f"🔥 Warming answer cache with {len(rows)} questions ({trigger})")
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def warm(row: dict):
+        warming.set(True)  # this task's context only: cache lookups and LLM calls are ours
+        async with semaphore:
+            question, tenant_id = row["question"], row["tenant_id"]
+            if is_cached(question, tenant_id):
+                warmup_state["already_cached"] += 1
+                warmup_state["done"] += 1
+                return
+            # Low priority: yield to live traffic
+            while _live_in_flight() >= WARMUP_MAX_LIVE_IN_FLIGHT:
+                await asyncio.sleep(0.5)
+            response = await run_rag_query(question, tenant_id, Deadline(WARMUP_TIMEOUT))
+            if response.get("error") or response.get("degraded"):
+                warmup_state["failed"] += 1
+            elif is_cached(question, tenant_id):
+                mark_warmed(question, tenant_id)
+                warmup_state["warmed"] += 1
+            warmup_state["done"] += 1
+
+    await asyncio.gather(*(warm(row) for row in rows))
+    warmup_state.update({"status": "done", "finished_at": time.time()})
+    log.info(
+        f"✅ Cache warm-up done: {warmup_state['warmed']} warmed, "
+        f"{warmup_state['already_cached']} already cached, {warmup_state['failed']} failed "
+        f"in {warmup_state['finished_at'] - warmup_state['started_at']:.1f}s"
+    )
+
+
+def schedule_warmup(trigger: str) -> bool:
+    """Start a background warm-up unless one is already running."""
+    global _warmup_task
+    if _warmup_task is not None and not _warmup_task.done():
+        return False
+    _warmup_task = asyncio.get_running_loop().create_task(warm_cache(trigger=trigger))
+    return True
+
+
+def get_warmup_state() -> dict:
+    cache = get_cache_stats()
+    return {
+        **warmup_state,
+        "progress": round(warmup_state["done"] / warmup_state["total"], 3) if warmup_state["total"] else 0.0,
+        # Hit rate gained: lookups answered by entries the warm-up put there
+        "hits_served": cache["warm_hits"],
+        "warm_hit_rate": cache["warm_hit_rate"],
+    }
+
+
+# ---------------------------
+# Re-index detection
+# ---------------------------
+_known_versions = {}
+
+
+def note_index_version(collection: str, version: Optional[str]):
+    """Record a version this process already reacted to (e.g. its own re-index)."""
+    _known_versions[collection] = version
+
+
+def _refresh_faq(record: Optional[dict]):
+    if FAQ_ENABLED and FAQ_AUTO_REBUILD and record:
+        from apps.rag.faq import schedule_faq_rebuild
+        schedule_faq_rebuild(record.get("tenant_id") or DEFAULT_TENANT)
+
+
+async def watch_index_version(interval: float = INDEX_VERSION_POLL_INTERVAL):
+    """
+    Poll the collection versions written by ingest; when one changes, cached
+    answers are stale: drop them and warm the cache again. An incremental
+    re-index (watch mode) only drops answers built from the changed files.
+    The re-indexed tenant's FAQ index is rebuilt in the background if stale
+    (also checked once at startup, for ingests run while the API was down).
+    """
+    from apps.rag.index_meta import get_version_record
+    from apps.rag.retriever import client
+    from apps.rag.tenancy import collection_for_tenant
+
+    collections = [QDRANT_COLLECTION] + [collection_for_tenant(t) for t in DEDICATED_TENANTS]
+    loop = asyncio.get_running_loop()
+    while True:
+        try:
+            for collection in collections:
+                record = await loop.run_in_executor(None, get_version_record, client, collection)
+                version = record["version"] if record else None
+                if collection not in _known_versions:
+                    _known_versions[collection] = version
+                    if record:
+                        _refresh_faq(record)
+                elif _known_versions[collection] != version:
+                    previous = _known_versions[collection]
+                    _known_versions[collection] = version
+                    sources = record.get("changed_sources") if record else None
+                    if sources is not None and record.get("previous") == previous:
+                        dropped = invalidate_sources(sources, record.get("tenant_id") or DEFAULT_TENANT)
+                        log.info(f"🔄 {collection} updated {len(sources)} file(s): dropped {dropped} cached answers")
+                    else:
+                        # Full re-index, or we missed an intermediate version
+                        log.info(f"🔄 {collection} re-indexed (version {version}): clearing answer cache")
+                        clear_cache()
+                    schedule_warmup("reindex")
+                    _refresh_faq(record)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            log.warning(f"⚠️ Index version check failed: {e}")
+        await asyncio.sleep(interval)
@@ -0,0 +1,104 @@
+# apps/rag/watch.py
+# Watch mode: re-index files under DOCS_DIR as they are added, edited or
+# removed, without a full rebuild.
+#
+# CLI:  python -m apps.rag.ingest --watch [--tenant acme]
+# API:  WATCH_DOCS=1 (runs as a background task next to the cache warm-up)
+
+import asyncio
+import logging
+from pathlib import Path
+from typing import Callable, Optional
+
+
+from apps.rag.config import DOCS_DIR, DEDUP_ENABLED, WATCH_TENANT, WATCH_DEBOUNCE_MS
+
+log = logging.getLogger("ingest")
+
+watch_state = {"running": False, "batches": 0, "files": 0, "errors": 0, "last_version": None, "last_at": None}
+
+
+def _relative_sources(changes, docs_dir: Path) -> set:
+    sources = set()
+    for _, raw in changes:
+        try:
+            sources.add(Path(raw).resolve().relative_to(docs_dir).as_posix())
+        except ValueError:
+            continue  # outside the docs dir (symlink target, etc.)
+    return sources
+
+
+async def watch_docs(
+    tenant_id: str = WATCH_TENANT,
+    docs_dir: Optional[Path] = None,
+    debounce_ms: int = WATCH_DEBOUNCE_MS,
+    embedding=None,
+    dedup: bool = DEDUP_ENABLED,
+    on_reindexed: Optional[Callable[[dict], None]] = None,
+):
+    """Re-index each debounced batch of changed files until cancelled."""
+    from watchfiles import awatch
+    from apps.rag.ingest import reindex_sources, is_supported
+    from apps.rag.qdrant import get_qdrant_client
+
+    docs_dir = Path(docs_dir or DOCS_DIR).resolve()
+    docs_dir.mkdir(parents=True, exist_ok=True)
+    client = get_qdrant_client()
+    loop = asyncio.get_running_loop()
+
+    log.info(f"👀 Watching {docs_dir} for changes (tenant: {tenant_id}, debounce {debounce_ms}ms)")
+    watch_state["running"] = True
+    try:
+        async for changes in awatch(
+            docs_dir,
+            debounce=debounce_ms,
+            watch_filter=lambda change, path: is_supported(Path(path)),
+        ):
+            sources = _relative_sources(changes, docs_dir)
+            if not sources:
+                continue
+            try:
+                # Embedding is CPU-bound: keep it off the event loop
+                result = await loop.run_in_executor(
+                    None, reindex_sources, client, sources, tenant_id, docs_dir, embedding, dedup
+                )
+            except Exception as e:
+                watch_state["errors"] += 1
+                log.error(f"❌ Re-index of {sorted(sources)} failed: {e}")
+                continue
+            if not result:
+                continue
+            watch_state["batches"] += 1
+            watch_state["files"] += len(result["sources"])
+            watch_state["last_version"] = result["version"]
+            watch_state["last_at"] = loop.time()
+            if on_reindexed:
+                on_reindexed(result)
+    finally:
+        watch_state["running"] = False
+        client.close()
+
+
+def _refresh_answers(tenant_id: str) -> Callable[[dict], None]:
+    """Drop this process's cached answers built from the changed files, then re-warm."""
+    from apps.rag.cache import invalidate_sources
+    from apps.rag.warmup import note_index_version, schedule_warmup
+
+    def refresh(result: dict):
+        dropped = invalidate_sources(result["sources"], tenant_id)
+        # Already handled here; keep the version poller from reacting again
+        note_index_version(result["collection"], result["version"])
+        schedule_warmup("reindex")
+        log.info(f"🧽 Dropped {dropped} cached answers for {len(result['sources'])} changed file(s)")
+
+    return refresh
+
+
+async def watch_docs_in_api(tenant_id: str = WATCH_TENANT):
+    """Watch mode inside the API process, sharing its embedding model."""
+    from apps.rag.retriever import embedding
+    await watch_docs(tenant_id, embedding=embedding, on_reindexed=_refresh_answers(tenant_id))
+
+
+def get_watch_state() -> dict:
+    return dict(watch_state)
@@ -1,8 +1,7 @@
 import time
 from apps.core.redis_client import redis_client
 from apps.core.mongo import chat_log_collection
-from apps.models.pg_models import ChatMetric
-from apps.core.postgres import AsyncSessionLocal
+from apps.core.metrics import record_request_metric
 
 async def process_message(session_id: str, message: str):
     start = time.time()
@@ -17,10 +16,8 @@ async def process_message(session_id: str, message: str):
     })
 
     response_time = time.time() - start
-    async with AsyncSessionLocal() as session:
-        metric = ChatMetric(session_id=session_id, intent=intent, response_time=response_time)
-        session.add(metric)
-        await session.commit()
+    # Buffered; the metrics pipeline writes it in bulk
+    record_request_metric("chatbot", "default", elapsed=response_time, session_id=session_id, route=intent)
 
     return {
         "session_id": session_id,
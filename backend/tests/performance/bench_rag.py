@@ -0,0 +1,277 @@
+# tests/performance/bench_rag.py
+# Hermetic RAG pipeline benchmark: in-process Qdrant filled from a synthetic
+# corpus, hashing (or real) embeddings and a fake LLM. No containers needed.
+#
+#   cd backend
+#   python tests/performance/bench_rag.py --out bench.json
+#   python tests/performance/bench_rag.py --out new.json --compare bench.json
+#
+# Stages: ingest throughput, cache lookup, embedding, search, context packing
+# and end-to-end run_rag_query at several concurrency levels. --compare exits
+# with status 1 when a stage regresses by more than --threshold.
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parents[2]
+if str(BACKEND_DIR) not in sys.path:
+    sys.path.insert(0, str(BACKEND_DIR))
+
+
+# ---------------------------
+# Measurement helpers
+# ---------------------------
+def summarize(samples, wall: float = None, ops: int = None) -> dict:
+    """Latency percentiles in ms (+ throughput when a wall time is given)."""
+    ordered = sorted(samples)
+
+    def pct(p):
+        return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))] * 1000
+
+    result = {
+        "n": len(ordered),
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 3),
+        "p50_ms": round(pct(50), 3),
+        "p95_ms": round(pct(95), 3),
+        "p99_ms": round(pct(99), 3),
+    }
+    total = wall if wall is not None else sum(ordered)
+    result["ops_per_s"] = round((ops or len(ordered)) / total, 2) if total else None
+    return result
+
+
+def time_each(fn, items) -> dict:
+    samples = []
+    for item in items:
+        start = time.perf_counter()
+        fn(item)
+        samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+
+# ---------------------------
+# Stages
+# ---------------------------
+def bench_ingest(ingest, retriever, corpus) -> dict:
+    from apps.rag.config import QDRANT_COLLECTION
+
+    start = time.perf_counter()
+    chunks = ingest.split_docs(corpus)
+    split_time = time.perf_counter() - start
+    n_split = len(chunks)
+
+    start = time.perf_counter()
+    chunks = ingest.remove_near_duplicates(chunks)
+    dedup_time = time.perf_counter() - start
+
+    ids = ingest.make_ids(chunks)
+    start = time.perf_counter()
+    ingest.upsert_chunks(retriever.client, QDRANT_COLLECTION, chunks, ids, retriever.embedding)
+    upsert_time = time.perf_counter() - start
+
+    return {
+        "documents": len(corpus),
+        "chunks": len(chunks),
+        "duplicates_removed": n_split - len(chunks),
+        "split_s": round(split_time, 3),
+        "dedup_s": round(dedup_time, 3),
+        "embed_upsert_s": round(upsert_time, 3),
+        "ops_per_s": round(len(chunks) / upsert_time, 2) if upsert_time else None,
+    }
+
+
+def bench_cache(questions) -> dict:
+    from apps.rag import cache
+
+    cache.clear_cache()
+    for q in questions[: len(questions) // 2]:
+        cache.cache_response(q, {"message": "cached answer", "sources": ["a.md"]})
+    result = time_each(cache.get_cached_response, questions)  # half hits, half misses
+    cache.clear_cache()
+    return result
+
+
+def bench_embedding(retriever, questions, batch_size: int) -> dict:
+    single = time_each(retriever.embed_query, questions)
+    batches = [questions[i:i + batch_size] for i in range(0, len(questions), batch_size)]
+    batched = time_each(retriever.embed_questions, batches)
+    batched["per_question_ms"] = round(batched["mean_ms"] / batch_size, 3)
+    return {"single": single, f"batch_{batch_size}": batched}
+
+
+def bench_search(retriever, vectors) -> dict:
+    single = time_each(retriever.search_by_vector, vectors)
+    batch = time_each(retriever.search_batch_by_vectors, [vectors[i:i + 16] for i in range(0, len(vectors), 16)])
+    return {"single": single, "batch_16": batch}
+
+
+def bench_context(retriever, query, questions, vectors) -> dict:
+    from apps.rag.prompt import rag_prompt
+
+    retrieved = [[doc for doc, _ in retriever.search_by_vector(v)] for v in vectors]
+
+    def pack(i):
+        context = query.build_context(retrieved[i])
+        rag_prompt.format(context=context, question=questions[i])
+
+    return time_each(pack, range(len(vectors)))
+
+
+async def _run_level(query, questions, concurrency: int) -> dict:
+    from apps.rag.cache import clear_cache
+    from apps.rag.routing import route_counts
+
+    clear_cache()
+    before = dict(route_counts)
+    semaphore = asyncio.Semaphore(concurrency)
+    samples = []
+
+    async def one(q):
+        async with semaphore:
+            start = time.perf_counter()
+            response = await query.run_rag_query(q)
+            samples.append(time.perf_counter() - start)
+            return response
+
+    start = time.perf_counter()
+    responses = await asyncio.gather(*(one(q) for q in questions))
+    wall = time.perf_counter() - start
+    result = summarize(samples, wall=wall)
+    result["errors"] = sum(1 for r in responses if r.get("error"))
+    result["routes"] = {k: v - before.get(k, 0) for k, v in route_counts.items() if v - before.get(k, 0)}
+    return result
+
+
+def bench_end_to_end(query, questions, levels) -> dict:
+    # One loop for every level (like the API): pooled connections stay open between levels
+    from apps.rag.client import RagClient
+    with RagClient() as client:
+        return {f"concurrency_{c}": client.run(_run_level(query, questions, c)) for c in levels}
+
+
+# ---------------------------
+# Comparison
+# ---------------------------
+def flatten(results: dict, prefix: str = "") -> dict:
+    out = {}
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            out.update(flatten(value, name + "."))
+        elif isinstance(value, (int, float)) and (key.endswith("_ms") or key == "ops_per_s"):
+            out[name] = value
+    return out
+
+
+def compare(current: dict, baseline: dict, threshold: float) -> int:
+    """Print per-metric deltas; return the number of regressions beyond threshold."""
+    cur, base = flatten(current["results"]), flatten(baseline["results"])
+    regressions = 0
+    print(f"\n{'metric':60} {'baseline':>12} {'current':>12} {'change':>9}")
+    for name in sorted(cur.keys() & base.keys()):
+        old, new = base[name], cur[name]
+        if not old:
+            continue
+        change = (new - old) / old
+        # Latency: higher is worse. Throughput: lower is worse.
+        worse = change > threshold if name.endswith("_ms") else change < -threshold
+        regressions += worse
+        flag = "  ❌" if worse else ""
+        print(f"{name:60} {old:12.3f} {new:12.3f} {change:+8.1%}{flag}")
+    print(f"\n{regressions} regression(s) beyond {threshold:.0%}")
+    return regressions
+
+
+# ---------------------------
+# Main
+# ---------------------------
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, text=True).strip()
+    except Exception:
+        return "unknown"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Hermetic RAG pipeline benchmark")
+    parser.add_argument("--docs", type=int, default=40, help="Synthetic documents to ingest")
+    parser.add_argument("--questions", type=int, default=200)
+    parser.add_argument("--concurrency", default="1,4,16", help="End-to-end concurrency levels")
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="Fake LLM seconds per call")
+    parser.add_argument("--llm-per-token", type=float, default=0.0, help="Fake LLM seconds per generated token")
+    parser.add_argument("--embeddings", choices=["hash", "real"], default="hash",
+                        help="hash: no model download; real: the configured HuggingFace model")
+    parser.add_argument("--batch-size", type=int, default=16, help="Batch size for batched embedding")
+    parser.add_argument("--out", help="Write results JSON here")
+    parser.add_argument("--compare", help="Baseline JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.15, help="Allowed relative regression")
+    args = parser.parse_args()
+
+    # Must be set before any apps.rag import reads the config
+    os.environ.setdefault("QDRANT_MODE", "memory")
+    os.environ.setdefault("CHUNK_STORE_DIR", tempfile.mkdtemp(prefix="bench-chunks-"))
+    # Keep the measured path on retrieval + generation; override via env
+    os.environ.setdefault("EXTRACTIVE_ENABLED", "0")
+    os.environ.setdefault("FAQ_ENABLED", "0")
+
+    import fakes
+    if args.embeddings == "hash":
+        fakes.install_hash_embeddings()
+
+    from apps.rag import ingest, query, retriever
+    fake_llm = fakes.FakeLLM(latency=args.llm_latency, per_token=args.llm_per_token)
+    fakes.install_fake_llm(fake_llm)
+
+    corpus = fakes.synthetic_corpus(args.docs)
+    questions = fakes.synthetic_questions(args.questions)
+    levels = [int(c) for c in args.concurrency.split(",") if c.strip()]
+
+    results = {}
+    print("📥 ingest...")
+    results["ingest"] = bench_ingest(ingest, retriever, corpus)
+    print("🗃️  cache lookup...")
+    results["cache_lookup"] = bench_cache(questions)
+    print("🔢 embedding...")
+    results["embedding"] = bench_embedding(retriever, questions, args.batch_size)
+    vectors = [retriever.embed_query(q) for q in questions]
+    print("🔍 search...")
+    results["search"] = bench_search(retriever, vectors)
+    print("🧩 context packing...")
+    results["context_packing"] = bench_context(retriever, query, questions, vectors)
+    print("🚀 end-to-end...")
+    results["end_to_end"] = bench_end_to_end(query, questions, levels)
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "config": {k: v for k, v in vars(args).items() if k not in ("out", "compare")},
+            "llm_calls": fake_llm.calls,
+        },
+        "results": results,
+    }
+    print(json.dumps(report, indent=2))
+    if args.out:
+        Path(args.out).write_text(json.dumps(report, indent=2))
+        print(f"✅ Results written to {args.out}")
+
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text())
+        if compare(report, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
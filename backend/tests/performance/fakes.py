@@ -0,0 +1,211 @@
+# tests/performance/fakes.py
+# Deterministic stand-ins for the services the RAG pipeline talks to, so the
+# benchmarks run on a plain box: a synthetic corpus, a hashing embedder and
+# a fake LLM with configurable latency. Qdrant itself runs in-process
+# (QDRANT_MODE=memory).
+
+import asyncio
+import hashlib
+import math
+import random
+import re
+from collections import Counter
+from datetime import datetime
+from typing import List
+
+from langchain.schema import Document
+
+EMBEDDING_DIM = 384  # same size as all-MiniLM-L6-v2
+
+TOPICS = {
+    "billing": "invoice payment refund charge subscription plan card receipt tax currency discount",
+    "accounts": "login password reset email profile username security session token verification",
+    "shipping": "delivery courier parcel tracking warehouse address dispatch carrier customs package",
+    "api": "endpoint request response header token limit pagination webhook version error",
+    "privacy": "data retention consent deletion export cookie processing policy storage access",
+    "support": "ticket agent chat hours escalation priority response channel phone contact",
+    "deployment": "container image cluster replica rollout config secret volume health probe",
+    "reports": "dashboard metric export chart filter schedule summary trend period widget",
+}
+FILLER = "the a our each when after before with without every new also can will must should".split()
+BOILERPLATE = (
+    "Copyright SamsuSoft. All rights reserved. This document is provided for internal "
+    "use only and may change without notice. Contact support for the latest version."
+)
+
+
+# ---------------------------
+# Corpus
+# ---------------------------
+def _sentence(rng: random.Random, words: List[str]) -> str:
+    n = rng.randint(8, 16)
+    picked = [rng.choice(words) if rng.random() < 0.6 else rng.choice(FILLER) for _ in range(n)]
+    return " ".join(picked).capitalize() + "."
+
+
+def synthetic_corpus(n_docs: int = 40, paragraphs: int = 6, seed: int = 7, tenant_id: str = "default") -> List[Document]:
+    """Topic-clustered documents with a shared footer (exercises near-duplicate removal)."""
+    rng = random.Random(seed)
+    topics = sorted(TOPICS)
+    docs = []
+    for i in range(n_docs):
+        topic = topics[i % len(topics)]
+        words = TOPICS[topic].split()
+        body = "\n\n".join(
+            " ".join(_sentence(rng, words) for _ in range(rng.randint(3, 6)))
+            for _ in range(paragraphs)
+        )
+        docs.append(Document(
+            page_content=f"{topic.title()} guide {i}\n\n{body}\n\n{BOILERPLATE}",
+            metadata={"source": f"{topic}/guide_{i:03d}.md", "tenant_id": tenant_id},
+        ))
+    return docs
+
+
+def synthetic_questions(n: int = 200, seed: int = 11) -> List[str]:
+    rng = random.Random(seed)
+    topics = sorted(TOPICS)
+    questions = []
+    for i in range(n):
+        words = TOPICS[topics[i % len(topics)]].split()
+        a, b = rng.sample(words, 2)
+        questions.append(f"How does {a} work with {b} (case {i})?")
+    return questions
+
+
+# ---------------------------
+# Embeddings
+# ---------------------------
+class HashEmbeddings:
+    """
+    Feature-hashing bag of words, L2-normalized. Not semantic, but stable and
+    fast, so search/MMR costs are measured without a model download.
+    Drop-in for langchain_huggingface.HuggingFaceEmbeddings.
+    """
+
+    def __init__(self, *args, dim: int = EMBEDDING_DIM, **kwargs):
+        self.dim = dim
+
+    def _embed(self, text: str) -> List[float]:
+        vec = [0.0] * self.dim
+        for token in re.findall(r"\w+", text.lower()):
+            h = int.from_bytes(hashlib.blake2b(token.encode(), digest_size=8).digest(), "little")
+            vec[h % self.dim] += 1.0 if (h >> 63) else -1.0
+        norm = math.sqrt(sum(v * v for v in vec)) or 1.0
+        return [v / norm for v in vec]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(t) for t in texts]
+
+
+def install_hash_embeddings():
+    """Make every HuggingFaceEmbeddings(...) built after this call a HashEmbeddings."""
+    import langchain_huggingface
+    langchain_huggingface.HuggingFaceEmbeddings = HashEmbeddings
+
+
+# ---------------------------
+# LLM
+# ---------------------------
+class FakeLLM:
+    """
+    Replaces OllamaPool.generate: sleeps for `latency` (+/- jitter, seeded)
+    plus `per_token` per generated token, then returns an answer built from
+    the prompt, with the same fields as the real client.
+    """
+
+    def __init__(self, latency: float = 0.3, per_token: float = 0.0, tokens: int = 60, jitter: float = 0.1, seed: int = 3):
+        self.latency = latency
+        self.per_token = per_token
+        self.tokens = tokens
+        self.jitter = jitter
+        self._rng = random.Random(seed)
+        self.calls = 0
+
+    async def generate(
+        self, prompt: str, model: str = None, options: dict = None, timeout: float = None, on_token=None, **kwargs
+    ) -> dict:
+        self.calls += 1
+        prompt_time = self.latency * (1 + self._rng.uniform(-self.jitter, self.jitter))
+        eval_time = self.per_token * self.tokens
+        words = re.findall(r"\w+", prompt)[-self.tokens:]
+        if on_token is None:
+            await asyncio.sleep(prompt_time + eval_time)
+        else:
+            # Streamed like Ollama: first token after the prompt, then one per word
+            await asyncio.sleep(prompt_time)
+            for i, word in enumerate(words):
+                await asyncio.sleep(self.per_token)
+                on_token(word if i == 0 else " " + word)
+        return {
+            "text": " ".join(words) or "No answer.",
+            "model": model or "fake",
+            "replica": "fake",
+            "done_reason": "stop",
+            "total_time": prompt_time + eval_time,
+            "load_time": 0.0,
+            "prompt_eval_time": prompt_time,
+            "eval_time": eval_time,
+            "prompt_tokens": len(prompt) // 4,
+            "eval_tokens": len(words),
+        }
+
+
+def install_fake_llm(fake: FakeLLM):
+    """Route every generation (plain and cascade) through `fake`."""
+    from apps.rag import llm
+    # llm.generate and the cascade both end up in ollama_pool.generate
+    llm.ollama_pool.generate = fake.generate
+    # No Ollama to ping
+    llm.ollama_pool.start_keep_warm = lambda *args, **kwargs: None
+
+
+# ---------------------------
+# Mongo
+# ---------------------------
+class FakeMongo:
+    """In-memory chat log with the MongoManager methods the routes use."""
+
+    def __init__(self, write_latency: float = 0.0):
+        self.write_latency = write_latency
+        self.logs = []
+        self.jobs = {}
+
+    async def save_chat_log(self, username, user_message, bot_response, tenant_id="default"):
+        if self.write_latency:
+            await asyncio.sleep(self.write_latency)
+        self.logs.append({
+            "username": username,
+            "tenant_id": tenant_id,
+            "user_message": user_message,
+            "bot_response": bot_response,
+            "timestamp": datetime.utcnow(),
+        })
+
+    async def get_chat_history(self, username, limit=50):
+        return [r for r in reversed(self.logs) if r["username"] == username][:limit]
+
+    async def get_top_questions(self, limit=100, days=30, tenant_id=None):
+        counts = Counter(
+            (r["user_message"].strip().lower(), r["tenant_id"]) for r in self.logs
+            if tenant_id is None or r["tenant_id"] == tenant_id
+        )
+        return [{"question": q, "tenant_id": t, "count": c} for (q, t), c in counts.most_common(limit)]
+
+    async def save_ingest_job(self, job):
+        self.jobs[job["job_id"]] = dict(job)
+
+    async def get_ingest_jobs(self, limit=50, tenant_id=None, status=None):
+        jobs = [j for j in self.jobs.values()
+                if (tenant_id is None or j["tenant_id"] == tenant_id) and (status is None or j["status"] == status)]
+        return sorted(jobs, key=lambda j: j["created_at"], reverse=True)[:limit]
+
+
+def install_fake_mongo(fake: FakeMongo):
+    """Point the global MongoManager (and so every convenience function) at `fake`."""
+    from apps.core.mongo import mongo_manager
+    for name in ("save_chat_log", "get_chat_history", "get_top_questions", "save_ingest_job", "get_ingest_jobs"):
+        setattr(mongo_manager, name, getattr(fake, name))
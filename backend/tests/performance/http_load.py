@@ -0,0 +1,280 @@
+# tests/performance/http_load.py
+# Open-loop HTTP load scenarios against the real API: JWT login, a mixed
+# workload (chat / history / streaming batch) and latency SLO reporting.
+#
+#   # against a running deployment (start it with RATE_LIMIT_ENABLED=false)
+#   python tests/performance/http_load.py --url http://localhost:8000 --rate 5 --duration 60
+#   # hermetic: the app in-process with local stand-ins (CI)
+#   python tests/performance/http_load.py --local --rate 20 --duration 30 --out load.json
+#
+# Arrivals are Poisson at --rate requests/s whether or not earlier requests
+# have finished (open loop), so a slow server shows up as queueing and tail
+# latency instead of being hidden by fewer requests being sent. The exit
+# status is 1 when any SLO is missed.
+
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import httpx
+
+from bench_rag import summarize
+
+# Default SLOs: <operation>.<metric> -> ceiling (ms), plus the overall error rate
+DEFAULT_SLOS = {
+    "chat.p95_ms": 5000,
+    "chat.p99_ms": 8000,
+    "history.p95_ms": 300,
+    "stream.ttfb_p95_ms": 5000,
+    "error_rate": 0.01,
+}
+
+
+# ---------------------------
+# Workload
+# ---------------------------
+class QuestionMix:
+    """
+    New questions from a pool, or, with probability `repeat_ratio`, a repeat
+    of an earlier one picked with a Zipf-like skew (a few hot questions get
+    most of the repeats), which is what drives the cache hit rate.
+    """
+
+    def __init__(self, pool: List[str], repeat_ratio: float = 0.3, skew: float = 1.2, seed: int = 5):
+        self.pool = pool
+        self.repeat_ratio = repeat_ratio
+        self.skew = skew
+        self.rng = random.Random(seed)
+        self.asked: List[str] = []
+        self._next = 0
+
+    def next(self) -> str:
+        if self.asked and self.rng.random() < self.repeat_ratio:
+            rank = min(int(self.rng.paretovariate(self.skew)) - 1, len(self.asked) - 1)
+            return self.asked[rank]
+        base = self.pool[self._next % len(self.pool)]
+        lap = self._next // len(self.pool)
+        self._next += 1
+        question = base if lap == 0 else f"{base} ({lap})"  # keep new questions unique
+        self.asked.append(question)
+        return question
+
+
+class Recorder:
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = {}
+        self.ttfb: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+        self.status: Dict[str, Dict[int, int]] = {}
+        self.late_starts = 0
+
+    def record(self, op: str, seconds: float, status: Optional[int], ttfb: Optional[float] = None):
+        self.samples.setdefault(op, []).append(seconds)
+        if ttfb is not None:
+            self.ttfb.setdefault(op, []).append(ttfb)
+        code = status or 0  # 0 = transport error / timeout
+        self.status.setdefault(op, {})
+        self.status[op][code] = self.status[op].get(code, 0) + 1
+        if not status or status >= 400:
+            self.errors[op] = self.errors.get(op, 0) + 1
+
+
+# ---------------------------
+# Operations
+# ---------------------------
+async def login(client: httpx.AsyncClient, username: str, password: str) -> str:
+    r = await client.post("/auth/login", json={"username": username, "password": password})
+    r.raise_for_status()
+    return r.json()["access_token"]
+
+
+async def op_chat(client, headers, mix: QuestionMix, rec: Recorder):
+    start = time.perf_counter()
+    status = None
+    try:
+        r = await client.post("/chat/rag", json={"message": mix.next()}, headers=headers)
+        status = r.status_code
+    finally:
+        rec.record("chat", time.perf_counter() - start, status)
+
+
+async def op_history(client, headers, mix: QuestionMix, rec: Recorder):
+    start = time.perf_counter()
+    status = None
+    try:
+        r = await client.get("/chat/history", params={"limit": 20}, headers=headers)
+        status = r.status_code
+    finally:
+        rec.record("history", time.perf_counter() - start, status)
+
+
+async def op_stream(client, headers, mix: QuestionMix, rec: Recorder, size: int = 3):
+    """NDJSON batch: time to first answer line and to the end of the stream."""
+    start = time.perf_counter()
+    status, ttfb = None, None
+    try:
+        body = {"questions": [mix.next() for _ in range(size)]}
+        async with client.stream("POST", "/chat/rag/batch", json=body, headers=headers) as r:
+            status = r.status_code
+            async for line in r.aiter_lines():
+                if line and ttfb is None:
+                    ttfb = time.perf_counter() - start
+    finally:
+        rec.record("stream", time.perf_counter() - start, status, ttfb)
+
+
+OPERATIONS = {"chat": op_chat, "history": op_history, "stream": op_stream}
+
+
+# ---------------------------
+# Runner
+# ---------------------------
+async def run_scenario(args, base_url: str) -> dict:
+    rng = random.Random(args.seed)
+    weights = {k: float(v) for k, v in (part.split("=") for part in args.mix.split(","))}
+    ops, op_weights = list(weights), list(weights.values())
+    users = [u.split(":", 1) for u in args.users.split(",")]
+
+    with open(args.questions_file) if args.questions_file else _default_questions() as f:
+        pool = [line.strip() for line in f if line.strip()]
+    mix = QuestionMix(pool, args.repeat_ratio, args.skew, args.seed)
+    rec = Recorder()
+
+    limits = httpx.Limits(max_connections=args.max_connections, max_keepalive_connections=args.max_connections)
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout, limits=limits) as client:
+        tokens = [await login(client, u, p) for u, p in users]
+        headers = [{"Authorization": f"Bearer {t}", "X-Tenant-ID": args.tenant} for t in tokens]
+
+        tasks = set()
+
+        async def guarded(coro):
+            try:
+                await coro
+            except Exception:
+                pass  # already recorded as a transport error
+
+        start = time.perf_counter()
+        next_at = start
+        sent = 0
+        while next_at - start < args.duration:
+            now = time.perf_counter()
+            if next_at > now:
+                await asyncio.sleep(next_at - now)
+            elif now - next_at > 0.05:
+                rec.late_starts += 1  # the load generator itself is falling behind
+            op = rng.choices(ops, op_weights)[0]
+            task = asyncio.create_task(guarded(OPERATIONS[op](client, headers[sent % len(headers)], mix, rec)))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+            sent += 1
+            next_at += rng.expovariate(args.rate)
+        send_window = time.perf_counter() - start
+        if tasks:
+            await asyncio.wait(tasks, timeout=args.timeout)
+            for task in list(tasks):
+                task.cancel()  # counted as errors
+            await asyncio.gather(*tasks, return_exceptions=True)
+        wall = time.perf_counter() - start
+
+    report = {"sent": sent, "offered_rate": args.rate, "send_window_s": round(send_window, 2),
+              "wall_s": round(wall, 2), "late_starts": rec.late_starts, "operations": {}}
+    total_errors = 0
+    for op, samples in rec.samples.items():
+        stats = summarize(samples, wall=wall)
+        if op in rec.ttfb:
+            ttfb = summarize(rec.ttfb[op])
+            stats.update({f"ttfb_{k}": v for k, v in ttfb.items() if k.endswith("_ms")})
+        stats["errors"] = rec.errors.get(op, 0)
+        stats["error_rate"] = round(stats["errors"] / len(samples), 4)
+        stats["status"] = {str(k): v for k, v in sorted(rec.status[op].items())}
+        total_errors += stats["errors"]
+        report["operations"][op] = stats
+    report["error_rate"] = round(total_errors / sent, 4) if sent else 0.0
+    report["throughput"] = round(sum(len(s) for s in rec.samples.values()) / wall, 2) if wall else 0.0
+    return report
+
+
+def _default_questions():
+    import io
+    import fakes
+    return io.StringIO("\n".join(fakes.synthetic_questions(500)))
+
+
+def check_slos(report: dict, slos: dict) -> List[dict]:
+    results = []
+    for key, limit in slos.items():
+        if key == "error_rate":
+            actual = report["error_rate"]
+        else:
+            op, metric = key.split(".", 1)
+            actual = report["operations"].get(op, {}).get(metric)
+        results.append({"slo": key, "limit": limit, "actual": actual,
+                        "ok": actual is None or actual <= limit})
+    return results
+
+
+def parse_slos(text: Optional[str]) -> dict:
+    slos = dict(DEFAULT_SLOS)
+    for part in (text or "").split(","):
+        if part.strip():
+            key, value = part.split("=")
+            slos[key.strip()] = float(value)
+    return slos
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Open-loop HTTP load scenarios with SLO reporting")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--url", help="Base URL of a running API")
+    target.add_argument("--local", action="store_true", help="Serve the app in-process with local stand-ins")
+    parser.add_argument("--rate", type=float, default=5.0, help="Arrivals per second (Poisson)")
+    parser.add_argument("--duration", type=float, default=60.0, help="Seconds of arrivals")
+    parser.add_argument("--mix", default="chat=0.8,history=0.1,stream=0.1", help="Operation weights")
+    parser.add_argument("--repeat-ratio", type=float, default=0.3, help="Share of repeated questions")
+    parser.add_argument("--skew", type=float, default=1.2, help="Zipf-like skew of repeats (lower = hotter)")
+    parser.add_argument("--questions-file", help="One question per line (default: synthetic)")
+    parser.add_argument("--users", default="admin:admin123,admin1:admin123,admin2:admin123")
+    parser.add_argument("--tenant", default="default")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--max-connections", type=int, default=200)
+    parser.add_argument("--slo", help="Overrides, e.g. chat.p95_ms=3000,error_rate=0.02")
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="--local: fake LLM seconds per call")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", help="Write the report JSON here")
+    args = parser.parse_args()
+
+    stack = None
+    base_url = args.url
+    if args.local:
+        from local_stack import LocalStack
+        stack = LocalStack(llm_latency=args.llm_latency)
+        base_url = stack.start()
+        print(f"🧪 Local stack at {base_url}")
+
+    try:
+        report = asyncio.run(run_scenario(args, base_url))
+    finally:
+        if stack:
+            stack.stop()
+
+    report["slos"] = check_slos(report, parse_slos(args.slo))
+    report["config"] = {k: v for k, v in vars(args).items() if k != "out"}
+    print(json.dumps(report, indent=2))
+    print()
+    for s in report["slos"]:
+        mark = "✅" if s["ok"] else "❌"
+        print(f"{mark} {s['slo']:24} limit {s['limit']:>10}  actual {s['actual']}")
+    if args.out:
+        Path(args.out).write_text(json.dumps(report, indent=2))
+
+    if not all(s["ok"] for s in report["slos"]):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+# tests/performance/local_stack.py
+# The real FastAPI app served by uvicorn in a background thread, with local
+# stand-ins for its services: in-process Qdrant seeded from the synthetic
+# corpus, hashing embeddings, a fake LLM and an in-memory chat log. Rate
+# limiting and the Postgres metrics pipeline are off and Redis is never
+# touched, so HTTP load scenarios run in CI.
+
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parents[2]
+if str(BACKEND_DIR) not in sys.path:
+    sys.path.insert(0, str(BACKEND_DIR))
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class LocalStack:
+    def __init__(self, llm_latency: float = 0.3, docs: int = 40, mongo_latency: float = 0.002):
+        self.llm_latency = llm_latency
+        self.docs = docs
+        self.mongo_latency = mongo_latency
+        self.base_url = None
+        self._server = None
+        self._thread = None
+
+    def start(self) -> str:
+        # Must be set before any apps.* import reads settings/config
+        os.environ.setdefault("JWT_SECRET", "local-load-test-secret")
+        os.environ["RATE_LIMIT_ENABLED"] = "false"
+        os.environ.setdefault("METRICS_ENABLED", "false")  # no Postgres here
+        os.environ.setdefault("TRACE_EXPORTER", "none")
+        os.environ.setdefault("QDRANT_MODE", "memory")
+        os.environ.setdefault("CHUNK_STORE_DIR", tempfile.mkdtemp(prefix="load-chunks-"))
+        os.environ.setdefault("WARMUP_ON_STARTUP", "0")
+        os.environ.setdefault("FAQ_ENABLED", "0")
+
+        import uvicorn
+        import fakes
+
+        fakes.install_hash_embeddings()
+        fakes.install_fake_llm(fakes.FakeLLM(latency=self.llm_latency))
+        fakes.install_fake_mongo(fakes.FakeMongo(write_latency=self.mongo_latency))
+
+        from apps.main import app
+        from apps.rag import ingest, retriever
+        from apps.rag.config import QDRANT_COLLECTION
+
+        chunks = ingest.split_docs(fakes.synthetic_corpus(self.docs))
+        ingest.upsert_chunks(retriever.client, QDRANT_COLLECTION, chunks, ingest.make_ids(chunks), retriever.embedding)
+
+        port = _free_port()
+        self._server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+        self._thread = threading.Thread(target=self._server.run, name="local-stack", daemon=True)
+        self._thread.start()
+        deadline = time.monotonic() + 30
+        while not self._server.started:
+            if time.monotonic() > deadline or not self._thread.is_alive():
+                raise RuntimeError("Local stack did not start")
+            time.sleep(0.05)
+        self.base_url = f"http://127.0.0.1:{port}"
+        return self.base_url
+
+    def stop(self):
+        if self._server:
+            self._server.should_exit = True
+            self._thread.join(timeout=10)
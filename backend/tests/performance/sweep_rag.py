@@ -0,0 +1,340 @@
+# tests/performance/sweep_rag.py
+# Parameter sweep: answer quality against latency over chunking, retrieval
+# (k, fetch_k, MMR, hnsw_ef/exact) and the context / generation budget.
+#
+#   cd backend
+#   # real docs + a golden set, real embeddings and the configured Ollama
+#   python tests/performance/sweep_rag.py --golden golden.jsonl \
+#       --chunks 300:30,500:50,800:100 --k 2,3,5 --max-context 1000,1500,3000 --out sweep.json
+#   # retrieval only (no generation)
+#   python tests/performance/sweep_rag.py --golden golden.jsonl --no-llm
+#   # hermetic smoke run: synthetic corpus and golden set, hashing embeddings, fake LLM
+#   python tests/performance/sweep_rag.py --synthetic 40 --embeddings hash --fake-llm 0.05
+#
+# The golden set is JSON lines: {"question": ..., "answer": ..., "sources": [...]}
+# with sources relative to the docs dir (see golden.example.jsonl). Every chunking
+# config is ingested into its own scratch collection (sweep__<size>_<overlap>),
+# dropped at the end unless --keep. The chosen values go into the env overrides
+# in apps/rag/config.py (CHUNK_SIZE, RETRIEVAL_K, MAX_CONTEXT, LLM_NUM_PREDICT...).
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import List
+
+from bench_rag import BACKEND_DIR, git_commit, summarize
+
+SCRATCH_PREFIX = "sweep__"
+
+
+# ---------------------------
+# Golden set
+# ---------------------------
+def load_golden(path: str) -> List[dict]:
+    items = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                item = json.loads(line)
+                item.setdefault("answer", "")
+                item.setdefault("sources", [])
+                items.append(item)
+    return items
+
+
+def synthetic_golden(corpus, n: int, seed: int = 13) -> List[dict]:
+    """One question per document, answered by one of its sentences."""
+    rng = random.Random(seed)
+    items = []
+    for doc in corpus[:n]:
+        paragraphs = doc.page_content.split("\n\n")[1:-1]  # skip title and footer
+        sentences = [s.strip() + "." for s in rng.choice(paragraphs).split(".") if s.strip()]
+        answer = rng.choice(sentences)
+        words = answer.rstrip(".").split()
+        items.append({
+            "question": f"What does the guide say about {' '.join(words[:6]).lower()}?",
+            "answer": answer,
+            "sources": [doc.metadata["source"]],
+        })
+    return items
+
+
+# ---------------------------
+# Metrics
+# ---------------------------
+def source_recall(golden_sources: List[str], docs) -> float:
+    if not golden_sources:
+        return 1.0
+    found = {d.metadata.get("source") for d in docs}
+    return len(set(golden_sources) & found) / len(set(golden_sources))
+
+
+def answer_f1(answer: str, golden: str) -> float:
+    from apps.rag.routing import content_terms
+
+    predicted, expected = content_terms(answer), content_terms(golden)
+    common = len(predicted & expected)
+    if not common:
+        return 0.0
+    precision, recall = common / len(predicted), common / len(expected)
+    return 2 * precision * recall / (precision + recall)
+
+
+def pareto_front(rows: List[dict], quality: str, latency: str) -> None:
+    """Mark rows no other row beats on both quality (higher) and latency (lower)."""
+    for row in rows:
+        row["pareto"] = not any(
+            other[quality] >= row[quality] and other[latency] <= row[latency]
+            and (other[quality] > row[quality] or other[latency] < row[latency])
+            for other in rows
+        )
+
+
+# ---------------------------
+# Sweep
+# ---------------------------
+def ingest_scratch(corpus, size: int, overlap: int, dedup: bool) -> dict:
+    from apps.rag import ingest, retriever
+    from apps.rag.tenancy import ensure_collection
+
+    collection = f"{SCRATCH_PREFIX}{size}_{overlap}"
+    drop_scratch(collection)
+    ensure_collection(retriever.client, collection)
+    start = time.perf_counter()
+    chunks = ingest.split_docs(corpus, chunk_size=size, chunk_overlap=overlap)
+    n_split = len(chunks)
+    if dedup:
+        chunks = ingest.remove_near_duplicates(chunks)
+    ingest.upsert_chunks(retriever.client, collection, chunks, ingest.make_ids(chunks), retriever.embedding)
+    return {
+        "collection": collection,
+        "chunks": len(chunks),
+        "duplicates_removed": n_split - len(chunks),
+        "mean_chunk_chars": round(sum(len(c.page_content) for c in chunks) / len(chunks), 1) if chunks else 0,
+        "ingest_s": round(time.perf_counter() - start, 3),
+    }
+
+
+def drop_scratch(collection: str):
+    from apps.rag import retriever
+    from apps.rag.chunk_store import get_chunk_store
+
+    if retriever.client.collection_exists(collection):
+        retriever.client.delete_collection(collection)
+    get_chunk_store(collection).reset()
+
+
+def run_chunking(args, golden, chunking: dict, loop) -> List[dict]:
+    from apps.rag import retriever
+    from apps.rag.cascade import grounding_score
+    from apps.rag.config import LLM_OPTIONS
+    from apps.rag.llm import generate
+    from apps.rag.prompt import rag_prompt
+    from apps.rag.query import build_context
+
+    vectors, embed_times = [], []
+    for item in golden:
+        start = time.perf_counter()
+        vectors.append(retriever.embed_query(item["question"]))
+        embed_times.append(time.perf_counter() - start)
+
+    rows = []
+    retrieval_grid = itertools.product(args.k, args.fetch_k, args.mmr, args.search)
+    for k, fetch_k, mmr, (hnsw_ef, exact) in retrieval_grid:
+        if mmr and fetch_k < k:
+            continue
+        retrieved, search_times = [], []
+        for vector in vectors:
+            start = time.perf_counter()
+            hits = retriever.search_batch_by_vectors(
+                [vector], args.tenant, k=k, fetch_k=fetch_k, mmr=mmr,
+                hnsw_ef=hnsw_ef, exact=exact, collection=chunking["collection"],
+            )[0]
+            search_times.append(time.perf_counter() - start)
+            retrieved.append([doc for doc, _ in hits])
+        recall = [source_recall(item["sources"], docs) for item, docs in zip(golden, retrieved)]
+
+        budgets = itertools.product(args.max_context, args.num_predict[:1] if args.no_llm else args.num_predict,
+                                    args.num_ctx[:1] if args.no_llm else args.num_ctx)
+        for max_context, num_predict, num_ctx in budgets:
+            pack_times, llm_times, context_recall, grounding, f1 = [], [], [], [], []
+            for item, docs in zip(golden, retrieved):
+                start = time.perf_counter()
+                context = build_context(docs, max_context=max_context)
+                prompt = rag_prompt.format(context=context, question=item["question"])
+                pack_times.append(time.perf_counter() - start)
+                # Sources whose chunks survived the context budget
+                context_recall.append(source_recall(item["sources"], [d for d in docs if d.page_content[:100] in context]))
+                if args.no_llm:
+                    continue
+                options = {**LLM_OPTIONS, "num_predict": num_predict, "num_ctx": num_ctx}
+                start = time.perf_counter()
+                result = loop.run_until_complete(generate(prompt, options=options))
+                llm_times.append(time.perf_counter() - start)
+                grounding.append(grounding_score(result["text"], context))
+                f1.append(answer_f1(result["text"], item["answer"]))
+
+            totals = [sum(t) for t in zip(embed_times, search_times, pack_times, llm_times or [0.0] * len(golden))]
+            row = {
+                "chunk_size": chunking["chunk_size"], "chunk_overlap": chunking["chunk_overlap"],
+                "k": k, "fetch_k": fetch_k if mmr else None, "mmr": mmr, "hnsw_ef": hnsw_ef, "exact": exact,
+                "max_context": max_context,
+                "num_predict": None if args.no_llm else num_predict, "num_ctx": None if args.no_llm else num_ctx,
+                "recall_at_k": round(sum(recall) / len(recall), 4),
+                "hit_rate": round(sum(1 for r in recall if r > 0) / len(recall), 4),
+                "context_recall": round(sum(context_recall) / len(context_recall), 4),
+                "grounding": round(sum(grounding) / len(grounding), 4) if grounding else None,
+                "answer_f1": round(sum(f1) / len(f1), 4) if f1 else None,
+                "latency": {
+                    "embed": summarize(embed_times),
+                    "search": summarize(search_times),
+                    "pack": summarize(pack_times),
+                    **({"llm": summarize(llm_times)} if llm_times else {}),
+                    "total": summarize(totals),
+                },
+            }
+            row["total_p95_ms"] = row["latency"]["total"]["p95_ms"]
+            rows.append(row)
+    return rows
+
+
+def print_table(rows: List[dict], quality: str):
+    header = (f"{'':2}{'chunk':>9} {'k':>3} {'fetch':>5} {'mmr':>4} {'ef':>5} {'exact':>5} {'ctx':>6} "
+              f"{'pred':>5} {'recall':>7} {'hit':>6} {'ctxrec':>7} {'ground':>7} {'f1':>6} {'p95 ms':>10}")
+    print(header)
+    for r in sorted(rows, key=lambda r: (-(r[quality] or 0), r["total_p95_ms"])):
+        fmt = lambda v: "-" if v is None else f"{v:.3f}"
+        print(
+            f"{'★' if r['pareto'] else '':2}{r['chunk_size']:>5}/{r['chunk_overlap']:<3} {r['k']:>3} "
+            f"{r['fetch_k'] or '-':>5} {'on' if r['mmr'] else 'off':>4} {r['hnsw_ef']:>5} {'yes' if r['exact'] else 'no':>5} "
+            f"{r['max_context']:>6} {r['num_predict'] or '-':>5} {fmt(r['recall_at_k']):>7} {fmt(r['hit_rate']):>6} "
+            f"{fmt(r['context_recall']):>7} {fmt(r['grounding']):>7} {fmt(r['answer_f1']):>6} {r['total_p95_ms']:>10.1f}"
+        )
+    print(f"\n★ = Pareto front ({quality} vs total p95 latency)")
+
+
+# ---------------------------
+# Main
+# ---------------------------
+def int_list(text: str) -> List[int]:
+    return [int(v) for v in text.split(",") if v.strip()]
+
+
+def parse_chunks(text: str) -> List[tuple]:
+    return [tuple(int(v) for v in part.split(":")) for part in text.split(",") if part.strip()]
+
+
+def parse_search(text: str) -> List[tuple]:
+    """"exact,16,64" -> [(HNSW_EF, True), (16, False), (64, False)]: exact search and/or HNSW ef values."""
+    from apps.rag.config import HNSW_EF
+    out = []
+    for part in text.split(","):
+        part = part.strip()
+        if part == "exact":
+            out.append((HNSW_EF, True))
+        elif part:
+            out.append((int(part), False))
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description="RAG parameter sweep: quality vs latency")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--golden", help="JSON lines of {question, answer, sources}")
+    source.add_argument("--synthetic", type=int, metavar="DOCS", help="Synthetic corpus and golden set")
+    parser.add_argument("--docs-dir", help="Docs to ingest with --golden (default: DOCS_DIR)")
+    parser.add_argument("--tenant", default="default")
+    parser.add_argument("--chunks", default=f"{os.getenv('CHUNK_SIZE', '500')}:{os.getenv('CHUNK_OVERLAP', '50')}",
+                        help="size:overlap pairs, e.g. 300:30,500:50,800:100")
+    parser.add_argument("--k", type=int_list, default=int_list(os.getenv("RETRIEVAL_K", "3")))
+    parser.add_argument("--fetch-k", type=int_list, default=int_list(os.getenv("RETRIEVAL_FETCH_K", "20")))
+    parser.add_argument("--mmr", type=int_list, default=[1], help="1 = MMR, 0 = plain top-k, e.g. 1,0")
+    parser.add_argument("--search", default="exact", help="'exact' and/or HNSW ef values, e.g. exact,16,64")
+    parser.add_argument("--max-context", type=int_list, default=int_list(os.getenv("MAX_CONTEXT", "1500")))
+    parser.add_argument("--num-predict", type=int_list, default=int_list(os.getenv("LLM_NUM_PREDICT", "150")))
+    parser.add_argument("--num-ctx", type=int_list, default=int_list(os.getenv("LLM_NUM_CTX", "2048")))
+    parser.add_argument("--no-llm", action="store_true", help="Retrieval and packing only")
+    parser.add_argument("--fake-llm", type=float, metavar="SECONDS", help="Use the fake LLM with this latency")
+    parser.add_argument("--embeddings", choices=["hash", "real"], default="real")
+    parser.add_argument("--no-dedup", action="store_true", help="Skip near-duplicate removal")
+    parser.add_argument("--limit", type=int, help="Use only the first N golden questions")
+    parser.add_argument("--keep", action="store_true", help="Keep the scratch collections")
+    parser.add_argument("--out", help="Write results JSON here")
+    args = parser.parse_args()
+
+    # Scratch chunk stores never land next to the real ones
+    os.environ.setdefault("CHUNK_STORE_DIR", tempfile.mkdtemp(prefix="sweep-chunks-"))
+    if args.synthetic:
+        os.environ.setdefault("QDRANT_MODE", "memory")
+
+    import fakes
+    if args.embeddings == "hash":
+        fakes.install_hash_embeddings()
+    if args.fake_llm is not None:
+        fakes.install_fake_llm(fakes.FakeLLM(latency=args.fake_llm))
+
+    from apps.rag import ingest
+    from apps.rag.config import DOCS_DIR
+
+    args.mmr = [bool(m) for m in args.mmr]
+    args.search = parse_search(args.search)
+    if args.synthetic:
+        corpus = fakes.synthetic_corpus(args.synthetic, tenant_id=args.tenant)
+        golden = synthetic_golden(corpus, args.synthetic)
+    else:
+        docs_dir = Path(args.docs_dir or BACKEND_DIR / DOCS_DIR)
+        corpus = ingest.load_all_docs(docs_dir, args.tenant)
+        golden = load_golden(args.golden)
+    golden = golden[: args.limit] if args.limit else golden
+    if not corpus or not golden:
+        sys.exit("❌ Nothing to sweep: empty corpus or golden set")
+
+    loop = asyncio.new_event_loop()
+    chunkings, rows = [], []
+    try:
+        for size, overlap in parse_chunks(args.chunks):
+            print(f"📥 chunking {size}/{overlap}...")
+            chunking = {"chunk_size": size, "chunk_overlap": overlap,
+                        **ingest_scratch(corpus, size, overlap, dedup=not args.no_dedup)}
+            chunkings.append(chunking)
+            print(f"🔍 {chunking['chunks']} chunks, sweeping {len(golden)} questions...")
+            rows.extend(run_chunking(args, golden, chunking, loop))
+    finally:
+        if not args.keep:
+            for chunking in chunkings:
+                drop_scratch(chunking["collection"])
+        from apps.rag.llm import ollama_pool
+        loop.run_until_complete(ollama_pool.aclose())
+        loop.close()
+
+    quality = "recall_at_k" if args.no_llm else "answer_f1"
+    pareto_front(rows, quality, "total_p95_ms")
+    print()
+    print_table(rows, quality)
+
+    if args.out:
+        report = {
+            "meta": {
+                "commit": git_commit(),
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "questions": len(golden),
+                "documents": len(corpus),
+                "quality_metric": quality,
+                "config": {k: v for k, v in vars(args).items() if k != "out"},
+            },
+            "chunkings": chunkings,
+            "results": rows,
+        }
+        Path(args.out).write_text(json.dumps(report, indent=2))
+        print(f"✅ Results written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+# tests/test_chunk_store.py
+# Run: python -m pytest -q tests/test_chunk_store.py (numpy only, no services)
+
+import uuid
+
+import numpy as np
+
+from apps.rag.chunk_store import ChunkStore
+
+DIM = 4
+
+
+def _batch(n: int, start: int = 0):
+    ids = [str(uuid.uuid4()) for _ in range(n)]
+    texts = [f"chunk {start + i}" for i in range(n)]
+    metadatas = [{"source": f"doc{start + i}.md"} for i in range(n)]
+    vectors = np.arange(start * DIM, (start + n) * DIM, dtype=np.float32).reshape(n, DIM)
+    return ids, texts, metadatas, vectors
+
+
+def test_round_trip(tmp_path):
+    store = ChunkStore("c", str(tmp_path))
+    ids, texts, metadatas, vectors = _batch(3)
+    store.append(ids, texts, metadatas, vectors)
+
+    found = ChunkStore("c", str(tmp_path)).get_many(ids)
+    assert [found[i][0] for i in ids] == texts
+    assert [found[i][1] for i in ids] == metadatas
+    np.testing.assert_array_equal(np.stack([found[i][2] for i in ids]), vectors)
+
+
+def test_torn_write_is_ignored_and_cut_off(tmp_path):
+    store = ChunkStore("c", str(tmp_path))
+    first = _batch(2)
+    store.append(*first)
+
+    # A writer that died mid-batch: data and a partial vector row, no index records
+    gen = int((tmp_path / "c" / "CURRENT").read_text().split()[0])
+    with open(tmp_path / "c" / f"vectors-{gen}.f32", "ab") as f:
+        f.write(b"\x7f" * 1000)
+    with open(tmp_path / "c" / f"chunks-{gen}.dat", "ab") as f:
+        f.write(b"junk" * 50)
+
+    # Readers still see only the committed rows
+    reader = ChunkStore("c", str(tmp_path))
+    assert len(reader) == 2
+    np.testing.assert_array_equal(reader.get_many(first[0])[first[0][1]][2], first[3][1])
+
+    # The next writer truncates before appending, so rows line up again
+    second = _batch(3, start=2)
+    store.append(*second)
+    found = ChunkStore("c", str(tmp_path)).get_many(first[0] + second[0])
+    assert [found[i][0] for i in first[0] + second[0]] == first[1] + second[1]
+    np.testing.assert_array_equal(
+        np.stack([found[i][2] for i in first[0] + second[0]]), np.concatenate([first[3], second[3]])
+    )
+    assert (tmp_path / "c" / f"vectors-{gen}.f32").stat().st_size == 5 * DIM * 4
+
+
+def test_delete_and_compact(tmp_path):
+    store = ChunkStore("c", str(tmp_path))
+    ids, texts, metadatas, vectors = _batch(3)
+    store.append(ids, texts, metadatas, vectors)
+    store.delete(ids[:1])
+    assert sorted(store.ids()) == sorted(ids[1:])
+
+    assert store.compact() == 2
+    found = ChunkStore("c", str(tmp_path)).get_many(ids)
+    assert set(found) == set(ids[1:])
+    np.testing.assert_array_equal(found[ids[2]][2], vectors[2])
+
+
+def test_unchanged_records_are_not_appended_again(tmp_path):
+    store = ChunkStore("c", str(tmp_path))
+    ids, texts, metadatas, vectors = _batch(3)
+    store.append(ids, texts, metadatas, vectors)
+    size = store.disk_usage()
+
+    store.append(ids, texts, metadatas, vectors)
+    assert store.disk_usage() == size
+
+    store.append(ids[:1], ["chunk 0, edited"], metadatas[:1], vectors[:1])
+    assert ChunkStore("c", str(tmp_path)).get_many(ids[:1])[ids[0]][0] == "chunk 0, edited"
+
+
+def test_compact_if_needed(tmp_path):
+    store = ChunkStore("c", str(tmp_path))
+    ids, texts, metadatas, vectors = _batch(4)
+    store.append(ids, texts, metadatas, vectors)
+    assert store.compact_if_needed(0.5) is None
+
+    store.delete(ids[:3])
+    assert store.dead_ratio() == 0.75
+    assert store.compact_if_needed(0.5) == 1
+    assert store.dead_ratio() == 0.0
+    assert ChunkStore("c", str(tmp_path)).ids() == ids[3:]
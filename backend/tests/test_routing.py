@@ -0,0 +1,36 @@
+# tests/test_routing.py
+# Run: python -m pytest -q tests/test_routing.py (needs langchain for apps.rag.routing)
+
+import pytest
+
+pytest.importorskip("langchain.schema")
+
+from apps.rag.routing import classify_intent, content_terms
+
+
+@pytest.mark.parametrize("plural, singular", [
+    ("features", "feature"),
+    ("prices", "price"),
+    ("pricing", "price"),
+    ("supported", "support"),
+    ("boxes", "box"),
+    ("notes", "note"),
+])
+def test_word_forms_share_a_term(plural, singular):
+    assert content_terms(plural) == content_terms(singular)
+
+
+def test_content_terms_drop_stopwords_and_single_characters():
+    assert content_terms("What are the prices of a plan?") == content_terms("plan price")
+
+
+@pytest.mark.parametrize("text, intent", [
+    ("Hello!", "greeting"),
+    ("thanks a lot", "thanks"),
+    ("bye", "goodbye"),
+    ("who are you?", "identity"),
+    ("hi, how do I reset my password", "question"),
+    ("What features does the pro plan include?", "question"),
+])
+def test_classify_intent(text, intent):
+    assert classify_intent(text) == intent